@@ -0,0 +1,111 @@
+import hashlib
+import json
+from datetime import datetime, timedelta, timezone
+from functools import wraps
+from flask import make_response, request
+from flask_jwt_extended import get_jwt, get_jwt_identity
+from app.database.data_version import get_data_version
+from app.helper import date_to_number
+
+
+def compute_etag(data):
+    """Return a strong ETag of JSON serializable data."""
+
+    payload = json.dumps(data, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+def _round_up_to_second(date):
+    """Return the date rounded up to a whole second, HTTP dates have a one second resolution."""
+
+    if date.microsecond == 0:
+        return date
+    return date.replace(microsecond=0) + timedelta(seconds=1)
+
+
+def conditional_response(etag, build_response, last_modified=None):
+    """
+    Return an empty 304 response when the request's validators match the given ETag (or, without If-None-Match,
+    the last modification UTC date), otherwise the response returned by build_response().
+    Both carry the validators, clients may store the response but have to revalidate it on every use.
+    """
+
+    if last_modified is not None:
+        # Rounded up so it's never older than the change, and only sent once that second is over: a change later in
+        # the same second would get the same date and be answered with a 304
+        last_modified = _round_up_to_second(last_modified)
+        if last_modified > datetime.now(timezone.utc):
+            last_modified = None
+
+    if request.if_none_match:
+        is_not_modified = request.if_none_match.contains(etag)
+    else:
+        is_not_modified = (
+            last_modified is not None
+            and request.if_modified_since is not None
+            and last_modified <= request.if_modified_since
+        )
+
+    if is_not_modified:
+        response = make_response("", 304)
+    else:
+        response = build_response()
+        # Errors aren't cached
+        if response.status_code != 200:
+            return response
+
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.headers["Cache-Control"] = "private, no-cache"
+    response.vary.add("Authorization")
+    return response
+
+
+def _get_month_start():
+    """Return the UTC date the current (local) month started at, month based responses change at that date."""
+
+    month_start = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    return month_start.astimezone(timezone.utc)
+
+
+def conditional_on_data_version(vary_on_token=False, vary_on_scan_date=False):
+    """
+    Decorate a GET route returning the current user's data with validators derived from the user's data version.
+    A request whose validators are still current gets a 304 response without the route being called.
+
+    Args:
+        vary_on_token (bool): Include the request's token in the ETag, for routes whose response embeds a token.
+        vary_on_scan_date (bool): Include the user's last transactions scan date in the validators, for routes
+            whose response embeds it.
+    """
+
+    def decorator(route):
+        @wraps(route)
+        def wrapper(*args, **kwargs):
+            email = get_jwt_identity()
+            data_version = get_data_version(email)
+
+            if data_version is None:
+                return route(*args, **kwargs)
+
+            version, updated_at, last_scan_date = data_version
+            # The current month is part of the ETag since month based responses change when it does
+            etag_data = [email, request.full_path, version, date_to_number(datetime.now())]
+            if vary_on_token:
+                etag_data.append(get_jwt().get("jti"))
+
+            # Last-Modified can't be older than the month start, so a response from last month isn't revalidated
+            modified_dates = [_get_month_start()]
+            if updated_at is not None:
+                modified_dates.append(updated_at.replace(tzinfo=timezone.utc))
+            if vary_on_scan_date and last_scan_date is not None:
+                etag_data.append(last_scan_date.isoformat())
+                # Scan dates are stored as local dates
+                modified_dates.append(last_scan_date.astimezone(timezone.utc))
+
+            return conditional_response(compute_etag(etag_data), lambda: route(*args, **kwargs), max(modified_dates))
+
+        return wrapper
+
+    return decorator
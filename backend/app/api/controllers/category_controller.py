@@ -1,23 +1,48 @@
-from datetime import datetime
 from flask import Blueprint, request
-from sqlalchemy import or_
-from app.database.models import UserCategorySpending, UserParsedCategory, UserCategory, db
-from app.helper import create_response, date_to_number
+from app.api.conditional_requests import compute_etag, conditional_on_data_version, conditional_response
+from app.api.helpers import get_user_categories_spending
+from app.database.data_version import bump_data_version, bump_merchant_mappings_version
+from app.database.models import UserParsedCategory, UserCategory, db
+from app.helper import create_response
 from app.logger import log
+from app.merchant_aggregator import merchants_cache
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from lib.cache.lru_cache import LRUCache
+
+from config.app import DEFAULT_CATEGORIES_CACHE_TTL_IN_SECONDS
 
 APP_NAME = "Category Controller"
+DEFAULT_SPENDING_HISTORY_MONTHS = 6
+MAX_SPENDING_HISTORY_MONTHS = 24
+_default_categories_cache = LRUCache(max_size=1, ttl=DEFAULT_CATEGORIES_CACHE_TTL_IN_SECONDS)
 category_bp = Blueprint("categories", __name__, url_prefix="/api")
 
 
 @category_bp.route("/get_categories_spending", methods=["GET"])
 @jwt_required()
+@conditional_on_data_version()
 def get_categories_spending():
-    pass  # TODO: Implement logic to get categories spending
+    """
+    Retrieve the user's categories with their budget, current month spending and the spending of the last
+    "months" months (6 by default).
+    """
+    email = get_jwt_identity()
+    history_months = request.args.get("months", DEFAULT_SPENDING_HISTORY_MONTHS, type=int)
+
+    if history_months is None or not 1 <= history_months <= MAX_SPENDING_HISTORY_MONTHS:
+        return create_response(f"months must be between 1 and {MAX_SPENDING_HISTORY_MONTHS}", 400)
+
+    try:
+        categories_spending = get_user_categories_spending(email, history_months)
+        return create_response("Successfully fetched categories spending", 200, categories_spending)
+    except Exception as e:
+        log(APP_NAME, "ERROR", f"Error fetching categories spending for email: {email}: {str(e)}")
+        return create_response("An error occurred while fetching categories spending", 500)
 
 
 @category_bp.route("/get-user-categories", methods=["GET"])
 @jwt_required()
+@conditional_on_data_version()
 def get_user_categories():
     """
     Retrieve categories specific to a user.
@@ -25,19 +50,8 @@ def get_user_categories():
     email = get_jwt_identity()
     try:
         log(APP_NAME, "DEBUG", f"Fetching categories for email: {email}")
-        # Query user-specific categories
-        user_categories = UserCategory.query.filter(UserCategory.owner == email)
-        user_categories = [category.serialize() for category in user_categories]
-        current_month = date_to_number(datetime.now())
-
-        for category in user_categories:
-            category_id = category["id"]
-
-            category_spending = UserCategorySpending.query.filter(
-                UserCategorySpending.userCategoryId == category_id,
-                UserCategorySpending.date == current_month,
-            ).first()
-            category["monthlySpending"] = category_spending.spendingAmount if category_spending else 0
+        # The user's categories and their current month spending, in a single query
+        user_categories = get_user_categories_spending(email)
 
         return create_response("Successfully fetched user's categories", 200, user_categories)
     except Exception as e:
@@ -84,7 +98,11 @@ def set_merchant(by="id"):
             targetCategoryId=target_category_id,
         )
     )
+    bump_data_version([email])
+    bump_merchant_mappings_version([email])
     db.session.commit()
+    merchants_cache.invalidate(email)
+    return create_response("Merchant set successfully", 200)
 
 
 @category_bp.route("/get-defaults", methods=["GET"])
@@ -93,16 +111,23 @@ def get_defaults():
     Retrieve default categories.
     """
     try:
-        IGNORED_CATEGORIES = [-1]
-        default_categories = UserCategory.query.filter(UserCategory.owner == None)
-        default_categories_list = []
-
-        for category in default_categories:
-            if category.id in IGNORED_CATEGORIES:
-                continue
-            default_categories_list.append(category.serialize())
-
-        return create_response("Fetch successful", 200, default_categories_list)
+        # Default categories only change with migrations, they're kept in memory with their ETag
+        cached_defaults = _default_categories_cache.get("defaults")
+        if cached_defaults is None:
+            IGNORED_CATEGORIES = [-1]
+            default_categories = UserCategory.query.filter(UserCategory.owner == None)
+            default_categories_list = []
+
+            for category in default_categories:
+                if category.id in IGNORED_CATEGORIES:
+                    continue
+                default_categories_list.append(category.serialize())
+
+            cached_defaults = (compute_etag(default_categories_list), default_categories_list)
+            _default_categories_cache.set("defaults", cached_defaults)
+
+        etag, default_categories_list = cached_defaults
+        return conditional_response(etag, lambda: create_response("Fetch successful", 200, default_categories_list))
     except Exception as e:
         log(APP_NAME, "ERROR", f"Default categories fetch failed, Error: {str(e)}")
         return create_response("Fetch failed", 500)
@@ -1,7 +1,9 @@
 from flask import Blueprint, request
 from flask_jwt_extended import get_jwt_identity, jwt_required
+from app.database.data_version import bump_data_version, bump_merchant_mappings_version
 from app.database.models import UserParsedCategory, UserCategory, db
 from app.logger import log
+from app.merchant_aggregator import merchants_cache
 from app.helper import create_response
 from sqlalchemy import and_, or_
 
@@ -93,8 +95,14 @@ def _delete_merchant_mapping_from_db(id):
 
     merchant_to_delete = UserParsedCategory.query.filter(UserParsedCategory.id == id).first()
     db.session.delete(merchant_to_delete)
+    if merchant_to_delete.userEmail is not None:
+        bump_data_version([merchant_to_delete.userEmail])
+    bump_merchant_mappings_version([merchant_to_delete.userEmail])
     db.session.commit()
 
+    # Deleting a global mapping (no userEmail) invalidates every cached mapping
+    merchants_cache.invalidate(merchant_to_delete.userEmail)
+
 
 def _extract_merchant_data(data):
     """Extract merchant data from provided JSON."""
@@ -124,4 +132,7 @@ def _add_user_parsed_category(merchant_name, email, category_id):
         new_user_parsed_category = UserParsedCategory(chargingBusiness=merchant_name, userEmail=email, targetCategoryId=category_id)
         db.session.add(new_user_parsed_category)
 
+    bump_data_version([email])
+    bump_merchant_mappings_version([email])
     db.session.commit()
+    merchants_cache.invalidate(email)
@@ -1,14 +1,29 @@
 from flask import Blueprint, request
 from flask_jwt_extended import get_jwt_identity, jwt_required
 from sqlalchemy import and_
+from sqlalchemy.orm import joinedload
 from sqlalchemy.orm.attributes import flag_modified
-from app.database.models import RecurringTransactions, Transaction, UserCategory, UserCategorySpending, db
+from app.database.models import RecurringTransactions, Transaction, UserCategory, db
 from app.helper import create_response
+from app.job_scheduler import spending_changes
+from app.job_scheduler.jobs.helper import trigger_spending_aggregation
 from app.logger import log
+from app.api import spending_history_cache
+from app.api.conditional_requests import conditional_on_data_version, conditional_response
+from app.database.data_version import bump_data_version
 from app.api.helpers import (
+    apply_cursor,
     apply_sorting,
     apply_transactions_filters,
+    build_merchant_search_query,
     distribute_transactions_across_chunks,
+    encode_cursor,
+    estimate_query_count,
+    get_category_names,
+    query_monthly_spending_history,
+    serialize_transactions,
+    TRANSACTIONS_COLUMNAR_FIELDS,
+    TRANSACTIONS_RESPONSE_FORMATS,
     update_recurring_transaction_fields,
     validate_recurring_transaction,
     validate_transaction,
@@ -18,6 +33,9 @@ import uuid
 
 
 APP_NAME = "Transactions Controller"
+TRANSACTIONS_COUNT_MODES = ("exact", "estimated", "none")
+TRANSACTIONS_RESPONSE_MODES = ("chunks", "window")
+MAX_MERCHANT_SEARCH_RESULTS = 100
 transactions_bp = Blueprint("transactions", __name__, url_prefix="/api/transactions")
 
 
@@ -26,7 +44,16 @@ transactions_bp = Blueprint("transactions", __name__, url_prefix="/api/transacti
 @jwt_required()
 def list_transactions():
     """
-    List transactions for a user, starting from a given index.
+    List transactions for a user, either starting from a given index or continuing from a cursor.
+
+    Passing a "cursor" field (null for the first page) switches to keyset pagination: the response holds a flat
+    transactions list and a "nextCursor" (null on the last page). The total count is then only computed if
+    "count" is "exact" or "estimated".
+    Otherwise the transactions are sent in fixed size chunks placed in an array covering the whole listing, unless
+    "responseMode" is "window", which sends only the requested transactions and their starting "index".
+    The chunks array is sized by the total count, so a "count" of "none" is only accepted by the window mode and a
+    planner "estimated" count is raised to cover the sent transactions.
+    A "format" of "columnar" sends each transaction as a list of values, the field names are sent once in "fields".
     """
     email = get_jwt_identity()
     data = request.get_json()
@@ -35,29 +62,92 @@ def list_transactions():
     start_index = data.get("index", 0)
     filters = data.get("filters", {})
     sort_config = data.get("sortConfig", None)
+    use_cursor = "cursor" in data
+    count_mode = data.get("count", "none" if use_cursor else "exact")
+    response_format = data.get("format", "objects")
+    response_mode = data.get("responseMode", "chunks")
 
 
     if num_transactions > MAX_TRANSACTIONS_PER_REQUEST:
         return create_response("Request too large", 400)
 
+    if count_mode not in TRANSACTIONS_COUNT_MODES:
+        return create_response(f"Invalid count mode: {count_mode}", 400)
+
+    if response_format not in TRANSACTIONS_RESPONSE_FORMATS:
+        return create_response(f"Invalid response format: {response_format}", 400)
+
+    if response_mode not in TRANSACTIONS_RESPONSE_MODES:
+        return create_response(f"Invalid response mode: {response_mode}", 400)
+
+    if count_mode == "none" and response_mode == "chunks" and not use_cursor:
+        return create_response("The chunks response mode needs a transactions count", 400)
+
     try:
-        # Query all non-deleted, non-recurring transactions owned by the user
-        query = Transaction.query.filter_by(userEmail=email, isRecurring=False, isDeleted=False)
+        # Query all non-deleted, non-recurring transactions owned by the user, selecting only the serialized columns
+        query = db.session.query(*Transaction.serialized_columns()).filter(
+            Transaction.userEmail == email, Transaction.isRecurring == False, Transaction.isDeleted == False
+        )
 
         # Apply filters to the query
         query = apply_transactions_filters(query, filters)
+        count_query = query
 
         # Apply sorting to the query
         query = apply_sorting(query, sort_config)
 
+        if use_cursor:
+            query = apply_cursor(query, sort_config, data.get("cursor"))
+    except ValueError as e:
+        log(APP_NAME, "ERROR", f"Invalid transactions listing request for email: {email}, error: {e}")
+        return create_response(str(e), 400)
+
+    try:
+        if use_cursor:
+            # Fetch one extra transaction to know whether there's a next page
+            transactions = query.limit(num_transactions + 1).all()
+            has_next_page = len(transactions) > num_transactions
+            transactions = transactions[:num_transactions]
+
+            response_body = {
+                "transactions": serialize_transactions(transactions, get_category_names(email), response_format),
+                "nextCursor": encode_cursor(sort_config, transactions[-1]) if has_next_page else None,
+            }
+            if response_format == "columnar":
+                response_body["fields"] = TRANSACTIONS_COLUMNAR_FIELDS
+            if count_mode == "exact":
+                response_body["totalTransactionsCount"] = count_query.count()
+            elif count_mode == "estimated":
+                response_body["totalTransactionsCount"] = estimate_query_count(count_query)
+
+            return create_response("Successfully fetched transactions", 200, response_body)
+
         # Count the total number of transactions after applying filters
-        total_transactions_count = query.count()
+        if count_mode == "estimated":
+            total_transactions_count = estimate_query_count(count_query)
+        elif count_mode == "none":
+            total_transactions_count = None
+        else:
+            total_transactions_count = count_query.count()
 
         # Fetch transaction belonging to the user with pagination
         transactions = query.offset(start_index).limit(num_transactions).all()
 
-        # Serialize the transactions to send as a JSON response
-        transactions_data = [transaction.serialize() for transaction in transactions]
+        # The planner's estimate can be lower than the transactions actually sent
+        if count_mode == "estimated":
+            total_transactions_count = max(total_transactions_count, start_index + len(transactions))
+
+        # Serialize the transactions to send as a JSON response, category names are resolved from a single lookup
+        transactions_data = serialize_transactions(transactions, get_category_names(email), response_format)
+
+        if response_mode == "window":
+            response_body = {"transactions": transactions_data, "index": start_index}
+            if total_transactions_count is not None:
+                response_body["totalTransactionsCount"] = total_transactions_count
+            if response_format == "columnar":
+                response_body["fields"] = TRANSACTIONS_COLUMNAR_FIELDS
+
+            return create_response("Successfully fetched transactions", 200, response_body)
 
         # Seperate transactions by chunks
         distributed_transactions = distribute_transactions_across_chunks(
@@ -72,6 +162,8 @@ def list_transactions():
             "chunkSize": TRANSACTIONS_CHUNK_SIZE,
             "totalTransactionsCount": total_transactions_count,
         }
+        if response_format == "columnar":
+            response_body["fields"] = TRANSACTIONS_COLUMNAR_FIELDS
 
         return create_response("Successfully fetched transactions", 200, response_body)
     except Exception as e:
@@ -79,6 +171,33 @@ def list_transactions():
         return create_response("An error occurred while fetching transactions", 500)
 
 
+@transactions_bp.route("/search-merchants", methods=["GET"])
+@jwt_required()
+def search_merchants():
+    """
+    Search the user's merchants by name, "mode" is either "substring" (default) or "fuzzy".
+    """
+    email = get_jwt_identity()
+    search_text = request.args.get("query", "")
+    mode = request.args.get("mode", "substring")
+
+    try:
+        limit = min(int(request.args.get("limit", 20)), MAX_MERCHANT_SEARCH_RESULTS)
+        statement = build_merchant_search_query(email, search_text, mode, limit)
+    except ValueError as e:
+        return create_response(str(e), 400)
+
+    try:
+        merchants = [
+            {"name": name, "transactionsCount": transactions_count, "similarity": round(similarity, 3)}
+            for name, transactions_count, similarity in db.session.execute(statement)
+        ]
+        return create_response("Successfully searched merchants", 200, merchants)
+    except Exception as e:
+        log(APP_NAME, "ERROR", f"Error searching merchants for email: {email}, error: {e}")
+        return create_response("An error occurred while searching merchants", 500)
+
+
 # Define the route for manually adding a transaction
 @transactions_bp.route("/add-transaction", methods=["POST"])
 @jwt_required()
@@ -116,7 +235,10 @@ def delete_transaction():
             return create_response("Unauthorized to delete this transaction", 403)
 
         transaction.isDeleted = True
+        bump_data_version([email])
+        spending_changes.mark_transaction_touched(transaction)
         db.session.commit()
+        trigger_spending_aggregation([email])
 
         return create_response("Transaction deleted successfully.", 200)
     except Exception as e:
@@ -159,6 +281,9 @@ def update_transaction():
 
         if not category:
             return create_response("Category not found or unauthorized", 404)
+
+        # The spending cell the transaction is moved out of needs to be recomputed too
+        spending_keys = [spending_changes.get_transaction_spending_key(transaction)]
         transaction.categoryId = category.id
 
         # Update other fields
@@ -174,7 +299,11 @@ def update_transaction():
         transaction.merchantData = merchant_data
         flag_modified(transaction, 'merchantData')
 
+        spending_keys.append(spending_changes.get_transaction_spending_key(transaction))
+        bump_data_version([email])
+        spending_changes.mark_touched(spending_keys)
         db.session.commit()
+        trigger_spending_aggregation([email])
 
         return create_response("Transaction updated successfully.", 200)
     except Exception as e:
@@ -184,11 +313,15 @@ def update_transaction():
 
 @transactions_bp.route("/list-recurring-transactions", methods=["GET"])
 @jwt_required()
+@conditional_on_data_version()
 def list_recurring_transactions():
     email = get_jwt_identity()
 
     try:
-        recurring_transactions = RecurringTransactions.query.filter_by(userEmail=email)
+        # Load the transactions and their categories with the recurring transactions instead of a query per row
+        recurring_transactions = RecurringTransactions.query.filter_by(userEmail=email).options(
+            joinedload(RecurringTransactions.transaction).joinedload(Transaction.category)
+        )
         transactions_data = [transaction.serialize() for transaction in recurring_transactions]
 
         return create_response("Successfully fetched recurring transactions", 200, transactions_data)
@@ -239,6 +372,7 @@ def update_recurring_transaction():
         # Updates fields of the recurring transaction with provided data
         update_recurring_transaction_fields(recurring_transaction, updated_transaction)
         recurring_transaction.scannedAt = None
+        bump_data_version([email])
         db.session.commit()
 
         return create_response("Transaction updated successfully.", 200)
@@ -302,6 +436,7 @@ def create_recurring_transaction():
         update_recurring_transaction_fields(new_recurring_transaction, new_transaction_data)
 
         db.session.add(new_recurring_transaction)
+        bump_data_version([email])
         db.session.commit()
 
         return create_response("Transaction created successfully.", 200)
@@ -332,6 +467,7 @@ def delete_recurring_transaction():
             return create_response(f"Couldn't find recurring transaction with id of {recurring_transaction_id}", 404)
 
         db.session.delete(recurring_transaction)
+        bump_data_version([email])
         db.session.commit()
 
         return create_response("Recurring transaction deleted successfully.", 200)
@@ -354,25 +490,20 @@ def force_fetch_transactions():
 @transactions_bp.route("/get-monthly-spending-history", methods=["GET"])
 @jwt_required()
 def get_monthly_spending_history():
-    """Get recieve history of monthly spending"""
+    """
+    Get recieve history of monthly spending.
+
+    Served from a per-user cache keyed by the user's data version, a request whose If-None-Match header holds the
+    current ETag gets an empty 304 response.
+    """
     email = get_jwt_identity()
 
     try:
-        spending_data = {}
-        spending_history = UserCategorySpending.query.filter_by(
-            userEmail=email,
-        ).order_by(
-            UserCategorySpending.date,
-        )
-
-        for monthly_category_spending in spending_history:
-            date = monthly_category_spending.date
-            spending_amount = monthly_category_spending.spendingAmount
+        etag, spending_data = spending_history_cache.get_or_load(email, query_monthly_spending_history)
 
-            spending_data.setdefault(date, 0)
-            spending_data[date] += spending_amount
-
-        return create_response("Successfully fetched monthly spending history", 200, spending_data)
+        return conditional_response(
+            etag, lambda: create_response("Successfully fetched monthly spending history", 200, spending_data)
+        )
     except Exception as e:
         log(APP_NAME, "ERROR", f"Error fetching monthly spending history for email: {email}, error: {e}")
         return create_response("An error occurred while fetching monthly spending history", 500)
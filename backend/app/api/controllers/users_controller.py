@@ -5,16 +5,20 @@ from app.database.models import (
     User,
     AppUserCredentials,
     UserCategorySpending,
+    SpendingChange,
     UserParsedCategory,
     UserCategory,
     db,
 )
+from app.api.conditional_requests import conditional_on_data_version
 from app.api.helpers import get_user_object, trigger_user_initial_setup_jobs
+from app.database.data_version import bump_data_version, bump_merchant_mappings_version
 from app.credit_card_adapters.max_fetcher import login_user
 from lib.encryption.aes_encryptor import encrypt
 from config.app import INVITE_KEY
 from app.helper import RegistrationForm, create_response, hash_password, verify_password
 from app.logger import log
+from app.merchant_aggregator import merchants_cache
 from flask_jwt_extended import jwt_required, get_jwt_identity
 
 APP_NAME = "Users Controller"
@@ -115,6 +119,7 @@ def delete_user():
         # Collect all related data for deletion
         related_data = [
             UserCategorySpending.query.filter(UserCategorySpending.userEmail == email).all(),
+            SpendingChange.query.filter(SpendingChange.userEmail == email).all(),
             UserCategory.query.filter(UserCategory.owner == email).all(),
             Transaction.query.filter(Transaction.userEmail == email).all(),
             UserParsedCategory.query.filter(UserParsedCategory.userEmail == email).all(),
@@ -127,7 +132,10 @@ def delete_user():
             for record in records:
                 db.session.delete(record)
 
+        # The version row is kept, so a user registering again can't match another process' stale mappings
+        bump_merchant_mappings_version([email])
         db.session.commit()
+        merchants_cache.invalidate(email)
         log(APP_NAME, "INFO", f"User deleted successfully: {email}")
         return create_response("Deletion successful", 200)
 
@@ -197,6 +205,7 @@ def setup_user():
             )
 
         db.session.add_all(user_categories)
+        bump_data_version([email])
         db.session.commit()
 
         # Trigger scan_users_transactions job
@@ -240,6 +249,8 @@ def test_credit_card_credentials():
 
 @users_bp.route("/get-user-data", methods=["GET"])
 @jwt_required()
+# The response embeds a new access token, a client sending a new token gets a new one in return
+@conditional_on_data_version(vary_on_token=True, vary_on_scan_date=True)
 def get_user_data():
     """Endpoint for fetching user data"""
 
@@ -1,6 +1,10 @@
-from datetime import datetime
+import base64
+import json
+from datetime import datetime, timedelta
 from flask_jwt_extended import create_access_token
-from app.database.models import User
+from sqlalchemy import and_, func, literal, or_, select, tuple_
+from app.database.models import Transaction, User, UserCategory, UserCategorySpending, db
+from app.helper import date_to_number
 from app.job_scheduler.jobs_config import scheduled_jobs_dict
 from app.job_scheduler.app import SchedulerInstance
 
@@ -25,6 +29,97 @@ def get_user_object(email):
     }
 
 
+def get_category_names(email):
+    """Map the ids of the categories available to a user (global and custom) to their names, in a single query."""
+
+    rows = db.session.query(UserCategory.id, UserCategory.categoryName).filter(
+        or_(UserCategory.owner == None, UserCategory.owner == email)
+    )
+    return {category_id: category_name for category_id, category_name in rows}
+
+
+def get_last_months_numbers(last_date, months_count):
+    """Return the yyyymm numbers of the months_count months ending at last_date's month, oldest first."""
+
+    last_month_index = last_date.year * 12 + last_date.month - 1
+    return [
+        (month_index // 12) * 100 + month_index % 12 + 1
+        for month_index in range(last_month_index - months_count + 1, last_month_index + 1)
+    ]
+
+
+def get_user_categories_spending(email, history_months=0):
+    """
+    Fetch the user's categories with their budget, current month spending ("monthlySpending") and, when history_months
+    is given, the spending of the last history_months months (current month included) as "spendingHistory".
+
+    The categories are outer joined with their spending rows of the window, a single query regardless of the number
+    of categories.
+    """
+
+    months = get_last_months_numbers(datetime.now(), max(history_months, 1))
+    current_month = date_to_number(datetime.now())
+
+    rows = (
+        db.session.query(UserCategory, UserCategorySpending.date, UserCategorySpending.spendingAmount)
+        .outerjoin(
+            UserCategorySpending,
+            and_(
+                UserCategorySpending.userCategoryId == UserCategory.id,
+                UserCategorySpending.userEmail == email,
+                UserCategorySpending.date.between(months[0], months[-1]),
+            ),
+        )
+        .filter(UserCategory.owner == email)
+        .order_by(UserCategory.id)
+    )
+
+    categories = {}
+    for category, date, spending_amount in rows:
+        category_data = categories.get(category.id)
+        if category_data is None:
+            category_data = categories[category.id] = {**category.serialize(), "monthlySpending": 0}
+            if history_months:
+                category_data["spendingHistory"] = {month: 0 for month in months}
+
+        if date is None:
+            continue
+        if date == current_month:
+            category_data["monthlySpending"] = spending_amount or 0
+        if history_months:
+            category_data["spendingHistory"][date] = spending_amount or 0
+
+    return list(categories.values())
+
+
+def query_monthly_spending_history(email):
+    """Sum the user's spending per month ({yyyymm: amount}), an index-only scan of the (userEmail, date) index."""
+
+    spending_history = (
+        db.session.query(UserCategorySpending.date, func.sum(UserCategorySpending.spendingAmount))
+        .filter(UserCategorySpending.userEmail == email)
+        .group_by(UserCategorySpending.date)
+        .order_by(UserCategorySpending.date)
+    )
+    return {date: int(spending_amount or 0) for date, spending_amount in spending_history}
+
+
+# "objects" sends a dictionary per transaction, "columnar" sends the field names once and a values list per transaction
+TRANSACTIONS_RESPONSE_FORMATS = ("objects", "columnar")
+TRANSACTIONS_COLUMNAR_FIELDS = [*Transaction.SERIALIZED_FIELDS, "categoryName"]
+
+
+def serialize_transactions(rows, category_names, response_format="objects"):
+    """
+    Serialize rows of Transaction.serialized_columns() in the requested response format.
+    Columnar values follow TRANSACTIONS_COLUMNAR_FIELDS, the rows' columns order followed by the category name.
+    """
+
+    if response_format == "columnar":
+        return [[*row, category_names.get(row.categoryId)] for row in rows]
+    return [Transaction.serialize_row(row, category_names) for row in rows]
+
+
 def validate_recurring_transaction(transaction):
     """Validate recurring transaction object contains the proper fields"""
 
@@ -74,6 +169,13 @@ def validate_transaction(data):
     if missing_fields:
         return False, f"Missing fields: {', '.join(missing_fields)}"
 
+    # The purchase date selects the spending cell the transaction is summed into
+    if data["purchaseDate"] is not None:
+        try:
+            datetime.fromisoformat(data["purchaseDate"])
+        except (TypeError, ValueError):
+            return False, f"Invalid purchaseDate: {data['purchaseDate']}"
+
     return True, ""
 
 
@@ -93,6 +195,264 @@ def update_recurring_transaction_fields(recurring_transaction, updated_transacti
         recurring_transaction.startDate = datetime.strptime(start_date_str, "%Y-%m-%d")
 
 
+# Whitelisted sort fields, every sort also orders by id so the order is total and can be paginated with a cursor
+TRANSACTIONS_SORT_COLUMNS = {
+    "purchaseDate": Transaction.purchaseDate,
+    "transactionAmount": Transaction.transactionAmount,
+}
+TRANSACTIONS_SORT_DIRECTIONS = ("asc", "desc")
+
+
+def get_sort_config(sort_config):
+    """
+    Resolve a client sort config ({"field": ..., "direction": ...}) to a whitelisted (field, direction) pair.
+    Defaults to the newest transactions first, raises ValueError for unsupported fields or directions.
+    """
+
+    sort_config = sort_config or {}
+    field = sort_config.get("field") or "purchaseDate"
+    direction = sort_config.get("direction") or "desc"
+
+    if field not in TRANSACTIONS_SORT_COLUMNS:
+        raise ValueError(f"Unsupported sort field: {field}")
+    if direction not in TRANSACTIONS_SORT_DIRECTIONS:
+        raise ValueError(f"Unsupported sort direction: {direction}")
+
+    return field, direction
+
+
+def apply_sorting(query, sort_config):
+    """Order a transactions query by the sort config, using the id as a tie breaker."""
+
+    field, direction = get_sort_config(sort_config)
+    column = TRANSACTIONS_SORT_COLUMNS[field]
+
+    if direction == "desc":
+        return query.order_by(column.desc(), Transaction.id.desc())
+    return query.order_by(column.asc(), Transaction.id.asc())
+
+
+def encode_cursor(sort_config, transaction):
+    """Create an opaque cursor pointing right after the given transaction in the sort config's order."""
+
+    field, direction = get_sort_config(sort_config)
+    value = getattr(transaction, field)
+    if isinstance(value, datetime):
+        value = value.isoformat()
+
+    payload = json.dumps([field, direction, value, transaction.id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Decode a cursor created by encode_cursor to (field, direction, value, id), raises ValueError if it's malformed."""
+
+    try:
+        payload = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        field, direction, value, transaction_id = json.loads(payload)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Malformed cursor: {e}")
+
+    if field == "purchaseDate" and value is not None:
+        value = datetime.fromisoformat(value)
+    return field, direction, value, transaction_id
+
+
+def apply_cursor(query, sort_config, cursor):
+    """
+    Continue a sorted transactions query after the cursor's transaction (keyset pagination).
+    The (sort column, id) row comparison is an index range condition, so deep pages cost the same as the first one.
+    """
+
+    if not cursor:
+        return query
+
+    field, direction = get_sort_config(sort_config)
+    cursor_field, cursor_direction, value, transaction_id = decode_cursor(cursor)
+    if (cursor_field, cursor_direction) != (field, direction):
+        raise ValueError("The cursor doesn't match the sort config")
+
+    keys = tuple_(TRANSACTIONS_SORT_COLUMNS[field], Transaction.id)
+    cursor_keys = tuple_(literal(value, TRANSACTIONS_SORT_COLUMNS[field].type), literal(transaction_id))
+    return query.filter(keys < cursor_keys if direction == "desc" else keys > cursor_keys)
+
+
+def _parse_filter_date(value):
+    """Parse a YYYY-MM-DD (or ISO 8601) filter date."""
+
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid filter date: {value}")
+
+
+def _parse_filter_number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid filter number: {value}")
+
+
+def _apply_date_range_filter(query, date_range):
+    """{"start": "YYYY-MM-DD", "end": "YYYY-MM-DD"}, both ends are optional and inclusive."""
+
+    if date_range.get("start"):
+        query = query.filter(Transaction.purchaseDate >= _parse_filter_date(date_range["start"]))
+    if date_range.get("end"):
+        query = query.filter(Transaction.purchaseDate < _parse_filter_date(date_range["end"]) + timedelta(days=1))
+    return query
+
+
+def _apply_amount_range_filter(query, amount_range):
+    """{"min": number, "max": number}, both ends are optional and inclusive."""
+
+    if amount_range.get("min") not in (None, ""):
+        query = query.filter(Transaction.transactionAmount >= _parse_filter_number(amount_range["min"]))
+    if amount_range.get("max") not in (None, ""):
+        query = query.filter(Transaction.transactionAmount <= _parse_filter_number(amount_range["max"]))
+    return query
+
+
+def _apply_category_filter(query, category_ids):
+    """A list of category ids, an empty list matches every category."""
+
+    if not isinstance(category_ids, list) or not all(isinstance(c, int) for c in category_ids):
+        raise ValueError(f"Invalid category filter: {category_ids}")
+    return query.filter(Transaction.categoryId.in_(category_ids)) if category_ids else query
+
+
+def _apply_card_filter(query, card_numbers):
+    """A card's last 4 digits or a list of them."""
+
+    if isinstance(card_numbers, str):
+        card_numbers = [card_numbers]
+    if not isinstance(card_numbers, list) or not all(isinstance(c, str) and len(c) <= 4 for c in card_numbers):
+        raise ValueError(f"Invalid card filter: {card_numbers}")
+    return query.filter(Transaction.shortCardNumber.in_(card_numbers)) if card_numbers else query
+
+
+def _escape_like_pattern(text):
+    """Escape LIKE wildcards typed by the user so the text is matched literally"""
+
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _apply_merchant_filter(query, merchant_text):
+    """Case insensitive substring of the merchant's name."""
+
+    if not isinstance(merchant_text, str):
+        raise ValueError(f"Invalid store filter: {merchant_text}")
+
+    merchant_text = merchant_text.strip()
+    if not merchant_text:
+        return query
+
+    escaped_text = _escape_like_pattern(merchant_text)
+    return query.filter(Transaction.merchantName.ilike(f"%{escaped_text}%", escape="\\"))
+
+
+def _apply_pending_filter(query, is_pending):
+    """True for pending (pre-authorized) transactions only, False for confirmed ones only."""
+
+    if not isinstance(is_pending, bool):
+        raise ValueError(f"Invalid status filter: {is_pending}")
+    return query.filter(Transaction.isPending == is_pending)
+
+
+# Whitelisted filters, keyed by the names the frontend's transactions table sends
+TRANSACTIONS_FILTERS = {
+    "purchaseDate": _apply_date_range_filter,
+    "transactionAmount": _apply_amount_range_filter,
+    "category": _apply_category_filter,
+    "card": _apply_card_filter,
+    "store": _apply_merchant_filter,
+    "status": _apply_pending_filter,
+}
+
+
+def apply_transactions_filters(query, filters):
+    """
+    Apply the client's filters to a transactions query.
+    Empty filters (null, "", [] or a range without ends) are ignored, raises ValueError for unsupported filters or values.
+    """
+
+    if not filters:
+        return query
+    if not isinstance(filters, dict):
+        raise ValueError(f"Invalid filters: {filters}")
+
+    for name, value in filters.items():
+        if name not in TRANSACTIONS_FILTERS:
+            raise ValueError(f"Unsupported filter: {name}")
+        if value in (None, ""):
+            continue
+        if name in ("purchaseDate", "transactionAmount") and not isinstance(value, dict):
+            raise ValueError(f"Invalid {name} filter: {value}")
+
+        query = TRANSACTIONS_FILTERS[name](query, value)
+
+    return query
+
+
+MERCHANT_SEARCH_MODES = ("substring", "fuzzy")
+
+
+def build_merchant_search_query(email, search_text, mode="substring", limit=20):
+    """
+    Build a statement searching the user's merchants, returning (name, transactions count, similarity) rows.
+
+    "substring" matches names containing the text (case insensitive), "fuzzy" matches names similar to the text
+    (pg_trgm's % operator, tolerating typos). Both are served by the (userEmail, merchantName) trigram index.
+    Raises ValueError for an empty text or an unsupported mode.
+    """
+
+    search_text = (search_text or "").strip()
+    if not search_text:
+        raise ValueError("Missing search text")
+    if mode not in MERCHANT_SEARCH_MODES:
+        raise ValueError(f"Unsupported search mode: {mode}")
+
+    similarity = func.similarity(Transaction.merchantName, search_text)
+    if mode == "fuzzy":
+        match_condition = Transaction.merchantName.op("%")(search_text)
+    else:
+        match_condition = Transaction.merchantName.ilike(f"%{_escape_like_pattern(search_text)}%", escape="\\")
+
+    return (
+        select(
+            Transaction.merchantName.label("name"),
+            func.count().label("transactionsCount"),
+            func.max(similarity).label("similarity"),
+        )
+        .where(
+            Transaction.userEmail == email,
+            Transaction.isRecurring == False,
+            Transaction.isDeleted == False,
+            match_condition,
+        )
+        .group_by(Transaction.merchantName)
+        .order_by(func.max(similarity).desc(), func.count().desc())
+        .limit(limit)
+    )
+
+
+def explain_query(query):
+    """Return the planner's plan (EXPLAIN's root "Plan" node) of a query, without running it."""
+
+    statement = query.statement.compile(dialect=db.engine.dialect, compile_kwargs={"render_postcompile": True})
+    result = db.session.connection().exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement.string}", statement.params)
+    plan = result.scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]["Plan"]
+
+
+def estimate_query_count(query):
+    """Estimate a query's rows count from the planner's statistics, without running the query."""
+
+    return int(explain_query(query)["Plan Rows"])
+
+
 def calculate_chunk_index(index, chunk_size):
     """
     Calculate the chunk index for a given transaction index.
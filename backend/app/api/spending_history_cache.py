@@ -0,0 +1,69 @@
+import threading
+from app.api.conditional_requests import compute_etag
+from app.database.data_version import get_data_version
+from app.logger import log
+from lib.cache.lru_cache import LRUCache
+from lib.cache.redis_cache import RedisCache
+
+from config.app import (
+    RESPONSE_CACHE_BACKEND,
+    RESPONSE_CACHE_REDIS_URL,
+    SPENDING_HISTORY_CACHE_TTL_IN_SECONDS,
+    SPENDING_HISTORY_CACHE_USERS_COUNT,
+)
+
+APP_NAME = "Spending History Cache"
+
+# Per-user monthly spending history responses, {"etag": ..., "data": ...} entries keyed by the user's data version.
+# Writers bump the version in the transaction changing the spending, so an entry of an older version is never
+# served, whichever process made the change. The TTL only bounds the memory held by outdated entries.
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def _get_cache():
+    global _cache
+
+    with _cache_lock:
+        if _cache is None:
+            if RESPONSE_CACHE_BACKEND == "redis":
+                _cache = RedisCache(
+                    RESPONSE_CACHE_REDIS_URL, prefix="spending-history:", ttl=SPENDING_HISTORY_CACHE_TTL_IN_SECONDS
+                )
+            else:
+                _cache = LRUCache(max_size=SPENDING_HISTORY_CACHE_USERS_COUNT, ttl=SPENDING_HISTORY_CACHE_TTL_IN_SECONDS)
+            log(APP_NAME, "DEBUG", f"Using a {RESPONSE_CACHE_BACKEND} spending history cache")
+        return _cache
+
+
+def get_or_load(user_email, load):
+    """
+    Return the cached (etag, data) of a user's spending history, on a miss it's loaded with load(user_email) and cached.
+    The data version is read before the data, data loaded after a concurrent bump is cached under the older version.
+    """
+
+    data_version = get_data_version(user_email)
+    if data_version is None:
+        data = load(user_email)
+        return compute_etag(data), data
+
+    cache = _get_cache()
+    key = f"{user_email}:{data_version.dataVersion}"
+    entry = cache.get(key)
+    if entry is not None:
+        return entry["etag"], entry["data"]
+
+    data = load(user_email)
+    entry = {"etag": compute_etag(data), "data": data}
+    cache.set(key, entry)
+    return entry["etag"], entry["data"]
+
+
+def clear():
+    """Drop every cached history."""
+
+    _get_cache().clear()
+
+
+def stats():
+    return _get_cache().stats()
@@ -0,0 +1,76 @@
+from abc import ABC, abstractmethod
+
+
+class SessionRejectedError(Exception):
+    """Raised by an adapter when the credit card company rejects a session (e.g. expired login cookies)."""
+
+
+class LoginFailedError(Exception):
+    """Raised by an adapter when the credit card company rejects the user's credentials."""
+
+
+class CreditCardAdapter(ABC):
+    """
+    Base class for credit card company adapters.
+
+    Fetching a user's transactions is split into three steps:
+    - `login` returns the session used for the user's requests (possibly a cached one).
+    - `fetch_range` yields the raw transaction items for a date range, or for the current month view if `dates` is None.
+    - `normalize` converts a raw transaction item to a ScannedTransaction record.
+
+    Raw items are normalized one at a time as `fetch_range` yields them, so an adapter streaming its responses
+    never holds more than one raw item in memory.
+
+    Adapters are async so the scanner can fetch many users concurrently on a single event loop,
+    and are used as async context managers so they can hold pooled connections for a scan.
+    """
+
+    name = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    async def close(self):
+        """Release the adapter's resources (e.g. connection pools)."""
+
+    @abstractmethod
+    async def login(self, user_credentials, user_email):
+        """
+        Login the user and return the session needed to fetch their transactions.
+        Raises LoginFailedError when the credentials are rejected, any other error is a failure on our (or their) side.
+        """
+
+    @abstractmethod
+    def fetch_range(self, session, dates, user_email):
+        """
+        Return an async iterator of the raw transaction items (an async generator), raising SessionRejectedError if
+        the session isn't valid.
+        """
+
+    @abstractmethod
+    def normalize(self, raw_transaction, user_email):
+        """Convert a raw transaction item to a ScannedTransaction record."""
+
+    def invalidate_session(self, user_credentials, user_email):
+        """Forget a rejected session so the next login creates a new one."""
+
+    async def fetch_transactions(self, user_credentials, dates, user_email):
+        """
+        Fetch a user's transactions as ScannedTransaction records.
+        A rejected session is replaced by logging in exactly once more.
+        """
+
+        session = await self.login(user_credentials, user_email)
+        try:
+            return await self._fetch_records(session, dates, user_email)
+        except SessionRejectedError:
+            self.invalidate_session(user_credentials, user_email)
+            session = await self.login(user_credentials, user_email)
+            return await self._fetch_records(session, dates, user_email)
+
+    async def _fetch_records(self, session, dates, user_email):
+        raw_transactions = self.fetch_range(session, dates, user_email)
+        return [self.normalize(raw_transaction, user_email) async for raw_transaction in raw_transactions]
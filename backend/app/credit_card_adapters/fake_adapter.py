@@ -0,0 +1,66 @@
+import asyncio
+import hashlib
+from datetime import datetime, timedelta
+from app.credit_card_adapters.base_adapter import CreditCardAdapter
+from app.credit_card_adapters.scanned_transaction import ScannedTransaction
+
+FAKE_MERCHANTS = ["Super Market", "Gas Station", "Coffee Shop", "Pharmacy", "Book Store", "Restaurant", "Cinema"]
+
+
+class FakeIssuerAdapter(CreditCardAdapter):
+    """
+    An offline credit card company returning deterministic synthetic transactions after a simulated latency.
+    Used to test and benchmark the scanning pipeline without network access.
+    """
+
+    name = "fake"
+
+    def __init__(self, latency=0.05, transactions_per_day=2):
+        self.latency = latency
+        self.transactions_per_day = transactions_per_day
+        self.logins_count = 0
+
+    async def login(self, user_credentials, user_email):
+        await asyncio.sleep(self.latency)
+        self.logins_count += 1
+        return {"username": user_credentials["username"]}
+
+    async def fetch_range(self, session, dates, user_email):
+        await asyncio.sleep(self.latency)
+
+        if dates is None:
+            end_date = datetime.now()
+            start_date = end_date.replace(day=1)
+        else:
+            start_date, end_date = dates
+
+        day = start_date.replace(hour=0, minute=0, second=0, microsecond=0)
+        while day <= end_date:
+            for index in range(self.transactions_per_day):
+                yield self._generate_raw_transaction(session["username"], day, index)
+            day += timedelta(days=1)
+
+    def _generate_raw_transaction(self, username, day, index):
+        seed = int(hashlib.md5(f"{username}_{day:%Y%m%d}_{index}".encode()).hexdigest()[:8], 16)
+        return {
+            "arn": f"{username}_{day:%Y%m%d}_{index}",
+            "authorizationNumber": str(seed),
+            "amount": round(5 + seed % 50000 / 100, 2),
+            "date": day + timedelta(hours=8 + index),
+            "merchant": FAKE_MERCHANTS[seed % len(FAKE_MERCHANTS)],
+        }
+
+    def normalize(self, raw_transaction, user_email):
+        return ScannedTransaction(
+            id=f"{user_email}_{raw_transaction['arn']}",
+            arn=raw_transaction["arn"],
+            userEmail=user_email,
+            transactionAmount=raw_transaction["amount"],
+            purchaseDate=raw_transaction["date"],
+            paymentDate=raw_transaction["date"],
+            shortCardNumber="0000",
+            merchantData={"name": raw_transaction["merchant"]},
+            originalCurrency="ILS",
+            originalAmount=raw_transaction["amount"],
+            authorizationNumber=raw_transaction["authorizationNumber"],
+        )
@@ -0,0 +1,101 @@
+from http.cookiejar import DefaultCookiePolicy
+from urllib.parse import urlparse
+import json
+import httpx
+from app.credit_card_adapters import max_fetcher
+from app.credit_card_adapters.base_adapter import CreditCardAdapter, LoginFailedError, SessionRejectedError
+from lib.encryption.aes_encryptor import decrypt
+from lib.json_stream.json_stream import JSONStreamError, aiter_json_array
+from config.app import CREDIT_CARD_REQUEST_TIMEOUT_IN_SECONDS, MAX_RESPONSE_CHUNK_SIZE
+
+
+class MaxAdapter(CreditCardAdapter):
+    """
+    Async adapter for the MAX website, the scanner's only way of fetching MAX transactions.
+    Shares the login cookies cache and the per host rate limiter with the blocking login in max_fetcher, which the
+    API uses to verify new credentials.
+    """
+
+    name = "max"
+
+    def __init__(self):
+        self._client = None
+
+    def _get_client(self):
+        """Return the adapter's pooled client, creating it on first use (inside the running event loop)."""
+
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=CREDIT_CARD_REQUEST_TIMEOUT_IN_SECONDS)
+
+            # The client only pools connections, users' cookies are sent explicitly with each request
+            self._client.cookies.jar.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+
+        return self._client
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _wait_for_rate_limit(self, url):
+        await max_fetcher.rate_limiter.acquire_async(urlparse(url).netloc)
+
+    async def _rate_limited_request(self, method, url, **kwargs):
+        await self._wait_for_rate_limit(url)
+        return await self._get_client().request(method, url, **kwargs)
+
+    async def login(self, user_credentials, user_email):
+        cache_key = max_fetcher._get_session_cache_key(user_credentials, user_email)
+        cookies = max_fetcher.session_cookies_cache.get(cache_key)
+        if cookies:
+            return cookies
+
+        try:
+            decrypted_password = decrypt(user_credentials["password"])
+        except Exception as e:
+            raise Exception(f"Error decrypting password for user: {user_credentials['username']}: {e}")
+
+        response = await self._rate_limited_request(
+            "POST",
+            max_fetcher.LOGIN_URL,
+            headers=max_fetcher.HEADERS,
+            json={"username": user_credentials["username"], "password": decrypted_password, "id": user_credentials["id"]},
+        )
+        if response.status_code != 200:
+            raise Exception(f"Login failed for user: {user_credentials['username']}, status_code: {response.status_code}")
+
+        if json.loads(response.text).get("Result", {}).get("LoginStatus") != 0:
+            raise LoginFailedError(f"Failed to login for user: {user_email}, with the login email: {user_credentials['username']}")
+
+        cookies = dict(response.cookies)
+        max_fetcher.session_cookies_cache.set(cache_key, cookies, ttl=max_fetcher._get_cookies_ttl(response.cookies.jar))
+        return cookies
+
+    def invalidate_session(self, user_credentials, user_email):
+        max_fetcher.session_cookies_cache.delete(max_fetcher._get_session_cache_key(user_credentials, user_email))
+
+    async def fetch_range(self, session, dates, user_email):
+        """Stream the transactions response, yielding its transaction items as they're parsed."""
+
+        cookie_header = "; ".join(f"{name}={value}" for name, value in session.items())
+        url = max_fetcher.build_transactions_url(dates)
+        await self._wait_for_rate_limit(url)
+
+        async with self._get_client().stream("GET", url, headers={"cookie": cookie_header}) as response:
+            if response.status_code in max_fetcher.SESSION_REJECTED_STATUS_CODES:
+                raise SessionRejectedError(f"Session rejected for user: {user_email}")
+
+            chunks = response.aiter_bytes(MAX_RESPONSE_CHUNK_SIZE)
+            try:
+                async for raw_transaction in aiter_json_array(chunks, max_fetcher.TRANSACTIONS_JSON_PATH):
+                    yield raw_transaction
+            except JSONStreamError:
+                # An expired session is redirected to an HTML login page instead of the JSON response
+                raise SessionRejectedError(f"Session rejected for user: {user_email}")
+
+            # Drain the rest of the response so the connection goes back to the pool
+            async for _ in chunks:
+                pass
+
+    def normalize(self, raw_transaction, user_email):
+        return max_fetcher.parse_max_transaction(raw_transaction, user_email)
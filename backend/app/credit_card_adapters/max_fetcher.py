@@ -1,9 +1,21 @@
 from datetime import datetime, timedelta
+from http.cookiejar import DefaultCookiePolicy
+from urllib.parse import urlparse
 import json
+import threading
+import time
 import requests
-from app.database.models import Transaction
+from app.credit_card_adapters.scanned_transaction import ScannedTransaction
+from lib.cache.lru_cache import LRUCache
 from lib.encryption.aes_encryptor import decrypt
+from lib.rate_limiter.rate_limiter import RateLimiter
 from config import max_urls
+from config.app import (
+    CREDIT_CARD_MAX_REQUESTS_PER_SECOND_PER_HOST,
+    CREDIT_CARD_REQUEST_TIMEOUT_IN_SECONDS,
+    MAX_SESSION_COOKIES_CACHE_SIZE,
+    MAX_SESSION_COOKIES_TTL_IN_SECONDS,
+)
 import uuid
 
 # Constants
@@ -24,15 +36,64 @@ HEADERS = {
     "user-agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/117.0.0.0 Safari/537.36",
 }
 
+SESSION_REJECTED_STATUS_CODES = (401, 403)
+TRANSACTIONS_JSON_PATH = ("result", "transactions")
+
+# Shared by the blocking login and the async MaxAdapter, limits the requests rate sent to each host
+rate_limiter = RateLimiter(CREDIT_CARD_MAX_REQUESTS_PER_SECOND_PER_HOST)
+
+# Logged in session cookies by user, reused across scans until they expire or get rejected
+session_cookies_cache = LRUCache(max_size=MAX_SESSION_COOKIES_CACHE_SIZE, ttl=MAX_SESSION_COOKIES_TTL_IN_SECONDS)
+
+# Every thread logging users in keeps its own pooled session (requests.Session isn't thread-safe)
+_thread_local = threading.local()
+
+
+def _get_session():
+    """
+    Return the calling thread's requests session, creating it on first use.
+    The session only pools connections, it never stores cookies so users' sessions can't leak into each other.
+    """
+    session = getattr(_thread_local, "session", None)
+
+    if session is None:
+        session = requests.Session()
+        session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        _thread_local.session = session
+
+    return session
+
+
+def _rate_limited_request(method, url, **kwargs):
+    """
+    Send an HTTP request once the target host's rate limit allows it.
+    """
+    rate_limiter.acquire(urlparse(url).netloc)
+    return _get_session().request(method, url, timeout=CREDIT_CARD_REQUEST_TIMEOUT_IN_SECONDS, **kwargs)
+
+
+def _get_cookies_ttl(cookie_jar):
+    """
+    Calculate how long login cookies can be reused, based on the earliest expiring cookie.
+    """
+    expiration_times = [cookie.expires for cookie in cookie_jar if cookie.expires]
+    if not expiration_times:
+        return MAX_SESSION_COOKIES_TTL_IN_SECONDS
+
+    return max(0, min(MAX_SESSION_COOKIES_TTL_IN_SECONDS, min(expiration_times) - time.time()))
+
+
+def _get_session_cache_key(user_credentials, user_email):
+    return (user_email, user_credentials["username"])
+
 
 def parse_date_string(date_string):
     """
     Parse a date string in the format 'YYYY-MM-DDTHH:MM:SS' to a datetime object.
     """
-    date_format = "%Y-%m-%dT%H:%M:%S"
-
     if date_string:
-        return datetime.strptime(date_string, date_format)
+        # fromisoformat parses this format considerably faster than strptime
+        return datetime.fromisoformat(date_string)
     return None
 
 
@@ -91,7 +152,7 @@ def login_user(user_credentials, decrypt_password=True):
         "id": user_credentials["id"],
     }
 
-    response = requests.post(LOGIN_URL, headers=HEADERS, json=updated_user_credentials)
+    response = _rate_limited_request("POST", LOGIN_URL, headers=HEADERS, json=updated_user_credentials)
     if response.status_code != 200:
         raise Exception(f"Login failed for user: {user_credentials['username']}, status_code: {response.status_code}")
 
@@ -102,44 +163,25 @@ def login_user(user_credentials, decrypt_password=True):
         return None
 
 
-def fetch_transactions_from_max(user_credentials: dict, dates: tuple, user_email: str) -> list:
+def parse_max_transaction(transaction, user_email):
     """
-    Fetch transactions data for a user within a specified date range.
+    Convert a transaction item from the MAX API response to a ScannedTransaction record.
     """
-
-    cookies_for_requests = login_user(user_credentials)
-    if not cookies_for_requests:
-        raise Exception(f"Failed to login for user: {user_email}, with the login email: {user_credentials['username']}")
-
-    transactions_url = build_transactions_url(dates)
-    response = requests.get(transactions_url, cookies=cookies_for_requests)
-    transactions_data = json.loads(response.content.decode("utf-8"))
-
-    if transactions_data["result"] is None:
-        return []
-
-    user_transactions = []
-    for transaction in transactions_data["result"]["transactions"]:
-        t = Transaction(
-            id=f"{user_email}_{transaction['arn']}",
-            arn=transaction["arn"],
-            userEmail=user_email,
-            categoryId=-1,
-            transactionAmount=parse_transaction_amount(transaction["actualPaymentAmount"]),
-            paymentDate=parse_date_string(transaction["paymentDate"]),
-            purchaseDate=parse_date_string(transaction["purchaseDate"]),
-            shortCardNumber=transaction["shortCardNumber"],
-            merchantData={**transaction["merchantData"], "name": transaction["merchantName"]},
-            originalCurrency=transaction["originalCurrency"],
-            originalAmount=transaction["originalAmount"],
-            isRecurring=False,
-            isPending=False,
-            authorizationNumber=transaction["dealData"]["authorizationNumber"],
-        )
-        if transaction["arn"] is None:
-            t.id = f"{user_email}_{uuid.uuid4()}_pending"
-            t.isPending = True
-
-        user_transactions.append(t)
-
-    return user_transactions
+    record = ScannedTransaction(
+        id=f"{user_email}_{transaction['arn']}",
+        arn=transaction["arn"],
+        userEmail=user_email,
+        transactionAmount=parse_transaction_amount(transaction["actualPaymentAmount"]),
+        paymentDate=parse_date_string(transaction["paymentDate"]),
+        purchaseDate=parse_date_string(transaction["purchaseDate"]),
+        shortCardNumber=transaction["shortCardNumber"],
+        merchantData={**transaction["merchantData"], "name": transaction["merchantName"]},
+        originalCurrency=transaction["originalCurrency"],
+        originalAmount=transaction["originalAmount"],
+        authorizationNumber=transaction["dealData"]["authorizationNumber"],
+    )
+    if transaction["arn"] is None:
+        record.id = f"{user_email}_{uuid.uuid4()}_pending"
+        record.isPending = True
+
+    return record
@@ -0,0 +1,14 @@
+from app.credit_card_adapters.fake_adapter import FakeIssuerAdapter
+from app.credit_card_adapters.max_adapter import MaxAdapter
+from config.app import CREDIT_CARD_ADAPTER
+
+ADAPTERS = {adapter.name: adapter for adapter in [MaxAdapter, FakeIssuerAdapter]}
+
+
+def get_adapter(name=CREDIT_CARD_ADAPTER):
+    """Create an instance of the credit card adapter registered under the given name."""
+
+    if name not in ADAPTERS:
+        raise ValueError(f"Unknown credit card adapter: '{name}', available adapters: {', '.join(ADAPTERS)}")
+
+    return ADAPTERS[name]()
@@ -0,0 +1,62 @@
+class ScannedTransaction:
+    """
+    A lightweight record of a transaction fetched from a credit card company.
+
+    Its attributes mirror the Transaction model's columns, so records can go through the scanner's dedup step
+    and be bulk inserted without constructing ORM objects for transactions that already exist.
+    """
+
+    __slots__ = (
+        "id",
+        "arn",
+        "userEmail",
+        "categoryId",
+        "authorizationNumber",
+        "transactionAmount",
+        "purchaseDate",
+        "paymentDate",
+        "shortCardNumber",
+        "merchantData",
+        "originalCurrency",
+        "originalAmount",
+        "isRecurring",
+        "isDeleted",
+        "isPending",
+    )
+
+    def __init__(
+        self,
+        id,
+        arn,
+        userEmail,
+        transactionAmount,
+        purchaseDate,
+        paymentDate,
+        shortCardNumber,
+        merchantData,
+        originalCurrency,
+        originalAmount,
+        authorizationNumber,
+        isPending=False,
+        categoryId=-1,
+    ):
+        self.id = id
+        self.arn = arn
+        self.userEmail = userEmail
+        self.categoryId = categoryId
+        self.authorizationNumber = authorizationNumber
+        self.transactionAmount = transactionAmount
+        self.purchaseDate = purchaseDate
+        self.paymentDate = paymentDate
+        self.shortCardNumber = shortCardNumber
+        self.merchantData = merchantData
+        self.originalCurrency = originalCurrency
+        self.originalAmount = originalAmount
+        self.isRecurring = False
+        self.isDeleted = False
+        self.isPending = isPending
+
+    def to_row(self):
+        """Convert the record to a row dictionary for bulk inserts."""
+
+        return {attribute: getattr(self, attribute) for attribute in self.__slots__}
@@ -0,0 +1,72 @@
+from datetime import datetime, timezone
+from sqlalchemy import select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from app.database.models import MerchantMappingsVersion, User, db
+
+# The global merchant mappings (userEmail is NULL) are versioned under an empty email
+GLOBAL_MAPPINGS_VERSION_KEY = ""
+
+
+def bump_data_version(users_emails):
+    """
+    Bump the data version of users whose data changed, as part of the session's current transaction.
+    Must be called by anything changing what the users' GET endpoints return (see app/api/conditional_requests).
+    """
+
+    users_emails = list(set(users_emails))
+    if not users_emails:
+        return
+
+    db.session.execute(
+        update(User)
+        .where(User.email.in_(users_emails))
+        .values(dataVersion=User.dataVersion + 1, dataUpdatedAt=datetime.now(timezone.utc).replace(tzinfo=None))
+        .execution_options(synchronize_session=False)
+    )
+
+
+def get_data_version(user_email):
+    """
+    Return the user's (data version, last update UTC date, last transactions scan date), or None for an unknown user.
+    Scans don't bump the data version unless they write transactions, the scan date is a separate validator.
+    """
+
+    return (
+        db.session.query(User.dataVersion, User.dataUpdatedAt, User.lastTransactionsScanDate)
+        .filter(User.email == user_email)
+        .first()
+    )
+
+
+def bump_merchant_mappings_version(users_emails):
+    """
+    Bump the merchant mappings version of users whose UserParsedCategory rows changed, a None email bumps the global
+    mappings version, as part of the session's current transaction.
+    Must be called by every mappings writer (see app/merchant_aggregator/merchants_cache).
+    """
+
+    keys = sorted({GLOBAL_MAPPINGS_VERSION_KEY if email is None else email for email in users_emails})
+    if not keys:
+        return
+
+    # Versions rows are created by their first bump, the sorted keys keep concurrent upserts from deadlocking
+    dialect = postgresql if db.session.get_bind().dialect.name == "postgresql" else sqlite
+    statement = dialect.insert(MerchantMappingsVersion).values([{"userEmail": key, "version": 1} for key in keys])
+    db.session.execute(
+        statement.on_conflict_do_update(
+            index_elements=[MerchantMappingsVersion.userEmail],
+            set_={"version": MerchantMappingsVersion.version + 1},
+        )
+    )
+
+
+def get_merchant_mappings_versions(user_email):
+    """Return the (user's, global) merchant mappings versions, 0 for mappings that were never changed."""
+
+    rows = db.session.execute(
+        select(MerchantMappingsVersion.userEmail, MerchantMappingsVersion.version).where(
+            MerchantMappingsVersion.userEmail.in_([user_email, GLOBAL_MAPPINGS_VERSION_KEY])
+        )
+    )
+    versions = dict(rows.all())
+    return versions.get(user_email, 0), versions.get(GLOBAL_MAPPINGS_VERSION_KEY, 0)
@@ -1,5 +1,6 @@
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy import (
+    BigInteger,
     Column,
     DateTime,
     Float,
@@ -9,6 +10,11 @@ from sqlalchemy import (
     Boolean,
     Date,
     ForeignKey,
+    Index,
+    UniqueConstraint,
+    Computed,
+    Text,
+    text,
 )
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
@@ -22,6 +28,12 @@ class IconMixin:
     colorCode = Column(String(50))
 
 
+def _get_default_shard_key(context):
+    from app.job_scheduler.sharding import get_shard_key
+
+    return get_shard_key(context.get_current_parameters()["email"])
+
+
 class User(db.Model):
     __tablename__ = "user"
 
@@ -33,6 +45,12 @@ class User(db.Model):
     shouldGetScrapped = Column(Boolean, default=True)
     initialSetupDone = Column(Boolean, default=False)    
     lastTransactionsScanDate = Column(DateTime, default=None)
+    transactionsHighWaterMark = Column(DateTime, default=None)  # Latest confirmed purchaseDate
+    # Bumped whenever the user's data changes, conditional GET requests are validated against it
+    dataVersion = Column(Integer, nullable=False, default=0, server_default="0")
+    dataUpdatedAt = Column(DateTime, default=None)  # UTC
+    # A stable hash of the email, the periodic jobs select the users of their shard by it in SQL (see sharding)
+    shardKey = Column(BigInteger, nullable=False, default=_get_default_shard_key)
 
     appUserCredentials = relationship("AppUserCredentials", back_populates="user", uselist=False)
 
@@ -76,11 +94,21 @@ class UserCategory(db.Model, IconMixin):
 
 class UserCategorySpending(db.Model):
     __tablename__ = "userCategorySpending"
+    __table_args__ = (
+        UniqueConstraint("userEmail", "userCategoryId", "date", name="uq_userCategorySpending_userEmail_userCategoryId_date"),
+        Index(
+            "ix_userCategorySpending_userEmail_date",
+            "userEmail",
+            "date",
+            postgresql_include=["userCategoryId", "spendingAmount"],
+        ),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
-    userEmail = Column(String(255), ForeignKey("user.email"), nullable=True)
-    userCategoryId = Column(Integer, ForeignKey("userCategory.id"))
-    date = Column(Integer, nullable=False, index=True)  # 202311
+    # Not nullable, NULLs never conflict so the unique key wouldn't keep cells unique
+    userEmail = Column(String(255), ForeignKey("user.email"), nullable=False)
+    userCategoryId = Column(Integer, ForeignKey("userCategory.id"), nullable=False)
+    date = Column(Integer, nullable=False)  # 202311
     spendingAmount = Column(Integer)
 
 
@@ -95,6 +123,57 @@ class CategoryMonthlyAveragesHistory(db.Model):
 
 class Transaction(db.Model):
     __tablename__ = "transaction"
+    __table_args__ = (
+        Index("ix_transaction_userEmail_id", "userEmail", "id"),
+        Index("ix_transaction_userEmail_authorizationNumber_isPending", "userEmail", "authorizationNumber", "isPending"),
+        # Keyset pagination of the transactions list, one index per sort field
+        Index(
+            "ix_transaction_list_purchaseDate_id",
+            "userEmail",
+            "purchaseDate",
+            "id",
+            postgresql_where=text('"isRecurring" = false AND "isDeleted" = false'),
+        ),
+        Index(
+            "ix_transaction_list_transactionAmount_id",
+            "userEmail",
+            "transactionAmount",
+            "id",
+            postgresql_where=text('"isRecurring" = false AND "isDeleted" = false'),
+        ),
+        # Transactions list filters, the equality filters lead so the date order can be read from the index
+        Index(
+            "ix_transaction_list_categoryId_purchaseDate_id",
+            "userEmail",
+            "categoryId",
+            "purchaseDate",
+            "id",
+            postgresql_where=text('"isRecurring" = false AND "isDeleted" = false'),
+        ),
+        Index(
+            "ix_transaction_list_shortCardNumber_purchaseDate_id",
+            "userEmail",
+            "shortCardNumber",
+            "purchaseDate",
+            "id",
+            postgresql_where=text('"isRecurring" = false AND "isDeleted" = false'),
+        ),
+        # Merchant name searches are always scoped to a user, the userEmail column needs the btree_gin extension
+        Index(
+            "ix_transaction_userEmail_merchantName_trgm",
+            "userEmail",
+            "merchantName",
+            postgresql_using="gin",
+            postgresql_ops={"merchantName": "gin_trgm_ops"},
+        ),
+        Index(
+            "ix_transaction_list_pending_purchaseDate_id",
+            "userEmail",
+            "purchaseDate",
+            "id",
+            postgresql_where=text('"isRecurring" = false AND "isDeleted" = false AND "isPending" = true'),
+        ),
+    )
 
     id = Column(String, primary_key=True, nullable=False)
     arn = Column(String(255), nullable=True)
@@ -107,6 +186,7 @@ class Transaction(db.Model):
     paymentDate = Column(DateTime)
     shortCardNumber = Column(String(4))
     merchantData = Column(JSONB)
+    merchantName = Column(Text, Computed("\"merchantData\" ->> 'name'", persisted=True))  # Trigram indexed
     originalCurrency = Column(String(3))
     originalAmount = Column(Float)
     isRecurring = Column(Boolean, default=False)
@@ -117,33 +197,69 @@ class Transaction(db.Model):
     recurring_transaction = relationship("RecurringTransactions", back_populates="transaction", uselist=False)
     category = relationship("UserCategory")
 
+    # The fields sent to clients, list queries select only these columns (see serialize_row)
+    SERIALIZED_FIELDS = (
+        "id",
+        "arn",
+        "authorizationNumber",
+        "userEmail",
+        "categoryId",
+        "transactionAmount",
+        "paymentDate",
+        "purchaseDate",
+        "shortCardNumber",
+        "merchantData",
+        "originalCurrency",
+        "originalAmount",
+        "isRecurring",
+        "isDeleted",
+        "isPending",
+    )
+
+    @classmethod
+    def serialized_columns(cls):
+        return [getattr(cls, field) for field in cls.SERIALIZED_FIELDS]
+
     def serialize(self, include_category_name=True):
         """
         Serialize the Transaction object to a dictionary.
         """
-        data = {
-            "id": self.id,
-            "arn": self.arn,
-            "authorizationNumber": self.authorizationNumber,
-            "userEmail": self.userEmail,
-            "categoryId": self.categoryId,
-            "transactionAmount": self.transactionAmount,
-            "paymentDate": self.paymentDate.isoformat() if self.paymentDate else None,
-            "purchaseDate": self.purchaseDate.isoformat() if self.purchaseDate else None,
-            "shortCardNumber": self.shortCardNumber,
-            "merchantData": self.merchantData,
-            "originalCurrency": self.originalCurrency,
-            "originalAmount": self.originalAmount,
-            "isRecurring": self.isRecurring,
-            "isDeleted": self.isDeleted,
-            "isPending": self.isPending,
-        }
+        data = Transaction.serialize_row(self)
 
         if include_category_name:
             data["categoryName"] = self.category.categoryName if self.category else None
 
         return data
-    
+
+    @staticmethod
+    def serialize_row(row, category_names=None):
+        """
+        Serialize a Transaction or a row of Transaction.serialized_columns() to a dictionary.
+        The category name is resolved from the category_names ({category id: name}) map when it's passed.
+        Dates are kept as datetime objects, the app's JSON provider encodes them as ISO 8601 strings.
+        """
+        data = {
+            "id": row.id,
+            "arn": row.arn,
+            "authorizationNumber": row.authorizationNumber,
+            "userEmail": row.userEmail,
+            "categoryId": row.categoryId,
+            "transactionAmount": row.transactionAmount,
+            "paymentDate": row.paymentDate,
+            "purchaseDate": row.purchaseDate,
+            "shortCardNumber": row.shortCardNumber,
+            "merchantData": row.merchantData,
+            "originalCurrency": row.originalCurrency,
+            "originalAmount": row.originalAmount,
+            "isRecurring": row.isRecurring,
+            "isDeleted": row.isDeleted,
+            "isPending": row.isPending,
+        }
+
+        if category_names is not None:
+            data["categoryName"] = category_names.get(row.categoryId)
+
+        return data
 
     def update_with_new_values(self, new_transaction):
         """
@@ -174,6 +290,19 @@ class UserParsedCategory(db.Model):
     targetCategoryId = Column(Integer, ForeignKey("userCategory.id"))
 
 
+class MerchantMappingsVersion(db.Model):
+    """
+    The version of a user's merchant -> category mappings (their UserParsedCategory rows), or of the global ones
+    under an empty userEmail. Bumped only by the mappings writers, cached mappings are validated against it
+    (see app/merchant_aggregator/merchants_cache).
+    """
+
+    __tablename__ = "merchantMappingsVersion"
+
+    userEmail = Column(String(255), primary_key=True)
+    version = Column(Integer, nullable=False, default=0, server_default="0")
+
+
 class RecurringTransactions(db.Model, IconMixin):
     __tablename__ = "recurringTransactions"
 
@@ -215,3 +344,63 @@ class UserWarnings(db.Model):
     id = Column(Integer, primary_key=True, autoincrement=True)
     userEmail = Column(String(255), ForeignKey("user.email"), nullable=False)
     failedLoginCount = Column(Integer, nullable=False, default=0)
+
+
+class SpendingChange(db.Model):
+    """
+    A change of a (userEmail, date, categoryId) UserCategorySpending cell, see app/job_scheduler/spending_changes.
+    Rows are written in the same database transaction as the change and deleted by the monthly spending aggregator
+    in the transaction applying it. A row without an amount has the cell recomputed, one with an amount is added
+    to the cell as is.
+    """
+
+    __tablename__ = "spendingChanges"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    userEmail = Column(String(255), nullable=False, index=True)
+    date = Column(Integer, nullable=False)  # YYYYMM, like UserCategorySpending.date
+    categoryId = Column(Integer, nullable=True)
+    amount = Column(Float, nullable=True)
+
+
+class JobQueueEntry(db.Model):
+    """
+    A chain of jobs waiting for (or being run by) a job worker, see app/job_scheduler/job_queue.
+
+    Entries are claimed with SELECT ... FOR UPDATE SKIP LOCKED so every entry is run by a single worker,
+    at most one active (queued or running) entry can exist per singletonKey.
+    """
+
+    __tablename__ = "jobQueue"
+    __table_args__ = (
+        Index(
+            "ix_jobQueue_queued_runAt",
+            "runAt",
+            postgresql_where=text("status = 'queued'"),
+            sqlite_where=text("status = 'queued'"),
+        ),
+        Index(
+            "ix_jobQueue_singletonKey_active",
+            "singletonKey",
+            unique=True,
+            postgresql_where=text("status IN ('queued', 'running')"),
+            sqlite_where=text("status IN ('queued', 'running')"),
+        ),
+    )
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    jobs = Column(JSONB, nullable=False)  # [{"id": <scheduled_jobs_dict key>, "args": {...}}, ...] run in order
+    singletonKey = Column(String(255), nullable=True)
+    status = Column(String(20), nullable=False, default=QUEUED)
+    runAt = Column(DateTime, nullable=False)
+    attempts = Column(Integer, nullable=False, default=0)
+    lockedBy = Column(String(255), nullable=True)
+    lockedAt = Column(DateTime, nullable=True)
+    createdAt = Column(DateTime, nullable=False)
+    finishedAt = Column(DateTime, nullable=True)
+    lastError = Column(Text, nullable=True)
@@ -11,7 +11,7 @@ import bcrypt
 import requests
 from flask import jsonify, make_response
 from flask_wtf import FlaskForm
-from sqlalchemy import and_
+from sqlalchemy import and_, func
 from sqlalchemy.orm import joinedload
 from sqlalchemy.orm.attributes import InstrumentedAttribute
 from wtforms import StringField, PasswordField
@@ -19,7 +19,8 @@ from wtforms.validators import DataRequired, Email, Length
 
 # Local application imports
 from app.database.models import User, Transaction, UserWarnings, db
-from config.app import STOP_AT_FAILED_LOGIN_THRESHOLD
+from app.job_scheduler import sharding
+from config.app import OPENAI_REQUEST_TIMEOUT_IN_SECONDS, STOP_AT_FAILED_LOGIN_THRESHOLD
 from config.logger import LOG_FORMAT, LOG_LEVEL
 
 
@@ -95,30 +96,31 @@ def calculate_next_recurrence_date(current_date, frequency_value, frequency_unit
     return datetime(year, month, day)
 
 
-# Query users who have been flagged for scraping and preload their associated credentials.
-def fetch_users_for_scraping():
-    users = (
-        User.query.options(joinedload(User.appUserCredentials))
+# Query users who have been flagged for scraping, of the given [index, shards count] shard if one is passed,
+# along with their failed logins count and their preloaded credentials in a single query.
+def fetch_users_for_scraping(shard=None):
+    failed_logins = (
+        db.session.query(UserWarnings.userEmail, func.max(UserWarnings.failedLoginCount).label("failedLoginCount"))
+        .group_by(UserWarnings.userEmail)
+        .subquery()
+    )
+    query = (
+        db.session.query(User, failed_logins.c.failedLoginCount)
+        .options(joinedload(User.appUserCredentials))
+        .outerjoin(failed_logins, failed_logins.c.userEmail == User.email)
         .filter(and_(User.shouldGetScrapped == True, User.initialSetupDone == True))
-        .all()
     )
-    skipped_users = []
-
-    index = 0
-    while index < len(users):
-        user = users[index]
-        user_warnings = UserWarnings.query.filter(UserWarnings.userEmail == user.email).first()
+    if shard is not None:
+        query = query.filter(sharding.get_shard_filter(shard))
 
-        # Check if there are any warnings for the user.
-        if user_warnings is not None:
-            # If the failed login count for the user exceeds the defined threshold,
-            # log it and remove the user from the list.
-
-            if user_warnings.failedLoginCount >= STOP_AT_FAILED_LOGIN_THRESHOLD:
-                skipped_users.append(user.email)
-                users.pop(index)
-                continue
-        index += 1
+    users = []
+    skipped_users = []
+    for user, failed_login_count in query:
+        # Users whose failed login count reached the threshold aren't scanned anymore
+        if failed_login_count is not None and failed_login_count >= STOP_AT_FAILED_LOGIN_THRESHOLD:
+            skipped_users.append(user.email)
+        else:
+            users.append(user)
 
     return users, skipped_users
 
@@ -196,7 +198,7 @@ def query_chatgpt(prompt):
         "messages": [{"role": "user", "content": prompt}],
         "temperature": 0.1,
     }
-    response = requests.post(OPENAI_API_URL, headers=headers, data=json.dumps(data))
+    response = requests.post(OPENAI_API_URL, headers=headers, data=json.dumps(data), timeout=OPENAI_REQUEST_TIMEOUT_IN_SECONDS)
     if response.status_code == 200:
         return response.json()["choices"][0]["message"]["content"]
     else:
@@ -1,34 +1,86 @@
+import threading
 from apscheduler.schedulers.background import BackgroundScheduler
+from app.database.models import db
 from app.logger import log
-import app.job_scheduler.helper as helper
+from app.job_scheduler import job_queue
+from app.job_scheduler.leader_election import LeaderElection
+from app.job_scheduler.worker import JobWorker
 from lib.singleton.singleton import Singleton
 from app.job_scheduler.jobs_config import scheduled_jobs_dict
 import datetime
 
+from config.app import (
+    EMBEDDED_JOB_WORKER,
+    JOB_SHARDS_COUNT,
+    LEADER_ELECTION_INTERVAL_IN_SECONDS,
+    SCHEDULER_LEADER_LOCK_ID,
+)
+
 APP_NAME = "Job Scheduler"
+LEADER_ELECTION_JOB_ID = "leader_election"
+REQUEUE_EXPIRED_ENTRIES_JOB_ID = "requeue_expired_entries"
 
 
 @Singleton
 class SchedulerInstance:
-    """Singleton wrapper around the BackgroundScheduler."""
+    """
+    Singleton queueing jobs in the durable job queue (see job_queue), which job workers run.
+
+    In job worker processes, the BackgroundScheduler runs the leader election. Only the elected process queues the
+    configured periodic jobs, so they're queued once across all of the workers.
+    """
 
     def __init__(self, app) -> None:
         # Initialize the background scheduler and Flask app
         self.scheduler = BackgroundScheduler()
         self.flask_app = app
+        self.leader_election = None
+
+    def start(self):
+        """Start the leader election, the elected process schedules the periodic jobs."""
+
+        with self.flask_app.app_context():
+            self.leader_election = LeaderElection(db.engine, SCHEDULER_LEADER_LOCK_ID)
+
+        self.scheduler.add_job(
+            self._run_leader_election,
+            id=LEADER_ELECTION_JOB_ID,
+            trigger="interval",
+            seconds=LEADER_ELECTION_INTERVAL_IN_SECONDS,
+            next_run_time=datetime.datetime.now(),
+        )
+        self.scheduler.start()
+
+    def shutdown(self):
+        self.scheduler.shutdown(wait=False)
+        if self.leader_election is not None:
+            self.leader_election.release()
 
-        # Schedule the configured jobs
-        self._schedule_jobs()
+    def _run_leader_election(self):
+        was_leader = self.leader_election.is_leader
+
+        try:
+            is_leader = self.leader_election.try_acquire()
+        except Exception as e:
+            log(APP_NAME, "ERROR", f"Leader election failed, error: {e}")
+            is_leader = False
+
+        if is_leader and not was_leader:
+            log(APP_NAME, "INFO", "Elected as the leader, scheduling the periodic jobs")
+            self._schedule_jobs()
+        elif was_leader and not is_leader:
+            log(APP_NAME, "INFO", "Lost the leadership, unscheduling the periodic jobs")
+            self._unschedule_jobs()
 
     def _schedule_jobs(self):
-        """Schedule jobs based on the provided configuration."""
+        """Schedule queueing the configured jobs, and requeueing the entries of dead workers."""
 
         for job_config in scheduled_jobs_dict.values():
-            # Extract job specific arguments
-            job_args = job_config.get("args", {})
-
-            # Add each job to the scheduler
-            job = self.scheduler.add_job(job_config["func"], args=(self, *job_args.values()), **job_config["schedule_args"])
+            # Each run is queued as a work unit per shard (or a single one), skipped while the previous run of the
+            # unit is still queued or running
+            job = self.scheduler.add_job(
+                self._enqueue_scheduled_job, args=(job_config,), id=job_config["id"], **job_config["schedule_args"]
+            )
 
             # If immediate_run is set, modify the job's next run time
             if job_config["immediate_run"]:
@@ -38,36 +90,103 @@ class SchedulerInstance:
             # Log job scheduling completion
             log(APP_NAME, "DEBUG", f"Job scheduled successfully: {job_config['name']}")
 
+        self.scheduler.add_job(
+            self._requeue_expired_entries,
+            id=REQUEUE_EXPIRED_ENTRIES_JOB_ID,
+            trigger="interval",
+            minutes=5,
+            next_run_time=datetime.datetime.now(),
+        )
+
+    def _unschedule_jobs(self):
+        for job_id in [*scheduled_jobs_dict, REQUEUE_EXPIRED_ENTRIES_JOB_ID]:
+            if self.scheduler.get_job(job_id) is not None:
+                self.scheduler.remove_job(job_id)
+
+    def _enqueue_scheduled_job(self, job_config):
+        # The leadership may have been lost since the last election round
+        if not self.leader_election.try_acquire():
+            return
+
+        with self.flask_app.app_context():
+            for jobs, singleton_key, run_at in build_scheduled_job_entries(job_config, datetime.datetime.now()):
+                job_queue.enqueue(jobs, singleton_key=singleton_key, run_at=run_at)
+
+    def _requeue_expired_entries(self):
+        with self.flask_app.app_context():
+            job_queue.requeue_expired_entries()
+
     def trigger_jobs(self, jobs_config, custom_args={}):
-        """Trigger a new job running a wrapper function that runs all jobs passed in 'jobs_config' in order"""
+        """Queue a job chain running all jobs passed in 'jobs_config' in order"""
 
         log(APP_NAME, "INFO", f"Initiating jobs chain, chaining {len(jobs_config)} jobs")
 
-        # Apply custom arguments
-        for job_config in jobs_config:
-            job_id = job_config["id"]
-            
-            if job_id in custom_args:
-                job_config = job_config.update(custom_args[job_id])
+        # Apply custom arguments on copies, the configs are shared with the scheduled jobs
+        jobs_config = [{**job_config, **custom_args.get(job_config["id"], {})} for job_config in jobs_config]
 
+        with self.flask_app.app_context():
+            job_queue.enqueue([{"id": job_config["id"], "args": job_config.get("args", {})} for job_config in jobs_config])
 
-        self.scheduler.add_job(
-            helper.run_jobs,
-            args=(self, jobs_config),
-            trigger="date",
-            next_run_time=datetime.datetime.now(),
+
+def get_schedule_interval(schedule_args):
+    """Return the interval of an interval trigger's schedule_args."""
+
+    return datetime.timedelta(
+        **{unit: schedule_args[unit] for unit in ("weeks", "days", "hours", "minutes", "seconds") if unit in schedule_args}
+    )
+
+
+def build_scheduled_job_entries(job_config, now):
+    """
+    Build the (jobs, singleton_key, run_at) queue entries of a scheduled job's run.
+
+    A sharded job runs as a work unit per shard of the users, which workers run in parallel and retry on their own.
+    The units' run dates are spread over the job's interval, so the users' scans don't all start at once.
+    """
+
+    args = job_config.get("args", {})
+    if not job_config.get("sharded"):
+        return [([{"id": job_config["id"], "args": args}], job_config["id"], now)]
+
+    interval = get_schedule_interval(job_config["schedule_args"])
+    return [
+        (
+            [{"id": job_config["id"], "args": {**args, "shard": [shard_index, JOB_SHARDS_COUNT]}}],
+            f"{job_config['id']}:{shard_index}",
+            now + interval * shard_index / JOB_SHARDS_COUNT,
         )
+        for shard_index in range(JOB_SHARDS_COUNT)
+    ]
 
 
 def start_scheduler(app):
-    """Initiate and start the background scheduler."""
+    """
+    Initiate the scheduler used by the app to queue jobs.
+    With EMBEDDED_JOB_WORKER set, the app's process also runs a job worker and the periodic jobs (development setup).
+    """
 
     # Log the initiation of the scheduler
     log(APP_NAME, "INFO", "Starting job scheduler")
 
-    # Get the singleton instance of the scheduler and start it
+    # Get the singleton instance of the scheduler
     scheduler_instance = SchedulerInstance.get_instance(app=app)
-    scheduler_instance.scheduler.start()
+
+    if EMBEDDED_JOB_WORKER:
+        scheduler_instance.start()
+        threading.Thread(target=JobWorker(scheduler_instance).run_forever, daemon=True).start()
+        log(APP_NAME, "INFO", "Running an embedded job worker")
 
     # Log the completion of the scheduler start process
     log(APP_NAME, "INFO", "Job scheduler initiated")
+
+
+def start_worker(app):
+    """Run a job worker in the current process until it's interrupted, taking part in the leader election."""
+
+    scheduler_instance = SchedulerInstance.get_instance(app=app)
+    scheduler_instance.start()
+
+    try:
+        JobWorker(scheduler_instance).run_forever()
+    finally:
+        scheduler_instance.shutdown()
@@ -6,7 +6,8 @@ APP_NAME = "Job Scheduler"
 def run_jobs(scheduler, job_list):
     """
     Runs a list of jobs. Each job is expected to have a 'func' attribute pointing to the function to run,
-    and an 'args' attribute containing the arguments for the function.
+    and an 'args' attribute containing the keyword arguments for the function.
+    The chain stops at the first failing job, returns the error it raised or None if all jobs succeeded.
     """
     for count, job in enumerate(job_list, 1):
         try:
@@ -14,9 +15,10 @@ def run_jobs(scheduler, job_list):
 
             # Extract the function and arguments from the job
             job_func = job.get("func")
-            job_args = job.get("args", {})
+            job_args = job.get("args") or {}
 
-            job_func(scheduler, *job_args.values())
+            job_func(scheduler, **job_args)
         except Exception as e:
             log(APP_NAME, "ERROR", f"Job {job.get('id', 'Unknown')} ({count}/{len(job_list)}) failed, error: {e}")
-            break
\ No newline at end of file
+            return e
+    return None
@@ -0,0 +1,191 @@
+import random
+from datetime import datetime, timedelta
+from sqlalchemy import and_, select, text, update
+from sqlalchemy.dialects.postgresql import insert
+from app.database.models import JobQueueEntry, db
+from app.logger import log
+
+from config.app import (
+    JOB_LEASE_TIMEOUT_IN_SECONDS,
+    JOB_MAX_ATTEMPTS,
+    JOB_RETRY_BASE_DELAY_IN_SECONDS,
+    JOB_RETRY_MAX_DELAY_IN_SECONDS,
+)
+
+APP_NAME = "Job Queue"
+
+# Must match the ix_jobQueue_singletonKey_active index predicate for ON CONFLICT to use the index
+ACTIVE_ENTRIES_PREDICATE = text("status IN ('queued', 'running')")
+
+
+def build_enqueue_statement(jobs, singleton_key=None, run_at=None):
+    """
+    Build the INSERT statement queueing a chain of jobs, returning the new entry's id.
+    With a singleton_key, nothing is inserted (and no id returned) while an active entry with the same key exists.
+    """
+
+    now = datetime.now()
+    statement = insert(JobQueueEntry).values(
+        jobs=jobs,
+        singletonKey=singleton_key,
+        status=JobQueueEntry.QUEUED,
+        runAt=run_at or now,
+        attempts=0,
+        createdAt=now,
+    )
+
+    if singleton_key is not None:
+        statement = statement.on_conflict_do_nothing(
+            index_elements=[JobQueueEntry.singletonKey], index_where=ACTIVE_ENTRIES_PREDICATE
+        )
+    return statement.returning(JobQueueEntry.id)
+
+
+def enqueue(jobs, singleton_key=None, run_at=None):
+    """
+    Queue a chain of jobs to be run in order by a job worker, and commit.
+
+    Args:
+        jobs (list): [{"id": <scheduled_jobs_dict key>, "args": {...}}, ...], args must be JSON serializable.
+        singleton_key (str): Skip queueing while an entry with this key is queued or running.
+        run_at (datetime): Don't run the chain before this date, now by default.
+
+    Returns the id of the queued entry, or None if it was skipped.
+    """
+
+    entry_id = db.session.execute(build_enqueue_statement(jobs, singleton_key, run_at)).scalar()
+    db.session.commit()
+
+    if entry_id is None:
+        log(APP_NAME, "DEBUG", f"Skipped queueing jobs {[job['id'] for job in jobs]}, '{singleton_key}' is active")
+    return entry_id
+
+
+def build_claim_statement(now):
+    """Build the SELECT locking the oldest entry due at the given date, skipping entries locked by other workers."""
+
+    return (
+        select(JobQueueEntry)
+        .where(JobQueueEntry.status == JobQueueEntry.QUEUED, JobQueueEntry.runAt <= now)
+        .order_by(JobQueueEntry.runAt, JobQueueEntry.id)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+    )
+
+
+def claim_next(worker_id):
+    """
+    Claim the oldest due entry for a worker, marking it as running, and commit.
+    Concurrent workers skip entries locked by each other, so an entry is only claimed once.
+
+    Returns the entry's {"id", "jobs", "attempts"}, or None when no entry is due.
+    """
+
+    now = datetime.now()
+    entry = db.session.scalars(build_claim_statement(now)).first()
+
+    if entry is None:
+        db.session.rollback()
+        return None
+
+    entry.status = JobQueueEntry.RUNNING
+    entry.lockedBy = worker_id
+    entry.lockedAt = now
+    entry.attempts += 1
+    claimed_entry = {"id": entry.id, "jobs": entry.jobs, "attempts": entry.attempts}
+    db.session.commit()
+
+    return claimed_entry
+
+
+def get_retry_delay(attempts):
+    """
+    Return how long to wait before retrying an entry that failed its given attempt, an exponential backoff with
+    jitter so entries failing together (e.g. the credit card provider is down) don't retry together.
+    """
+
+    delay = min(JOB_RETRY_MAX_DELAY_IN_SECONDS, JOB_RETRY_BASE_DELAY_IN_SECONDS * 2 ** (attempts - 1))
+    return timedelta(seconds=delay * random.uniform(0.5, 1))
+
+
+def _build_claimed_entry_update(entry_id, worker_id):
+    """
+    Build an UPDATE of an entry still claimed by the given worker. Once the worker's lease expired the entry may be
+    requeued and claimed by another worker, which then owns its outcome.
+    """
+
+    return update(JobQueueEntry).where(
+        JobQueueEntry.id == entry_id,
+        JobQueueEntry.lockedBy == worker_id,
+        JobQueueEntry.status == JobQueueEntry.RUNNING,
+    )
+
+
+def _commit_claimed_entry_update(statement, entry_id, worker_id):
+    result = db.session.execute(statement)
+    db.session.commit()
+
+    if not result.rowcount:
+        log(APP_NAME, "WARNING", f"Queue entry {entry_id} isn't claimed by {worker_id} anymore, its lease expired")
+
+
+def finish(entry_id, worker_id, error=None):
+    """Mark an entry claimed by the worker as done, or as failed with the given error, and commit."""
+
+    statement = _build_claimed_entry_update(entry_id, worker_id).values(
+        status=JobQueueEntry.FAILED if error is not None else JobQueueEntry.DONE,
+        finishedAt=datetime.now(),
+        lastError=str(error) if error is not None else None,
+    )
+    _commit_claimed_entry_update(statement, entry_id, worker_id)
+
+
+def fail(entry_id, worker_id, attempts, error):
+    """
+    Queue an entry claimed by the worker whose given attempt failed again after a backoff delay, or mark it as
+    failed once it ran out of attempts, and commit.
+    """
+
+    if attempts >= JOB_MAX_ATTEMPTS:
+        log(APP_NAME, "ERROR", f"Queue entry {entry_id} failed after {attempts} attempts, error: {error}")
+        finish(entry_id, worker_id, error)
+        return
+
+    statement = _build_claimed_entry_update(entry_id, worker_id).values(
+        status=JobQueueEntry.QUEUED,
+        runAt=datetime.now() + get_retry_delay(attempts),
+        lockedBy=None,
+        lockedAt=None,
+        lastError=str(error),
+    )
+    _commit_claimed_entry_update(statement, entry_id, worker_id)
+
+
+def requeue_expired_entries():
+    """
+    Queue again the running entries whose lease expired, their worker most likely died while running them.
+    Returns the number of requeued entries.
+    """
+
+    now = datetime.now()
+    is_expired = and_(
+        JobQueueEntry.status == JobQueueEntry.RUNNING,
+        JobQueueEntry.lockedAt < now - timedelta(seconds=JOB_LEASE_TIMEOUT_IN_SECONDS),
+    )
+
+    # Entries that ran out of attempts aren't requeued, they may be the ones killing their workers
+    failed_result = db.session.execute(
+        update(JobQueueEntry)
+        .where(is_expired, JobQueueEntry.attempts >= JOB_MAX_ATTEMPTS)
+        .values(status=JobQueueEntry.FAILED, finishedAt=now, lastError="The lease expired")
+    )
+    result = db.session.execute(
+        update(JobQueueEntry).where(is_expired).values(status=JobQueueEntry.QUEUED, lockedBy=None, lockedAt=None)
+    )
+    db.session.commit()
+
+    if failed_result.rowcount:
+        log(APP_NAME, "ERROR", f"{failed_result.rowcount} entries with an expired lease ran out of attempts")
+    if result.rowcount:
+        log(APP_NAME, "INFO", f"Requeued {result.rowcount} entries with an expired lease")
+    return result.rowcount
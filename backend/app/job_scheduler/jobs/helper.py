@@ -1,17 +1,54 @@
-def trigger_transactions_processing_jobs(users, deep_scan):
-    """Initiates a processing pipeline by triggering a series of backend jobs"""
+from app.job_scheduler import sharding
+
+
+def trigger_transactions_processing_jobs(users, deep_scan=False, transactions_ids=None):
+    """
+    Initiates a processing pipeline by triggering a series of backend jobs.
+    Unless deep_scan is set, the aggregator only recomputes the spending cells recorded as touched (see
+    spending_changes) by the caller and the categorizer.
+    The pipeline is queued as a chain per shard of the users, so a failing user only delays its own shard.
+
+    With transactions_ids ({userEmail: [transaction ids]}, e.g. the rows the scanner just wrote), the categorizer
+    only categorizes those transactions and hands its category changes to the aggregator as spending deltas.
+    """
 
     from app.job_scheduler.jobs_config import scheduled_jobs_dict
     from app.job_scheduler.app import SchedulerInstance
+    from config.app import JOB_SHARDS_COUNT
 
     chained_jobs = [
         scheduled_jobs_dict["transactions_categorizer"],
         scheduled_jobs_dict["monthly_spending_calculator"],
     ]
+    scheduler = SchedulerInstance.get_instance()
+
+    for shard_index, shard_users in sorted(sharding.group_users_by_shard(users, JOB_SHARDS_COUNT).items()):
+        shard_users = set(shard_users)
+        categorizer_args = {"users_list": sorted(shard_users)}
+        if transactions_ids is not None:
+            categorizer_args["transactions_ids"] = [
+                transaction_id for email in sorted(shard_users) for transaction_id in transactions_ids.get(email, [])
+            ]
+
+        custom_args = {
+            "transactions_categorizer": {"args": categorizer_args},
+            "monthly_spending_calculator": {"args": {"users_list": sorted(shard_users), "deep_scan": deep_scan}},
+        }
+        scheduler.trigger_jobs(chained_jobs, custom_args)
+
+
+def trigger_spending_aggregation(users):
+    """
+    Queue recomputing the spending cells recorded as touched for the given users, e.g. after a transaction was edited.
+    """
+
+    from app.job_scheduler.jobs_config import scheduled_jobs_dict
+    from app.job_scheduler.app import SchedulerInstance
+
+    users = sorted(set(users))
+    if not users:
+        return
 
-    custom_args = {
-        "transactions_categorizer": {"args": {"users_list": users}},
-        "monthly_spending_calculator": {"args": {"users_list": users, "deep_scan": deep_scan}},
-    }
+    custom_args = {"monthly_spending_calculator": {"args": {"users_list": users, "deep_scan": False}}}
     scheduler = SchedulerInstance.get_instance()
-    scheduler.trigger_jobs(chained_jobs, custom_args)
+    scheduler.trigger_jobs([scheduled_jobs_dict["monthly_spending_calculator"]], custom_args)
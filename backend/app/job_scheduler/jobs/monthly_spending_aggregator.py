@@ -1,60 +1,73 @@
+from sqlalchemy import Integer, and_, cast, exists, extract, func, select, tuple_
+from sqlalchemy.dialects.postgresql import insert
 from app.logger import log
 from app.database.models import Transaction, User, UserCategorySpending, db
+from app.database.data_version import bump_data_version
 from datetime import datetime
 from app.helper import date_to_number
+from app.job_scheduler import sharding, spending_changes
+
+from config.app import AGGREGATION_USERS_BATCH_SIZE
 
 APP_NAME = "Monthly Spending Aggregator"
 
 
-def aggregate_monthly_spending(scheduler, users_list=None, deep_scan=False):
-    """Aggregates all users' monthly spending."""
+def aggregate_monthly_spending(scheduler, users_list=None, deep_scan=False, shard=None):
+    """
+    Aggregates users' monthly spending, of the users of the given [index, shards count] shard if one is passed.
+
+    A deep scan recomputes the full history of the users, otherwise only the changes recorded for the users (see
+    spending_changes) are applied: touched cells are recomputed and the deltas of the other cells are added to the
+    stored spending. Changes are drained per batch of users, in the database transaction applying them, so a failed
+    batch keeps its changes for the retry or the next run.
+    """
 
     log(APP_NAME, "INFO", f"Starting {APP_NAME}, deep_scan: {deep_scan}, users: {users_list}")
 
     with scheduler.flask_app.app_context():
         try:
-            # Select users based on the given list or all users if none is provided.
-            if isinstance(users_list, list):
-                users = User.query.filter(User.email.in_(users_list)).all()
-                log(APP_NAME, "DEBUG", f"Perfoming a focused monthly spending aggregation on {len(users_list)} users")
+            if shard is not None and users_list is None:
+                users_list = sharding.get_shard_users(shard)
+
+            if deep_scan:
+                # Select users based on the given list or all users if none is provided.
+                if isinstance(users_list, list):
+                    emails = [row.email for row in db.session.query(User.email).filter(User.email.in_(users_list))]
+                    log(APP_NAME, "DEBUG", f"Perfoming a focused monthly spending aggregation on {len(users_list)} users")
+                else:
+                    emails = [row.email for row in db.session.query(User.email)]
+                    log(APP_NAME, "DEBUG", "Perfoming am all users monthly spending aggregation")
             else:
-                users = User.query.all()
-                log(APP_NAME, "DEBUG", "Perfoming am all users monthly spending aggregation")
+                emails = spending_changes.get_touched_users(users_list if isinstance(users_list, list) else None)
+                log(APP_NAME, "DEBUG", f"Applying the recorded spending changes of {len(emails)} users")
+
+            for batch_start in range(0, len(emails), AGGREGATION_USERS_BATCH_SIZE):
+                batch_emails = emails[batch_start : batch_start + AGGREGATION_USERS_BATCH_SIZE]
 
-            for user in users:
-                # If a deep scan is performed, all of the previous UserCategorySpending data can be delete
+                # The full recompute of a deep scan covers the changes recorded so far
+                touched_keys, deltas = spending_changes.drain_changes(batch_emails)
                 if deep_scan:
-                    UserCategorySpending.query.filter(UserCategorySpending.userEmail == user.email).delete(
-                        synchronize_session=False
-                    )
-
-                # Fetch user transactions and calculate spending data.
-                transactions = get_transactions_from_db(user, deep_scan)
-                spending_data = get_monthly_spending_data(transactions)
-
-                # Process spending data for each user and modify database.
-                for spending_date, categories in spending_data.items():
-                    for categoryId, spending_amount in categories.items():
-                        monthly_spending_object = UserCategorySpending.query.filter(
-                            UserCategorySpending.userEmail == user.email,
-                            UserCategorySpending.date == spending_date,
-                            UserCategorySpending.userCategoryId == categoryId,
-                        ).first()
-
-                        # Either add new UserCategorySpending row or update existing one
-                        if not monthly_spending_object:
-                            monthly_spending_object = UserCategorySpending(
-                                userEmail=user.email,
-                                date=spending_date,
-                                userCategoryId=categoryId,
-                                spendingAmount=spending_amount,
-                            )
-                            db.session.add(monthly_spending_object)
-                        else:
-                            monthly_spending_object.spendingAmount = spending_amount
-                user.initialSetupDone = True
-
-            db.session.commit()
+                    db.session.execute(build_spending_aggregation_statement(batch_emails))
+                else:
+                    if not touched_keys and not deltas:
+                        continue
+                    recomputed_keys, deltas = split_spending_changes(touched_keys, deltas)
+                    if recomputed_keys:
+                        db.session.execute(
+                            build_spending_aggregation_statement(batch_emails, spending_keys=list(recomputed_keys))
+                        )
+                    if deltas:
+                        db.session.execute(build_spending_delta_statement(deltas))
+                    log(APP_NAME, "DEBUG", f"Recomputing {len(recomputed_keys)} spending cells, adding {len(deltas)} deltas")
+
+                User.query.filter(User.email.in_(batch_emails)).update(
+                    {User.initialSetupDone: True}, synchronize_session=False
+                )
+                bump_data_version(batch_emails)
+                db.session.commit()
+
+                log(APP_NAME, "DEBUG", f"Aggregated monthly spending for {batch_start + len(batch_emails)}/{len(emails)} users")
+
             log(APP_NAME, "INFO", f"{APP_NAME} finished")
         except Exception as e:
             db.session.rollback()
@@ -62,24 +75,110 @@ def aggregate_monthly_spending(scheduler, users_list=None, deep_scan=False):
             raise e
 
 
-def get_transactions_from_db(user, full_history):
-    query = Transaction.query.filter(Transaction.userEmail == user.email, Transaction.isRecurring == False)
-
-    # Limit to current month's transactions if not full history.
-    if not full_history:
-        current_date = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        query = query.filter(Transaction.purchaseDate >= current_date)
-
-    return query.order_by(Transaction.purchaseDate)
-
-
-def get_monthly_spending_data(transactions):
-    # Aggregate spending data from transactions.
-
-    spending_data = {}
-    for transaction in transactions:
-        transaction_date = date_to_number(transaction.purchaseDate)
-        spending_data.setdefault(transaction_date, {}).setdefault(transaction.categoryId, 0)
-        spending_data[transaction_date][transaction.categoryId] += transaction.transactionAmount
-
-    return spending_data
+def split_spending_changes(touched_keys, deltas):
+    """
+    Split drained changes into the cells to recompute and the {cell: amount} deltas to add to the stored spending.
+
+    Cells hold their transactions' rounded sum, so only whole deltas can be added without drifting from a
+    recomputation. Cells with a fractional delta are recomputed along with the touched ones, which already include
+    their deltas.
+    """
+
+    recomputed_keys = set(touched_keys)
+    recomputed_keys.update(key for key, amount in deltas.items() if not float(amount).is_integer())
+    deltas = {key: amount for key, amount in deltas.items() if key not in recomputed_keys and amount}
+    return recomputed_keys, deltas
+
+
+def build_spending_delta_statement(deltas):
+    """
+    Builds a single statement adding whole {(userEmail, date, categoryId): amount} deltas to the UserCategorySpending
+    rows, creating the missing ones (see split_spending_changes).
+    """
+
+    spending_table = UserCategorySpending.__table__
+    statement = insert(spending_table).values(
+        [
+            {"userEmail": email, "date": date, "userCategoryId": category_id, "spendingAmount": round(amount)}
+            for (email, date, category_id), amount in sorted(deltas.items())
+        ]
+    )
+    return statement.on_conflict_do_update(
+        constraint="uq_userCategorySpending_userEmail_userCategoryId_date",
+        set_={"spendingAmount": spending_table.c.spendingAmount + statement.excluded.spendingAmount},
+    )
+
+
+def build_spending_aggregation_statement(emails, since_date=None, spending_keys=None):
+    """
+    Builds a single statement recomputing the users' UserCategorySpending rows from their transactions.
+
+    Transactions are summed per (user, month, category) in the database and upserted with INSERT ... ON CONFLICT
+    on the (userEmail, userCategoryId, date) unique key, rows of the recomputed period without transactions
+    anymore are deleted.
+
+    Args:
+        emails (list): The users to aggregate.
+        since_date (datetime): Only months starting at this date are recomputed, None recomputes the full history.
+        spending_keys (list): Only these (userEmail, date, categoryId) cells are recomputed, None recomputes all cells.
+    """
+
+    spending_date = cast(
+        extract("year", Transaction.purchaseDate) * 100 + extract("month", Transaction.purchaseDate), Integer
+    )
+    transactions_filter = and_(
+        Transaction.userEmail.in_(emails), Transaction.isRecurring == False, Transaction.isDeleted == False
+    )
+    spending_filter = UserCategorySpending.userEmail.in_(emails)
+
+    if since_date is not None:
+        transactions_filter = and_(transactions_filter, Transaction.purchaseDate >= since_date)
+        spending_filter = and_(spending_filter, UserCategorySpending.date >= date_to_number(since_date))
+
+    if spending_keys is not None:
+        transactions_filter = and_(
+            transactions_filter, tuple_(Transaction.userEmail, spending_date, Transaction.categoryId).in_(spending_keys)
+        )
+        spending_filter = and_(
+            spending_filter,
+            tuple_(UserCategorySpending.userEmail, UserCategorySpending.date, UserCategorySpending.userCategoryId).in_(
+                spending_keys
+            ),
+        )
+
+    aggregated = (
+        select(
+            Transaction.userEmail.label("userEmail"),
+            Transaction.categoryId.label("userCategoryId"),
+            spending_date.label("date"),
+            cast(func.sum(Transaction.transactionAmount), Integer).label("spendingAmount"),
+        )
+        .where(transactions_filter)
+        .group_by(Transaction.userEmail, Transaction.categoryId, spending_date)
+        .cte("aggregated")
+    )
+
+    spending_table = UserCategorySpending.__table__
+
+    stale = (
+        spending_table.delete()
+        .where(
+            spending_filter,
+            ~exists().where(
+                spending_table.c.userEmail == aggregated.c.userEmail,
+                spending_table.c.userCategoryId == aggregated.c.userCategoryId,
+                spending_table.c.date == aggregated.c.date,
+            ),
+        )
+        .returning(spending_table.c.id)
+        .cte("stale")
+    )
+
+    statement = insert(spending_table).from_select(
+        ["userEmail", "userCategoryId", "date", "spendingAmount"],
+        select(aggregated.c.userEmail, aggregated.c.userCategoryId, aggregated.c.date, aggregated.c.spendingAmount),
+    )
+    return statement.on_conflict_do_update(
+        constraint="uq_userCategorySpending_userEmail_userCategoryId_date",
+        set_={"spendingAmount": statement.excluded.spendingAmount},
+    ).add_cte(stale)
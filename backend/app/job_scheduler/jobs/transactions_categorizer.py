@@ -1,13 +1,20 @@
 from sqlalchemy import or_
 from app.database.models import Transaction, db
+from app.job_scheduler import sharding
 from app.logger import log
 from app.merchant_aggregator.merchant_aggregator import categorize_for_all_users
 
 APP_NAME = "Transactions Categorizer"
 
 
-def categorize_all_transactions(scheduler, users_list=None):
-    """Categorizes all transactions that have not been categorized yet."""
+def categorize_all_transactions(scheduler, users_list=None, shard=None, transactions_ids=None):
+    """
+    Categorizes all transactions that have not been categorized yet.
+    Passing a [index, shards count] shard instead of a users list categorizes the transactions of the shard's users.
+
+    Passing transactions_ids (e.g. the transactions the scanner just wrote) only categorizes those transactions.
+    Category changes are recorded as spending deltas with each committed batch, for the monthly spending aggregator.
+    """
 
     log_message = "Transactions Categorizer started"
     if isinstance(users_list, list):
@@ -18,7 +25,10 @@ def categorize_all_transactions(scheduler, users_list=None):
 
     try:
         with scheduler.flask_app.app_context():
-            unparsed_transactions = fetch_transaction(users_list)
+            if shard is not None and users_list is None:
+                users_list = sharding.get_shard_users(shard)
+
+            unparsed_transactions = fetch_transaction(users_list, transactions_ids)
             unparsed_transactions_dict = {}
 
             if len(unparsed_transactions) == 0:
@@ -44,7 +54,7 @@ def categorize_all_transactions(scheduler, users_list=None):
         raise e
 
 
-def fetch_transaction(users_list):
+def fetch_transaction(users_list, transactions_ids=None):
     query = Transaction.query.filter(
         or_(
             Transaction.categoryId == -1,
@@ -54,6 +64,8 @@ def fetch_transaction(users_list):
 
     if isinstance(users_list, list):
         query = query.filter(Transaction.userEmail.in_(users_list))
+    if transactions_ids is not None:
+        query = query.filter(Transaction.id.in_(transactions_ids))
 
     unparsed_transactions = query.order_by(Transaction.purchaseDate.desc()).all()
     return unparsed_transactions
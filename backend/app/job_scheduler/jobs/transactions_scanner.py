@@ -1,79 +1,314 @@
+import asyncio
 from datetime import datetime, timedelta
+from sqlalchemy import delete, func, literal_column, select
+from sqlalchemy.dialects.postgresql import insert
 from app.database.models import Transaction, User, db
+from app.database.data_version import bump_data_version
 from app.helper import add_failed_login_user_warning, fetch_users_for_scraping
 from app.logger import log
-from app.credit_card_adapters.max_fetcher import fetch_transactions_from_max
+from app.credit_card_adapters.base_adapter import LoginFailedError
+from app.credit_card_adapters.registry import get_adapter
+from app.job_scheduler import spending_changes
 from app.job_scheduler.jobs.helper import trigger_transactions_processing_jobs
-from config.app import DEEP_TRANSACTIONS_SCAN_DEPTH_IN_DAYS, SHALLOW_TRANSACTION_SCAN_DEPTH_IN_DAYS
+from config.app import (
+    BULK_WRITE_BATCH_SIZE,
+    DEEP_TRANSACTIONS_SCAN_DEPTH_IN_DAYS,
+    INCREMENTAL_SCAN_OVERLAP_IN_DAYS,
+    SHALLOW_TRANSACTION_SCAN_DEPTH_IN_DAYS,
+    TRANSACTIONS_SCAN_TIMEOUT_IN_SECONDS,
+    TRANSACTIONS_SCANNER_WORKERS_COUNT,
+    TRANSACTIONS_USER_FETCH_TIMEOUT_IN_SECONDS,
+)
 
 APP_NAME = "Transactions Scanner"
 
+# Columns refreshed when a scanned transaction already exists, user edited columns
+# (categoryId, merchantData, isDeleted) are kept as they are
+UPSERT_UPDATED_COLUMNS = [
+    "arn",
+    "authorizationNumber",
+    "transactionAmount",
+    "purchaseDate",
+    "paymentDate",
+    "shortCardNumber",
+    "originalCurrency",
+    "originalAmount",
+    "isPending",
+]
+
+
+def _build_fetch_args(user, dates):
+    """
+    Build the arguments needed to fetch a user's transactions.
+    Runs before the fetch stage so fetching never touches the database session.
+    """
+
+    return {
+        "user_credentials": {
+            "username": user.appUserCredentials.username,
+            "password": user.appUserCredentials.password,
+            "id": user.appUserCredentials.identityDocumentNumber,
+        },
+        "user_email": user.email,
+        "dates": dates,
+    }
+
 
-def _fetch_user_transactions(user, dates):
-    """Fetch transactions for a user within a given date range."""
+# Results of the users' fetches that didn't return transactions
+FETCH_LOGIN_FAILED = "login_failed"  # The credit card company rejected the user's credentials
+FETCH_FAILED = "failed"
+FETCH_TIMED_OUT = "timed_out"  # Hit the per user timeout, or the scan's timeout while running
+FETCH_NOT_ATTEMPTED = "not_attempted"  # Still waiting for a worker when the scan timed out
 
+
+async def _fetch_user_transactions(adapter, fetch_args, timeout):
+    """Fetch transactions for a user within a given date range, returns the transactions or a FETCH_* result."""
+
+    user_email = fetch_args["user_email"]
     try:
-        log(APP_NAME, "DEBUG", f"Fetching transactions for user {user.email}, monthView: {dates == None}")
-        transactions = fetch_transactions_from_max(
-            user_credentials={
-                "username": user.appUserCredentials.username,
-                "password": user.appUserCredentials.password,
-                "id": user.appUserCredentials.identityDocumentNumber,
-            },
-            user_email=user.email,
-            dates=dates,
-        )
+        log(APP_NAME, "DEBUG", f"Fetching transactions for user {user_email}, monthView: {fetch_args['dates'] == None}")
+        transactions = await asyncio.wait_for(adapter.fetch_transactions(**fetch_args), timeout)
         log(
             APP_NAME,
             "DEBUG",
-            f"Successfully fetched transactions for user {user.email}, received {len(transactions)} transactions",
+            f"Successfully fetched transactions for user {user_email}, received {len(transactions)} transactions",
         )
         return transactions
+    except asyncio.TimeoutError:
+        log(APP_NAME, "ERROR", f"Failed to fetch transactions for user {user_email}. Error: timed out after {timeout}s")
+        return FETCH_TIMED_OUT
+    except LoginFailedError as e:
+        log(APP_NAME, "ERROR", f"Failed to login user {user_email}. Error: {e}")
+        return FETCH_LOGIN_FAILED
     except Exception as e:
-        log(APP_NAME, "ERROR", f"Failed to fetch transactions for user {user.email}. Error: {e}")
-        return None
+        log(APP_NAME, "ERROR", f"Failed to fetch transactions for user {user_email}. Error: {e}")
+        return FETCH_FAILED
+
+
+async def _fetch_users_transactions(adapter, fetch_args_list, workers_count, timeout, user_timeout):
+    """Run the users' fetches on the event loop, at most `workers_count` at a time."""
+
+    semaphore = asyncio.Semaphore(workers_count)
+    results = {}
+    started_users = set()
+
+    async def fetch(fetch_args):
+        async with semaphore:
+            started_users.add(fetch_args["user_email"])
+            results[fetch_args["user_email"]] = await _fetch_user_transactions(adapter, fetch_args, user_timeout)
+
+    async with adapter:
+        tasks = [asyncio.create_task(fetch(fetch_args)) for fetch_args in fetch_args_list]
+        _, pending_tasks = await asyncio.wait(tasks, timeout=timeout)
+
+        if pending_tasks:
+            for task in pending_tasks:
+                task.cancel()
+            await asyncio.wait(pending_tasks)
+
+            timed_out_users = [email for email in (a["user_email"] for a in fetch_args_list) if email not in results]
+            for email in timed_out_users:
+                results[email] = FETCH_TIMED_OUT if email in started_users else FETCH_NOT_ATTEMPTED
+            log(APP_NAME, "WARNING", f"Transactions fetch timed out for the following users: {', '.join(timed_out_users)}")
+
+    return results
+
+
+def _fetch_users_transactions_concurrently(
+    fetch_args_list,
+    adapter=None,
+    workers_count=TRANSACTIONS_SCANNER_WORKERS_COUNT,
+    timeout=TRANSACTIONS_SCAN_TIMEOUT_IN_SECONDS,
+    user_timeout=TRANSACTIONS_USER_FETCH_TIMEOUT_IN_SECONDS,
+):
+    """
+    Fetch transactions for multiple users concurrently on a single event loop, using the configured
+    credit card adapter unless one is given.
+
+    Returns a dictionary mapping each user email to its fetched transactions, or to a FETCH_* result if the fetch
+    failed or didn't finish before the timeout.
+    """
+
+    results = {fetch_args["user_email"]: FETCH_NOT_ATTEMPTED for fetch_args in fetch_args_list}
+    if len(fetch_args_list) == 0:
+        return results
+
+    adapter = adapter if adapter is not None else get_adapter()
+    results.update(asyncio.run(_fetch_users_transactions(adapter, fetch_args_list, workers_count, timeout, user_timeout)))
+    return results
+
+
+def _get_existing_user_transactions(user_email, fetched_transactions):
+    """
+    Retrieve the existing transactions matching a batch of fetched transactions for a user.
+
+    Only the ids and authorization numbers present in the batch are looked up, so the work is bounded
+    by the batch size rather than by the user's history.
+    Returns the set of existing confirmed transaction ids and the matching pending transactions.
+    """
 
+    fetched_ids = {t.id for t in fetched_transactions}
+    fetched_authorization_numbers = {t.authorizationNumber for t in fetched_transactions if t.authorizationNumber}
 
-def _get_existing_user_transactions(user_email):
-    """Retrieve existing transactions for a user from the database."""
+    confirmed_ids = set()
+    if fetched_ids:
+        confirmed_ids = {
+            transaction_id
+            for (transaction_id,) in db.session.query(Transaction.id).filter(
+                Transaction.userEmail == user_email,
+                Transaction.id.in_(fetched_ids),
+                Transaction.isPending.is_not(True),
+            )
+        }
 
-    transactions = Transaction.query.filter(Transaction.userEmail == user_email).all()
-    confirmed = []
     pending = []
+    if fetched_authorization_numbers:
+        pending = Transaction.query.filter(
+            Transaction.userEmail == user_email,
+            Transaction.authorizationNumber.in_(fetched_authorization_numbers),
+            Transaction.isPending == True,
+        ).all()
 
-    for t in transactions:
-        if t.isPending:
-            pending.append(t)
-        else:
-            confirmed.append(t)
+    return confirmed_ids, pending
 
-    return confirmed, pending
 
+def _bulk_write_user_transactions(transactions, promoted_pending_ids):
+    """
+    Write a user's scanned transactions in a single database transaction.
 
-def _calculate_scan_depth(last_scan_date):
+    New transactions are inserted in batches with INSERT ... ON CONFLICT (id) DO UPDATE and the pending
+    transactions that got promoted to confirmed ones are removed with a single set-based delete.
+    The spending cells of the written rows, before and after the write, and of the deleted rows are marked for the
+    monthly spending aggregator.
+    Returns the inserted, updated and deleted rows counts, and the ids of the inserted and updated rows.
+    """
+
+    counts = {"inserted": 0, "updated": 0, "deleted": 0}
+    written_ids = []
+    spending_keys = set()
+    changed_emails = set()
+    returned_columns = (Transaction.userEmail, Transaction.purchaseDate, Transaction.categoryId)
+
+    try:
+        if promoted_pending_ids:
+            statement = delete(Transaction).where(Transaction.id.in_(promoted_pending_ids))
+            for email, purchase_date, category_id in db.session.execute(statement.returning(*returned_columns)):
+                spending_keys.add(spending_changes.get_spending_key(email, purchase_date, category_id))
+                changed_emails.add(email)
+                counts["deleted"] += 1
+
+        rows = [t.to_row() for t in transactions]
+        for index in range(0, len(rows), BULK_WRITE_BATCH_SIZE):
+            batch_rows = rows[index : index + BULK_WRITE_BATCH_SIZE]
+
+            # RETURNING only gives the new values, the cells of the rows about to be updated are read beforehand
+            # so a transaction moved to another month or category is taken out of its previous cell too
+            existing_rows = db.session.execute(
+                select(*returned_columns).where(Transaction.id.in_([row["id"] for row in batch_rows])).with_for_update()
+            )
+            for email, purchase_date, category_id in existing_rows:
+                if purchase_date is not None:
+                    spending_keys.add(spending_changes.get_spending_key(email, purchase_date, category_id))
+
+            statement = insert(Transaction).values(batch_rows)
+            statement = statement.on_conflict_do_update(
+                index_elements=[Transaction.id],
+                set_={column: statement.excluded[column] for column in UPSERT_UPDATED_COLUMNS},
+            )
+
+            # xmax is 0 only for freshly inserted rows, conflicting rows that got updated have it set
+            statement = statement.returning(literal_column("xmax = 0"), Transaction.id, *returned_columns)
+            for is_inserted, transaction_id, email, purchase_date, category_id in db.session.execute(statement):
+                counts["inserted" if is_inserted else "updated"] += 1
+                written_ids.append(transaction_id)
+                changed_emails.add(email)
+                if purchase_date is not None:
+                    spending_keys.add(spending_changes.get_spending_key(email, purchase_date, category_id))
+
+        # Only the users whose rows were actually written or deleted
+        bump_data_version(changed_emails)
+        spending_changes.mark_touched(spending_keys)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    return counts, written_ids
+
+
+def _get_oldest_pending_purchase_dates(user_emails):
+    """Retrieve the purchase date of each user's oldest pending transaction."""
+
+    if len(user_emails) == 0:
+        return {}
+
+    rows = (
+        db.session.query(Transaction.userEmail, func.min(Transaction.purchaseDate))
+        .filter(Transaction.userEmail.in_(user_emails), Transaction.isPending == True)
+        .group_by(Transaction.userEmail)
+        .all()
+    )
+    return {email: oldest_pending_date for email, oldest_pending_date in rows}
+
+
+def _is_deep_scan_required(last_scan_date):
+    """Return True if the last scan was more than 30 days ago or never done."""
+
+    return not last_scan_date or (datetime.now() - last_scan_date).days > 30
+
+
+def _calculate_scan_depth(last_scan_date, high_water_mark=None, oldest_pending_date=None):
     """
     Calculate the depth of transactions scan for a user.
 
     - If the last scan was more than 30 days ago or never done, perform a deep scan.
-    - Returns None if the last scan was within the last 30 days.
-    - Returns start and end dates for the scan otherwise.
+    - Returns None (month view) if the user has no high-water mark yet.
+    - Otherwise returns the smallest range that can contain new or still pending transactions:
+      from the high-water mark (minus a small overlap for late postings) or the oldest pending
+      transaction, whichever is earlier, up to now. The range is never deeper than a shallow scan.
     """
 
     # Check if the last scan date is more than 30 days ago or if there's no last scan date
-    if not last_scan_date or (datetime.now() - last_scan_date).days > 30:
+    if _is_deep_scan_required(last_scan_date):
         start_date = datetime.now() - timedelta(days=DEEP_TRANSACTIONS_SCAN_DEPTH_IN_DAYS)
         end_date = datetime.now()
         return start_date, end_date
-    else:
+    elif high_water_mark is None:
         return None
 
+    end_date = datetime.now()
+    start_date = high_water_mark - timedelta(days=INCREMENTAL_SCAN_OVERLAP_IN_DAYS)
+    if oldest_pending_date is not None:
+        start_date = min(start_date, oldest_pending_date)
+
+    start_date = max(start_date, end_date - timedelta(days=SHALLOW_TRANSACTION_SCAN_DEPTH_IN_DAYS))
+    return start_date.replace(hour=0, minute=0, second=0, microsecond=0), end_date
+
+
+def _update_users_scan_state(users, fetched_transactions):
+    """Update the last scan date and the high-water mark of the scanned users."""
+
+    # The scan date is a validator of its own, scans only bump the data version when they write transactions
+    for user in users:
+        user.lastTransactionsScanDate = datetime.now()
+
+        confirmed_purchase_dates = [
+            t.purchaseDate
+            for t in fetched_transactions.get(user.email) or []
+            if not t.isPending and t.purchaseDate is not None
+        ]
+        if confirmed_purchase_dates:
+            latest_purchase_date = max(confirmed_purchase_dates)
+            if user.transactionsHighWaterMark is None or latest_purchase_date > user.transactionsHighWaterMark:
+                user.transactionsHighWaterMark = latest_purchase_date
 
-def scan_users_transactions(scheduler, users_list=None):
-    """Fetch and process transactions"""
+
+def scan_users_transactions(scheduler, users_list=None, shard=None):
+    """Fetch and process transactions, of the users of the given [index, shards count] shard only if one is passed"""
 
     log(APP_NAME, "INFO", "Starting transactions scanner")
-    aggregation_deep_scan_required = False
     updated_users = []
+    written_ids_by_user = {}
     try:
         with scheduler.flask_app.app_context():
             if isinstance(users_list, list):
@@ -81,7 +316,7 @@ def scan_users_transactions(scheduler, users_list=None):
                 log(APP_NAME, "DEBUG", f"Perfoming a focused transactions scan on {len(users_list)} users")
             else:
                 # Fetch users to scan and those to skip
-                users_to_scan, skipped_users = fetch_users_for_scraping()
+                users_to_scan, skipped_users = fetch_users_for_scraping(shard)
 
                 # Log scan type and users count
                 if len(users_to_scan) > 0:
@@ -94,20 +329,30 @@ def scan_users_transactions(scheduler, users_list=None):
                     log(APP_NAME, "INFO", "No users to scan")
                     return
 
-            transactions_to_add = {}
+            oldest_pending_dates = _get_oldest_pending_purchase_dates([user.email for user in users_to_scan])
+
+            fetch_args_list = []
             for user in users_to_scan:
                 # scan_dates = _calculate_scan_depth(None)
-                scan_dates = _calculate_scan_depth(user.lastTransactionsScanDate)
-                if scan_dates is not None:
-                    aggregation_deep_scan_required = True
+                scan_dates = _calculate_scan_depth(
+                    user.lastTransactionsScanDate,
+                    user.transactionsHighWaterMark,
+                    oldest_pending_dates.get(user.email),
+                )
 
-                # Fetch transactions for the user within the scan dates
-                user_transactions = _fetch_user_transactions(user=user, dates=scan_dates)
+                fetch_args_list.append(_build_fetch_args(user, scan_dates))
+
+            # Fetch transactions for all users concurrently, the rest of the scan runs sequentially
+            fetched_transactions = _fetch_users_transactions_concurrently(fetch_args_list)
+
+            transactions_to_add = {}
+            for user in users_to_scan:
+                user_transactions = fetched_transactions[user.email]
 
-                # Add user warnings for failed scans
-                if user_transactions is None:
+                # Only rejected credentials count towards the failed logins threshold, timeouts are our own deadlines
+                if user_transactions == FETCH_LOGIN_FAILED:
                     add_failed_login_user_warning(user.email)
-                else:
+                elif isinstance(user_transactions, list):
                     transactions_to_add[user.email] = user_transactions
 
             # Count new transactions for logging purposes
@@ -118,20 +363,19 @@ def scan_users_transactions(scheduler, users_list=None):
             log(APP_NAME, "INFO", f"Transaction scanner fetched {transactions_count} transactions")
 
             if transactions_count > 0:
-                new_transactions = {}
+                failed_users = []
 
                 # Compare fetched transactions with existing ones to find new transactions
                 for email, transactions in transactions_to_add.items():
-                    if email not in new_transactions:
-                        new_transactions[email] = []
+                    new_transactions = []
+                    promoted_pending_ids = []
 
-                    # Get existing confirmed and pending transactions for the user
-                    confirmed_user_transactions, pending_user_transactions = _get_existing_user_transactions(email)
+                    # Get the existing confirmed and pending transactions matching the fetched batch
+                    confirmed_user_transaction_ids, pending_user_transactions = _get_existing_user_transactions(
+                        email, transactions
+                    )
 
                     # Insert to a dict for a faster lookout
-                    confirmed_user_transactions_dict = {
-                        transaction.id: transaction for transaction in confirmed_user_transactions
-                    }
                     pending_user_transactions_dict = {
                         transaction.authorizationNumber: transaction for transaction in pending_user_transactions
                     }
@@ -143,40 +387,52 @@ def scan_users_transactions(scheduler, users_list=None):
                             and transaction.isPending is False
                         )
                         is_confirmed_new = (
-                            transaction.id not in confirmed_user_transactions_dict
+                            transaction.id not in confirmed_user_transaction_ids
                             and transaction.authorizationNumber not in pending_user_transactions_dict
                         )
 
                         if is_pending_update:
-                            # delete the old pending transaction from the database.
+                            # The old pending transaction gets deleted from the database.
                             to_delete = pending_user_transactions_dict[transaction.authorizationNumber]
                             transaction.categoryId = to_delete.categoryId
-                            db.session.delete(to_delete)
+                            promoted_pending_ids.append(to_delete.id)
                         if is_pending_update or is_confirmed_new:
                             # If the transaction is either a new transaction or an update to a pending transaction,
                             # add it to the list of new transactions for this user.
-                            new_transactions[email].append(transaction)
+                            new_transactions.append(transaction)
 
-                # Add new transactions to the database
-                updated_users = [users for users, values in new_transactions.items() if len(values) > 0]
+                    if len(new_transactions) == 0:
+                        continue
 
-                try:
-                    for transactions in new_transactions.values():
-                        db.session.add_all(transactions)
+                    # Add new transactions to the database
+                    try:
+                        counts, written_ids_by_user[email] = _bulk_write_user_transactions(
+                            new_transactions, promoted_pending_ids
+                        )
+                        updated_users.append(email)
+                        log(
+                            APP_NAME,
+                            "DEBUG",
+                            f"Wrote transactions for user {email}, inserted: {counts['inserted']}, "
+                            f"updated: {counts['updated']}, deleted pending: {counts['deleted']}",
+                        )
+                    except Exception as e:
+                        log(APP_NAME, "ERROR", f"Failed to write transactions for user {email}. Error: {str(e)}")
+                        failed_users.append(email)
 
-                    # Update the last transaction scan date for each user
-                    for user in users_to_scan:
-                        user.lastTransactionsScanDate = datetime.now()
+                # Don't move the high-water mark of users whose transactions weren't written
+                for email in failed_users:
+                    transactions_to_add.pop(email)
 
-                    db.session.commit()
-                except Exception as e:
-                    log(APP_NAME, "ERROR", f"Failed to set categorized transactions. Error: {str(e)}")
-                    return
+            # Update the last transaction scan date and high-water mark for each user
+            _update_users_scan_state(users_to_scan, transactions_to_add)
+            db.session.commit()
 
             # Trigger the rest of the processing jobs
             if len(updated_users) > 0:
                 log(APP_NAME, "DEBUG", f"Triggering processing jobs for: {', '.join(updated_users)}")
-                trigger_transactions_processing_jobs(updated_users, aggregation_deep_scan_required)
+                # The written rows are handed over to the pipeline, which may run in another worker process
+                trigger_transactions_processing_jobs(updated_users, transactions_ids=written_ids_by_user)
             log(APP_NAME, "INFO", "Finished transactions scan")
     except Exception as e:
         log(APP_NAME, "ERROR", f"An error occured while scanning transactions: {e}")
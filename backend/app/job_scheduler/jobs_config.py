@@ -6,6 +6,7 @@ scheduled_jobs_dict = {
     "transactions_scanner": {
         "id":"transactions_scanner",
         "name": "Transactions Scanner",
+        "sharded": True,
         "func": scan_users_transactions,
         "schedule_args": {"trigger": "interval", "minutes": 5},
         "immediate_run": True,
@@ -13,6 +14,7 @@ scheduled_jobs_dict = {
     "transactions_categorizer": {
         "id":"transactions_categorizer",
         "name": "Transactions Categorizer",
+        "sharded": True,
         "func": categorize_all_transactions,
         "schedule_args": {"trigger": "interval", "minutes": 60},
         "immediate_run": False,
@@ -23,6 +25,18 @@ scheduled_jobs_dict = {
         "func": aggregate_monthly_spending,
         "schedule_args": {"trigger": "interval", "minutes": 60},
         "immediate_run": False,
+        "args": {
+            "users_list": None,
+            "deep_scan": False,
+        },
+    },
+    "monthly_spending_reconciler": {
+        "id":"monthly_spending_reconciler",
+        "name": "Monthly Spending Reconciler",
+        "sharded": True,
+        "func": aggregate_monthly_spending,
+        "schedule_args": {"trigger": "interval", "hours": 24},
+        "immediate_run": False,
         "args": {
             "users_list": None,
             "deep_scan": True,
@@ -0,0 +1,79 @@
+import threading
+from sqlalchemy import text
+from app.logger import log
+
+APP_NAME = "Leader Election"
+
+
+class LeaderElection:
+    """
+    Elects a single leader among the processes sharing a PostgreSQL database with a session level advisory lock.
+
+    The leader holds the lock on a dedicated connection. PostgreSQL releases it when that connection is lost (e.g.
+    the process died), so another process acquires it on its next attempt and takes over.
+    """
+
+    def __init__(self, engine, lock_id):
+        self.lock_id = lock_id
+        self._engine = engine
+        self._connection = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_leader(self):
+        return self._connection is not None
+
+    def _drop_connection(self):
+        try:
+            self._connection.invalidate()
+        except Exception:
+            pass
+        self._connection = None
+
+    def try_acquire(self):
+        """Try to become (or make sure this process still is) the leader, returns whether it is."""
+
+        with self._lock:
+            if self._connection is not None:
+                # The lock is lost with the connection holding it
+                try:
+                    self._connection.execute(text("SELECT 1"))
+                    self._connection.commit()
+                    return True
+                except Exception as e:
+                    log(APP_NAME, "ERROR", f"Lost the leader connection, error: {e}")
+                    self._drop_connection()
+
+            connection = self._engine.connect()
+            try:
+                is_acquired = connection.execute(
+                    text("SELECT pg_try_advisory_lock(:lock_id)"), {"lock_id": self.lock_id}
+                ).scalar()
+                connection.commit()
+            except Exception:
+                connection.close()
+                raise
+
+            if not is_acquired:
+                connection.close()
+                return False
+
+            self._connection = connection
+            log(APP_NAME, "INFO", f"Acquired the leader lock {self.lock_id}")
+            return True
+
+    def release(self):
+        """Give up the leadership, if held."""
+
+        with self._lock:
+            if self._connection is None:
+                return
+
+            try:
+                self._connection.execute(text("SELECT pg_advisory_unlock(:lock_id)"), {"lock_id": self.lock_id})
+                self._connection.commit()
+                self._connection.close()
+                self._connection = None
+            except Exception as e:
+                log(APP_NAME, "ERROR", f"Failed releasing the leader lock {self.lock_id}, error: {e}")
+                self._drop_connection()
@@ -0,0 +1,44 @@
+import zlib
+from app.database.models import User, db
+
+# Periodic jobs run as one work unit per shard of the users, see SchedulerInstance._enqueue_scheduled_job.
+# A shard is passed to the jobs as an [index, shards count] pair.
+
+
+def get_shard_key(user_email):
+    """Return a stable hash of the email, stored as User.shardKey so shards are selected in SQL."""
+
+    return zlib.crc32(user_email.encode("utf-8"))
+
+
+def get_user_shard_index(user_email, shards_count):
+    """Return the shard of a user, so a user always lands in the same shard."""
+
+    return get_shard_key(user_email) % shards_count
+
+
+def is_in_shard(user_email, shard):
+    shard_index, shards_count = shard
+    return get_user_shard_index(user_email, shards_count) == shard_index
+
+
+def get_shard_filter(shard):
+    """Return a SQL condition matching the users in the shard."""
+
+    shard_index, shards_count = shard
+    return User.shardKey % shards_count == shard_index
+
+
+def get_shard_users(shard):
+    """Return the emails of the users in the shard."""
+
+    return [row.email for row in db.session.query(User.email).filter(get_shard_filter(shard))]
+
+
+def group_users_by_shard(users_emails, shards_count):
+    """Group users by their shard, {shard index: [emails]}."""
+
+    shards = {}
+    for user_email in users_emails:
+        shards.setdefault(get_user_shard_index(user_email, shards_count), []).append(user_email)
+    return shards
@@ -0,0 +1,122 @@
+from datetime import datetime
+from sqlalchemy import delete, func, insert, select
+from app.database.models import SpendingChange, db
+from app.helper import date_to_number
+from app.job_scheduler.sharding import get_shard_key
+
+from config.app import SPENDING_CHANGES_LOCK_ID
+
+# Changes of (userEmail, date, categoryId) UserCategorySpending cells are recorded in the spendingChanges table, in
+# the database transaction of the change, so they survive restarts and are seen by every process:
+# touched cells are recomputed from their transactions, deltas (e.g. the categorizer moving a transaction between
+# categories) are added to the stored spending. The monthly spending aggregator drains them in the transaction
+# applying them.
+
+
+def get_spending_key(user_email, purchase_date, category_id):
+    """Return the UserCategorySpending cell a transaction is summed into."""
+
+    if isinstance(purchase_date, str):
+        purchase_date = datetime.fromisoformat(purchase_date)
+    return (user_email, date_to_number(purchase_date), category_id)
+
+
+def lock_users(users_emails):
+    """
+    Take the users' spending changes locks until the end of the session's current transaction.
+    Writers of deltas and the aggregator draining them take the lock, so a recomputation can't read a change whose
+    delta it then leaves behind. Locks are taken in a stable order, and before the users' User rows are updated (the
+    aggregator bumps their data version while holding them), to avoid deadlocks. PostgreSQL only.
+    """
+
+    if db.session.get_bind().dialect.name != "postgresql":
+        return
+
+    for user_email in sorted(set(users_emails)):
+        # The two keys variant of the lock takes 32-bit signed keys
+        shard_key = get_shard_key(user_email)
+        user_key = shard_key - 2**32 if shard_key >= 2**31 else shard_key
+        db.session.execute(select(func.pg_advisory_xact_lock(SPENDING_CHANGES_LOCK_ID, user_key)))
+
+
+def mark_touched(keys):
+    """Record spending cells that need to be recomputed, as part of the session's current transaction."""
+
+    keys = {key for key in keys if key is not None}
+    if not keys:
+        return
+
+    db.session.execute(
+        insert(SpendingChange),
+        [{"userEmail": email, "date": date, "categoryId": category_id} for email, date, category_id in sorted(keys)],
+    )
+
+
+def record_deltas(deltas):
+    """
+    Record {(userEmail, date, categoryId): amount} amounts to add to spending cells, as part of the session's
+    current transaction. The users' locks are held until the transaction ends.
+    """
+
+    deltas = {key: amount for key, amount in deltas.items() if amount}
+    if not deltas:
+        return
+
+    lock_users(key[0] for key in deltas)
+    db.session.execute(
+        insert(SpendingChange),
+        [
+            {"userEmail": email, "date": date, "categoryId": category_id, "amount": amount}
+            for (email, date, category_id), amount in sorted(deltas.items())
+        ],
+    )
+
+
+def get_transaction_spending_key(transaction):
+    """
+    Return the spending cell of a transaction (a Transaction or any object with the same attributes), or None
+    when it has no purchase date.
+    """
+
+    if transaction.purchaseDate is None:
+        return None
+    return get_spending_key(transaction.userEmail, transaction.purchaseDate, transaction.categoryId)
+
+
+def mark_transaction_touched(transaction):
+    """Record the spending cell of a transaction (a Transaction or any object with the same attributes)."""
+
+    mark_touched([get_transaction_spending_key(transaction)])
+
+
+def get_touched_users(users_list=None):
+    """Return the users having recorded changes, among users_list if one is passed."""
+
+    query = db.session.query(SpendingChange.userEmail).distinct()
+    if users_list is not None:
+        query = query.filter(SpendingChange.userEmail.in_(users_list))
+    return sorted(row.userEmail for row in query)
+
+
+def drain_changes(users_list=None):
+    """
+    Remove and return the recorded changes of the given users, or of all users when users_list is None, as
+    (touched cells, {cell: summed delta}). The rows are deleted as part of the session's current transaction, which
+    holds the users' locks, a rollback keeps them for the next run.
+    """
+
+    statement = delete(SpendingChange)
+    if users_list is not None:
+        lock_users(users_list)
+        statement = statement.where(SpendingChange.userEmail.in_(users_list))
+
+    returned_columns = (SpendingChange.userEmail, SpendingChange.date, SpendingChange.categoryId, SpendingChange.amount)
+    touched_keys = set()
+    deltas = {}
+    for email, date, category_id, amount in db.session.execute(statement.returning(*returned_columns)):
+        key = (email, date, category_id)
+        if amount is None:
+            touched_keys.add(key)
+        else:
+            deltas[key] = deltas.get(key, 0) + amount
+    return touched_keys, deltas
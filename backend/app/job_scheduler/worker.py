@@ -0,0 +1,74 @@
+import os
+import socket
+import threading
+import time
+from app.logger import log
+from app.job_scheduler import job_queue
+import app.job_scheduler.helper as helper
+
+from config.app import JOB_WORKER_POLL_INTERVAL_IN_SECONDS
+
+APP_NAME = "Job Worker"
+
+
+class JobWorker:
+    """
+    Runs the job chains of the durable job queue, one at a time.
+    Any number of workers (processes or hosts) can share a queue, every entry is claimed by a single worker.
+    """
+
+    def __init__(self, scheduler, worker_id=None, poll_interval=JOB_WORKER_POLL_INTERVAL_IN_SECONDS):
+        self.scheduler = scheduler
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+        self.poll_interval = poll_interval
+
+    def _resolve_jobs(self, jobs):
+        """Map queued {"id", "args"} jobs to their scheduled_jobs_dict configs."""
+
+        from app.job_scheduler.jobs_config import scheduled_jobs_dict
+
+        unknown_jobs_ids = [job["id"] for job in jobs if job["id"] not in scheduled_jobs_dict]
+        if unknown_jobs_ids:
+            raise ValueError(f"Unknown jobs: {', '.join(unknown_jobs_ids)}")
+
+        return [{**scheduled_jobs_dict[job["id"]], "args": job.get("args") or {}} for job in jobs]
+
+    def run_once(self):
+        """Claim and run the next due job chain, returns whether one was run."""
+
+        with self.scheduler.flask_app.app_context():
+            entry = job_queue.claim_next(self.worker_id)
+
+        if entry is None:
+            return False
+
+        log(APP_NAME, "INFO", f"Running queue entry {entry['id']} (attempt {entry['attempts']}): {[job['id'] for job in entry['jobs']]}")
+        try:
+            error = helper.run_jobs(self.scheduler, self._resolve_jobs(entry["jobs"]))
+        except Exception as e:
+            error = e
+
+        # A failed chain is retried as a whole, jobs are expected to be safe to run again
+        with self.scheduler.flask_app.app_context():
+            if error is None:
+                job_queue.finish(entry["id"], self.worker_id)
+            else:
+                job_queue.fail(entry["id"], self.worker_id, entry["attempts"], error)
+
+        log(APP_NAME, "INFO", f"Queue entry {entry['id']} {'failed' if error is not None else 'finished'}")
+        return True
+
+    def run_forever(self, stop_event=None):
+        """Run job chains as they become due, polling the queue when it's empty, until stop_event is set."""
+
+        log(APP_NAME, "INFO", f"Job worker {self.worker_id} started")
+        stop_event = stop_event or threading.Event()
+
+        while not stop_event.is_set():
+            try:
+                if self.run_once():
+                    continue
+            except Exception as e:
+                log(APP_NAME, "ERROR", f"Job worker {self.worker_id} failed claiming a queue entry, error: {e}")
+
+            stop_event.wait(self.poll_interval)
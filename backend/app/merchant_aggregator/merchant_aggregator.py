@@ -1,26 +1,44 @@
-import os
-from datetime import datetime
-from multiprocessing import Process, Queue
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
 from app.database.models import Transaction, UserParsedCategory, db
+from app.database.data_version import bump_data_version, bump_merchant_mappings_version
 from app.helper import get_prompt_template, query_chatgpt
+from app.job_scheduler import spending_changes
 from app.logger import log
+from app.merchant_aggregator import merchants_cache
 from app.merchant_aggregator.utils import (
     _serialize_transactions,
     _split_into_chunks,
     _extract_merchant_from_transaction,
-    _has_timed_out,
     _get_categories_from_chatgpt_response,
-    _retrieve_cached_categories,
     _get_user_categories_dict,
 )
 
+from config.app import MERCHANT_AGGREGATOR_WORKERS_COUNT
+
 APP_NAME = "Merchant Aggregator"
 
+# Long-lived pool categorizing chunks, the work is I/O bound (waiting for ChatGPT) so threads are enough
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    """Return the shared categorization pool, creating it on first use."""
+
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=MERCHANT_AGGREGATOR_WORKERS_COUNT, thread_name_prefix="merchant_aggregator"
+            )
+        return _executor
+
 
-def _categorize_chunk(chunk, user_categories_dict, user_email, queue):
+def _categorize_chunk(chunk, user_categories_dict, user_email):
     """Categorizes a chunk of transactions using ChatGPT"""
 
-    log(APP_NAME, "DEBUG", f"Categorizing chunk of size: {len(chunk)} (PID: {os.getpid()})")
+    log(APP_NAME, "DEBUG", f"Categorizing chunk of size: {len(chunk)} (thread: {threading.current_thread().name})")
 
     categories_string = ",".join(user_categories_dict.keys())
     transactions_string = "\n".join(
@@ -67,48 +85,33 @@ def _categorize_chunk(chunk, user_categories_dict, user_email, queue):
                     "WARNING",
                     f"Generated unrecognized category: '{category_name}' for transaction: {chunk[index]['merchantData']['name']}",
                 )
-    queue.put((chunk, parsed_categories))
+    return chunk, parsed_categories
 
 
 def _process_chunk(chunks, user_categories, processing_data):
-    """Processes a set of transaction chunks in parallel while verifying each process's timeout."""
+    """Processes a set of transaction chunks in parallel on the shared pool, waiting up to the timeout."""
 
     timeout = processing_data["timeout"]
     user_email = processing_data["user_email"]
-    processes = []
     process_results = [None] * len(chunks)
 
     log(APP_NAME, "DEBUG", f"Starting to process {len(chunks)} chunks in parallel.")
 
-    for index, chunk in enumerate(chunks):
-        q = Queue()
-        p = Process(target=_categorize_chunk, args=(chunk, user_categories, user_email, q))
-        p.start()
-        processes.append({"process": p, "queue": q, "index": index, "size": len(chunk)})
-
-    start_time = datetime.now()
-
-    while not _has_timed_out(start_time, timeout):
-        active_processes = [p for p in processes if p["process"].is_alive()]
-        if not active_processes:
-            break
+    executor = _get_executor()
+    futures = [executor.submit(_categorize_chunk, chunk, user_categories, user_email) for chunk in chunks]
+    wait(futures, timeout=timeout)
 
     completed_count = 0
-    for proc_info in processes:
-        proc = proc_info["process"]
-        queue = proc_info["queue"]
-        chunk_index = proc_info["index"]
-        result = None
-
-        if not proc.is_alive():
-            result = queue.get()
-            completed_count += 1
+    for chunk_index, future in enumerate(futures):
+        if not future.done():
+            # A chunk that didn't start yet is dropped, a running one finishes in the background and is ignored
+            future.cancel()
+            log(APP_NAME, "WARNING", f"Dropped chunk {chunk_index}, reached timeout")
+        elif future.exception() is not None:
+            log(APP_NAME, "ERROR", f"Failed to categorize chunk {chunk_index}, error: {future.exception()}")
         else:
-            proc.terminate()
-            result = None
-            log(APP_NAME, "WARNING", f"Terminated process {proc.pid}, reached timeout")
-
-        process_results[chunk_index] = result
+            process_results[chunk_index] = future.result()
+            completed_count += 1
 
     log(APP_NAME, "DEBUG", f"Processed {completed_count} out of {len(chunks)}")
     return process_results
@@ -146,14 +149,68 @@ def _process_data_in_chunks(transactions, user_categories, processing_data):
             results["transactions"].extend(user_parsed_transactions)
             results["user_parsed_categories"].extend(user_parsed_categories)
 
-            yield results
+        yield results
+
+
+def _get_categories_key(user_categories):
+    """Returns a hashable key identifying a categories set, users sharing it can share categorization results"""
+
+    return tuple(sorted((name, category["id"]) for name, category in user_categories.items()))
+
+
+def _get_category_changes_deltas(categorized_transactions, transactions_by_id):
+    """
+    Return the {(userEmail, date, categoryId): amount} spending deltas of categorized transactions, their amount
+    moves from their previous category's cell to the new one's.
+    """
+
+    deltas = {}
+    for categorized_transaction in categorized_transactions:
+        transaction = transactions_by_id[categorized_transaction["id"]]
+        old_category_id, new_category_id = transaction["categoryId"], categorized_transaction["categoryId"]
+
+        # Recurring and deleted transactions aren't part of the monthly spending
+        is_summed = not transaction.get("isRecurring") and not transaction.get("isDeleted")
+        if not is_summed or transaction.get("purchaseDate") is None or old_category_id == new_category_id:
+            continue
+
+        amount = transaction.get("transactionAmount") or 0
+        for category_id, sign in ((old_category_id, -1), (new_category_id, 1)):
+            if category_id is None:
+                continue
+            key = spending_changes.get_spending_key(transaction["userEmail"], transaction["purchaseDate"], category_id)
+            deltas[key] = deltas.get(key, 0) + sign * amount
+    return deltas
+
+
+def _commit_categorized_transactions(categorized_transactions, user_parsed_categories, transactions_by_id):
+    """
+    Writes a batch of categorized transactions and newly parsed merchants.
+    The spending deltas of the batch are recorded in the same database transaction, so a batch committed by a
+    run that fails later still reaches the monthly spending aggregator.
+    """
+
+    # User specific merchants are part of the user's data, cached mappings are validated against the mappings versions
+    changed_users = {transactions_by_id[t["id"]]["userEmail"] for t in categorized_transactions} | {
+        category.userEmail for category in user_parsed_categories if category.userEmail is not None
+    }
+    # The aggregator takes the users' spending changes locks before updating their User rows, so do the same
+    spending_changes.lock_users(changed_users)
+
+    db.session.bulk_update_mappings(Transaction, categorized_transactions)
+    db.session.add_all(user_parsed_categories)
+    bump_data_version(changed_users)
+    bump_merchant_mappings_version({category.userEmail for category in user_parsed_categories})
+    spending_changes.record_deltas(_get_category_changes_deltas(categorized_transactions, transactions_by_id))
+    db.session.commit()
 
 
 def categorize_for_all_users(user_transactions_dict):
     """
     Processes and categorizes transactions for multiple users.
     Uses the UserParsedCategory table to parse previously parsed transactions with cache.
-    Uses ChatGPT for uncached transactions.
+    Uses ChatGPT for uncached transactions, each unique merchant is categorized once per categories set
+    and the result is applied to all of its transactions across users.
 
     Args:
         user_transactions_dict (dict): A dictionary where keys are user emails and values are lists of transaction objects.
@@ -166,7 +223,12 @@ def categorize_for_all_users(user_transactions_dict):
 
     user_parsed_categories = []
     parsed_transactions = []
-    processed_transactions = []
+    cached_transactions = []
+    transactions_by_id = {}
+
+    # Uncached transactions grouped by categories set, then by merchant name:
+    # {categories_key: {"categories": dict, "user_email": str, "merchants": {merchant_name: [transactions]}}}
+    pending_groups = {}
 
     # Iterate over each user and their transactions
     for email, transactions in user_transactions_dict.items():
@@ -178,59 +240,74 @@ def categorize_for_all_users(user_transactions_dict):
 
         # Retrieve user-specific categories and cached categories
         user_categories = _get_user_categories_dict(email)
-        cached_merchants_mapping = _retrieve_cached_categories(email)
-        cached_transactions = []
-        transactions_to_process = []
+        cached_merchants_mapping = merchants_cache.get_cached_categories(email)
+
+        # Users without custom categories share the same key, so a merchant is sent to ChatGPT once for all of them
+        group = pending_groups.setdefault(
+            _get_categories_key(user_categories),
+            {"categories": user_categories, "user_email": email, "merchants": {}},
+        )
+        user_cached_count = 0
 
         # Iterate over each transaction for the user
         for t in _serialize_transactions(transactions):
+            transactions_by_id[t["id"]] = t
+
             # Extract the merchant name from the transaction data
             merchant_name = _extract_merchant_from_transaction(t["merchantData"]["name"])
             cached_value = cached_merchants_mapping.get(merchant_name, None)
 
             # If there's a cached category for the merchant, use it and remove the transaction from processing
             if cached_value is not None:
-                t["categoryId"] = cached_value
-                cached_transactions.append(t)
+                cached_transactions.append({"id": t["id"], "categoryId": cached_value})
+                user_cached_count += 1
             else:
-                transactions_to_process.append(t)
+                group["merchants"].setdefault(merchant_name, []).append(t)
 
-        log(APP_NAME, "DEBUG", f"Found {len(cached_transactions)} transactions with cached merchants")
+        log(APP_NAME, "DEBUG", f"Found {user_cached_count} transactions with cached merchants for user {email}")
 
-        # Set up processing data for chunk processing
-        processing_data = {"timeout": 30, "chunk_size": 8, "parallel_count": 20, "user_email": email}
+    if cached_transactions:
+        _commit_categorized_transactions(cached_transactions, [], transactions_by_id)
+        parsed_transactions.extend(cached_transactions)
+
+    for group in pending_groups.values():
+        merchants = group["merchants"]
+        if not merchants:
+            continue
+
+        # One representative per unique merchant, its category is fanned out to every matching transaction.
+        # Custom categories are owned by a single user, so a group holding them always belongs to that user alone.
+        unique_merchants = [{"categoryId": -1, "merchantData": {"name": merchant_name}} for merchant_name in merchants]
+        processing_data = {"timeout": 30, "chunk_size": 8, "parallel_count": 20, "user_email": group["user_email"]}
 
         log(
             APP_NAME,
             "DEBUG",
-            f"Processing data in chunks. Unchached transactions: {len(transactions_to_process)}, processing_data: {processing_data}",
+            f"Processing data in chunks. Uncached transactions: {sum(len(t) for t in merchants.values())}, "
+            f"unique merchants: {len(unique_merchants)}, processing_data: {processing_data}",
         )
-        processed_transactions.extend(cached_transactions)
-
-        for results in _process_data_in_chunks(transactions_to_process, user_categories, processing_data):
-            processed_transactions = results["transactions"]
-            user_parsed_categories.extend(results["user_parsed_categories"])
 
+        for results in _process_data_in_chunks(unique_merchants, group["categories"], processing_data):
             # Prepare transactions for commit
             parsed_transactions_batch = [
-                {"id": t["id"], "categoryId": t["categoryId"]} for t in processed_transactions if t is not None
+                {"id": t["id"], "categoryId": merchant["categoryId"]}
+                for merchant in results["transactions"]
+                if merchant is not None and merchant["categoryId"] != -1
+                for t in merchants[merchant["merchantData"]["name"]]
             ]
             parsed_transactions.extend(parsed_transactions_batch)
+            user_parsed_categories.extend(results["user_parsed_categories"])
 
             # Commit batch to database
-            db.session.bulk_update_mappings(Transaction, parsed_transactions_batch)
-            db.session.add_all(user_parsed_categories)
-            db.session.commit()
-
-            # Clear lists for next batch
-            parsed_transactions_batch.clear()
-            user_parsed_categories.clear()
-            processed_transactions.clear()
+            _commit_categorized_transactions(
+                parsed_transactions_batch, results["user_parsed_categories"], transactions_by_id
+            )
 
-        # Log the completion of categorization for a user
-        log(
-            APP_NAME,
-            "INFO",
-            f"Finished categorizing transactions for user {email}, processed {len(processed_transactions)} new transactions",
-        )
+    log(
+        APP_NAME,
+        "INFO",
+        f"Finished categorizing transactions for {len(user_transactions_dict)} users, "
+        f"processed {len(parsed_transactions)} transactions ({len(cached_transactions)} from cache)",
+    )
+    log(APP_NAME, "DEBUG", f"Merchants cache stats: {merchants_cache.stats()}")
     return (parsed_transactions, user_parsed_categories)
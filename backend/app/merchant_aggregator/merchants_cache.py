@@ -0,0 +1,103 @@
+import threading
+import time
+from app.database.data_version import get_merchant_mappings_versions
+from app.database.models import UserParsedCategory
+from app.logger import log
+from lib.cache.lru_cache import LRUCache
+
+from config.app import MERCHANTS_CACHE_TTL_IN_SECONDS, MERCHANTS_CACHE_USERS_COUNT
+
+APP_NAME = "Merchants Cache"
+
+# Process-level merchant -> category mappings shared across categorizer runs.
+# Global mappings (userEmail is NULL) are loaded once, per-user overlays are loaded lazily and evicted LRU.
+# Every lookup reads the user's and the global mappings versions by primary key in a single query, so changes made
+# by any process are picked up. The versions are bumped only by UserParsedCategory writers (see
+# bump_merchant_mappings_version), the TTL only bounds direct database edits.
+_global_mappings = None
+_global_mappings_version = None
+_global_mappings_expires_at = 0
+_global_mappings_loads = 0
+_global_mappings_lock = threading.Lock()
+_user_mappings_reloads = 0
+_user_mappings_cache = LRUCache(max_size=MERCHANTS_CACHE_USERS_COUNT, ttl=MERCHANTS_CACHE_TTL_IN_SECONDS)
+
+
+def _query_mappings(user_email):
+    """Read the merchant -> category id mappings of a user, or the global ones when user_email is None."""
+
+    parsed_categories = UserParsedCategory.query.filter(UserParsedCategory.userEmail == user_email).all()
+    return {category.chargingBusiness: category.targetCategoryId for category in parsed_categories}
+
+
+def _query_versions(user_email):
+    """Read the (user's, global) merchant mappings versions."""
+
+    return get_merchant_mappings_versions(user_email)
+
+
+def _load_global_mappings(version):
+    global _global_mappings, _global_mappings_version, _global_mappings_expires_at, _global_mappings_loads
+
+    with _global_mappings_lock:
+        is_outdated = _global_mappings is None or _global_mappings_version != version
+        if is_outdated or _global_mappings_expires_at <= time.monotonic():
+            _global_mappings = _query_mappings(None)
+            _global_mappings_version = version
+            _global_mappings_expires_at = time.monotonic() + MERCHANTS_CACHE_TTL_IN_SECONDS
+            _global_mappings_loads += 1
+            log(APP_NAME, "DEBUG", f"Loaded {len(_global_mappings)} global merchant mappings")
+        return _global_mappings
+
+
+def _load_user_mappings(user_email, version):
+    global _user_mappings_reloads
+
+    entry = _user_mappings_cache.get(user_email)
+
+    if entry is not None and entry["version"] != version:
+        _user_mappings_reloads += 1
+    if entry is None or entry["version"] != version:
+        entry = {"version": version, "mappings": _query_mappings(user_email)}
+        _user_mappings_cache.set(user_email, entry)
+    return entry["mappings"]
+
+
+def get_cached_categories(user_email):
+    """Return the merchant -> category id mapping for a user, user specific mappings override the global ones."""
+
+    user_version, global_version = _query_versions(user_email)
+    global_mappings = _load_global_mappings(global_version)
+    user_mappings = _load_user_mappings(user_email, user_version)
+    return {**global_mappings, **user_mappings} if user_mappings else global_mappings
+
+
+def invalidate(user_email=None):
+    """
+    Drop a user's cached mappings, or every cached mapping when no user is passed, in the current process.
+    Other processes see the change through the versions, writers still have to bump the mappings version.
+    """
+
+    global _global_mappings
+
+    if user_email is not None:
+        _user_mappings_cache.delete(user_email)
+        return
+
+    with _global_mappings_lock:
+        _global_mappings = None
+    _user_mappings_cache.clear()
+
+
+def stats():
+    """Return the cache's hit/miss counters, a miss or a reload of outdated user overlays is a database read."""
+
+    user_mappings_stats = _user_mappings_cache.stats()
+    return {
+        "global_mappings_loads": _global_mappings_loads,
+        "global_mappings_size": len(_global_mappings) if _global_mappings is not None else 0,
+        "cached_users": user_mappings_stats["size"],
+        "user_mappings_hits": user_mappings_stats["hits"],
+        "user_mappings_misses": user_mappings_stats["misses"],
+        "user_mappings_reloads": _user_mappings_reloads,
+    }
@@ -1,7 +1,6 @@
-from datetime import datetime
 import re
 from sqlalchemy import and_, or_
-from app.database.models import UserParsedCategory, UserCategory
+from app.database.models import UserCategory
 
 
 def _extract_merchant_from_transaction(merchant_name):
@@ -18,14 +17,6 @@ def _get_categories_from_chatgpt_response(chatgpt_response):
     return chatgpt_response.split("\n")
 
 
-def _retrieve_cached_categories(user_email):
-    """Retrieve UserParsedCategories (cached) for a given user."""
-    parsed_categories = UserParsedCategory.query.filter(
-        or_(UserParsedCategory.userEmail == user_email, UserParsedCategory.userEmail == None)
-    ).all()
-    return {category.chargingBusiness: category.targetCategoryId for category in parsed_categories}
-
-
 def _get_user_categories_dict(user_email):
     """Get user categories as a dictionary."""
     user_categories = UserCategory.query.filter(
@@ -45,11 +36,6 @@ def _get_user_categories_dict(user_email):
     }
 
 
-def _has_timed_out(start_time, duration):
-    """Return True if timeout is reached"""
-    return (datetime.now() - start_time).seconds >= duration
-
-
 def _split_into_chunks(data_list, chunk_size):
     """Split the list into smaller chunks"""
 
@@ -57,4 +43,5 @@ def _split_into_chunks(data_list, chunk_size):
 
 
 def _serialize_transactions(transactions):
-    return [t.serialize() for t in transactions]
\ No newline at end of file
+    # Category names aren't needed for categorization, serializing them would lazy load a category per transaction
+    return [t.serialize(include_category_name=False) for t in transactions]
\ No newline at end of file
@@ -0,0 +1,43 @@
+"""
+Measures the scanner's fetch throughput on a single event loop using the offline fake issuer adapter.
+
+Usage (from the backend directory):
+    python -m benchmarks.credit_card_adapters_benchmark [users_count]
+"""
+import sys
+import time
+from datetime import datetime, timedelta
+from app.credit_card_adapters.registry import get_adapter
+from app.job_scheduler.jobs.transactions_scanner import _fetch_users_transactions_concurrently
+
+CONCURRENCY_LEVELS = [8, 32, 128, 512]
+
+
+def run_benchmark(users_count):
+    dates = (datetime.now() - timedelta(days=3), datetime.now())
+    fetch_args_list = [
+        {
+            "user_credentials": {"username": f"user{index}", "password": b"", "id": "123456789"},
+            "user_email": f"user{index}@example.com",
+            "dates": dates,
+        }
+        for index in range(users_count)
+    ]
+
+    adapter = get_adapter("fake")
+    print(f"Fetching transactions for {users_count} users, simulated latency per request: {adapter.latency * 1000:.0f}ms")
+
+    for concurrency in CONCURRENCY_LEVELS:
+        start_time = time.perf_counter()
+        results = _fetch_users_transactions_concurrently(fetch_args_list, adapter, workers_count=concurrency)
+        elapsed = time.perf_counter() - start_time
+
+        fetched_count = sum(len(transactions) for transactions in results.values() if isinstance(transactions, list))
+        print(
+            f"concurrency: {concurrency:>4} | wall time: {elapsed:6.3f}s | users/s: {users_count / elapsed:8.1f} | "
+            f"transactions: {fetched_count}"
+        )
+
+
+if __name__ == "__main__":
+    run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
@@ -0,0 +1,126 @@
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+LOGIN_PATH = "/api/login/login"
+TRANSACTIONS_PATH = "/api/registered/transactionDetails/getTransactionsAndGraphs"
+
+
+def generate_max_transactions(count, arn_prefix="arn"):
+    """Generate transactions in the format returned by the MAX transactions API."""
+
+    return [
+        {
+            "arn": f"{arn_prefix}_{index}",
+            "actualPaymentAmount": str(10 + index % 90),
+            "paymentDate": "2024-01-10T00:00:00",
+            "purchaseDate": f"2023-12-{1 + index % 28:02d}T12:00:00",
+            "shortCardNumber": "1234",
+            "merchantName": f"Merchant {index % 50}",
+            "merchantData": {"address": "Some street 1", "phone": None},
+            "originalCurrency": "ILS",
+            "originalAmount": 10 + index % 90,
+            "dealData": {"authorizationNumber": f"auth_{index}"},
+        }
+        for index in range(count)
+    ]
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+class FakeMaxServer:
+    """
+    A local stand-in for the MAX website, used to benchmark the credit card adapter without network access.
+    Every request is delayed by `latency` seconds to simulate a remote server.
+    Transactions requests are rejected with a 401 unless they carry a session cookie issued by a login.
+    """
+
+    def __init__(self, latency=0.05, transactions_count=30):
+        self.latency = latency
+        self.sessions = set()
+        self.transactions_payload = json.dumps(
+            {"result": {"transactions": generate_max_transactions(transactions_count)}}
+        ).encode("utf-8")
+        self.requests_count = {LOGIN_PATH: 0, TRANSACTIONS_PATH: 0}
+        self._lock = threading.Lock()
+        self._server = _Server(("127.0.0.1", 0), self._build_handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def _count_request(self, path):
+        with self._lock:
+            self.requests_count[path] = self.requests_count.get(path, 0) + 1
+
+    def _create_session(self):
+        session_id = str(uuid.uuid4())
+        with self._lock:
+            self.sessions.add(session_id)
+        return session_id
+
+    def _is_valid_session(self, cookie_header):
+        cookies = dict(c.strip().split("=", 1) for c in (cookie_header or "").split(";") if "=" in c)
+        with self._lock:
+            return cookies.get("session") in self.sessions
+
+    def expire_sessions(self):
+        """Invalidate all issued sessions, as if they expired on the server side."""
+
+        with self._lock:
+            self.sessions.clear()
+
+    def _build_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def _send_json(self, body, headers=None, status_code=200):
+                self.send_response(status_code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                path = self.path.split("?")[0]
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                server._count_request(path)
+                time.sleep(server.latency)
+                body = json.dumps({"Result": {"LoginStatus": 0}}).encode("utf-8")
+                self._send_json(body, {"Set-Cookie": f"session={server._create_session()}; Path=/"})
+
+            def do_GET(self):
+                path = self.path.split("?")[0]
+                server._count_request(path)
+                time.sleep(server.latency)
+
+                if not server._is_valid_session(self.headers.get("Cookie")):
+                    self._send_json(b'{"result": null}', status_code=401)
+                    return
+
+                self._send_json(server.transactions_payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,77 @@
+"""
+Compares the time spent encoding a list transactions response with the standard library and orjson JSON providers,
+in the objects and columnar response formats. Doesn't need a database, the rows are built in memory.
+
+Usage (from the backend directory):
+    python -m benchmarks.json_serialization_benchmark [transactions_count]
+"""
+import statistics
+import sys
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+from flask import Flask
+from app.api.helpers import TRANSACTIONS_COLUMNAR_FIELDS, serialize_transactions
+from app.database.models import Transaction
+from lib.json_provider.json_provider import JSON_PROVIDERS
+
+REPEATS = 20
+
+TransactionRow = namedtuple("TransactionRow", Transaction.SERIALIZED_FIELDS)
+
+
+def build_rows(transactions_count):
+    start_date = datetime(2023, 12, 1)
+    rows = []
+    for index in range(transactions_count):
+        values = {field: None for field in Transaction.SERIALIZED_FIELDS}
+        values.update(
+            id=f"json-benchmark-{index}",
+            userEmail="json-benchmark@example.com",
+            categoryId=index % 20,
+            transactionAmount=float(index % 997) + 0.5,
+            originalAmount=float(index % 997) + 0.5,
+            originalCurrency="ILS",
+            purchaseDate=start_date - timedelta(hours=index),
+            paymentDate=start_date - timedelta(hours=index) + timedelta(days=10),
+            shortCardNumber=f"{1000 + index % 4}",
+            merchantData={"name": f"Merchant {index % 300}", "address": "Tel Aviv", "category": "מזון"},
+            isPending=index % 100 == 0,
+            isRecurring=False,
+            isDeleted=False,
+        )
+        rows.append(TransactionRow(**values))
+    return rows
+
+
+def measure(encode):
+    timings = []
+    for _ in range(REPEATS):
+        start_time = time.perf_counter()
+        encode()
+        timings.append(time.perf_counter() - start_time)
+    return statistics.median(timings) * 1000
+
+
+def run_benchmark(transactions_count):
+    app = Flask(__name__)
+    rows = build_rows(transactions_count)
+    category_names = {index: f"Category {index}" for index in range(20)}
+
+    print(f"Encoding {transactions_count} transactions, median of {REPEATS} runs (serialization + encoding)")
+    for provider_name, provider_class in JSON_PROVIDERS.items():
+        provider = provider_class(app)
+        for response_format in ("objects", "columnar"):
+
+            def encode():
+                body = {"transactions": serialize_transactions(rows, category_names, response_format)}
+                if response_format == "columnar":
+                    body["fields"] = TRANSACTIONS_COLUMNAR_FIELDS
+                return provider.dumps({"message": "Successfully fetched transactions", "data": body})
+
+            size_kb = len(encode().encode()) / 1024
+            print(f"{provider_name:>8} | {response_format:>8} | {measure(encode):8.2f}ms | {size_kb:8.1f}KB")
+
+
+if __name__ == "__main__":
+    run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
@@ -0,0 +1,96 @@
+"""
+Compares the latency of transactions list pages fetched with OFFSET against keyset (cursor) pages at growing depths.
+Needs a PostgreSQL database, a benchmark user and its transactions are created and removed by the benchmark.
+
+Usage (from the backend directory):
+    DATABASE_URI=postgresql://... python -m benchmarks.list_transactions_pagination_benchmark [transactions_count]
+"""
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+import dotenv
+from flask import Flask
+from sqlalchemy import insert
+from app.api.helpers import apply_cursor, apply_sorting, encode_cursor
+from app.database.app import initialize_database
+from app.database.models import Transaction, User, db
+
+BENCHMARK_USER_EMAIL = "pagination-benchmark@example.com"
+PAGE_SIZE = 50
+REPEATS = 5
+INSERT_BATCH_SIZE = 5000
+
+
+def seed_transactions(transactions_count):
+    db.session.add(User(email=BENCHMARK_USER_EMAIL, fullName="Pagination Benchmark", shouldGetScrapped=False))
+    db.session.flush()
+
+    start_date = datetime(2020, 1, 1)
+    for batch_start in range(0, transactions_count, INSERT_BATCH_SIZE):
+        rows = [
+            {
+                "id": f"pagination-benchmark-{index}",
+                "userEmail": BENCHMARK_USER_EMAIL,
+                "categoryId": -1,
+                "transactionAmount": float(index % 997),
+                "purchaseDate": start_date + timedelta(minutes=7 * index),
+                "shortCardNumber": f"{1000 + index % 4}",
+                "merchantData": {"name": f"Merchant {index % 300}"},
+                "isRecurring": False,
+                "isDeleted": False,
+                "isPending": index % 100 == 0,
+            }
+            for index in range(batch_start, min(batch_start + INSERT_BATCH_SIZE, transactions_count))
+        ]
+        db.session.execute(insert(Transaction), rows)
+    db.session.commit()
+    db.session.execute(db.text('ANALYZE "transaction"'))
+
+
+def remove_transactions():
+    Transaction.query.filter(Transaction.userEmail == BENCHMARK_USER_EMAIL).delete(synchronize_session=False)
+    User.query.filter(User.email == BENCHMARK_USER_EMAIL).delete(synchronize_session=False)
+    db.session.commit()
+
+
+def measure(fetch_page):
+    timings = []
+    for _ in range(REPEATS):
+        start_time = time.perf_counter()
+        fetch_page()
+        timings.append(time.perf_counter() - start_time)
+    return statistics.median(timings) * 1000
+
+
+def run_benchmark(transactions_count):
+    base_query = Transaction.query.filter_by(userEmail=BENCHMARK_USER_EMAIL, isRecurring=False, isDeleted=False)
+    sorted_query = apply_sorting(base_query, None)
+
+    print(f"Listing {transactions_count} transactions, page size: {PAGE_SIZE}, median of {REPEATS} runs")
+    depth = PAGE_SIZE
+    while depth < transactions_count:
+        # The cursor of the page is the last transaction of the previous one, fetched outside of the measurement
+        previous_transaction = sorted_query.offset(depth - 1).limit(1).first()
+        cursor = encode_cursor(None, previous_transaction)
+
+        offset_ms = measure(lambda: sorted_query.offset(depth).limit(PAGE_SIZE).all())
+        keyset_ms = measure(lambda: apply_cursor(sorted_query, None, cursor).limit(PAGE_SIZE).all())
+        print(f"depth {depth:>8} | offset: {offset_ms:8.2f}ms | keyset: {keyset_ms:8.2f}ms")
+        depth *= 4
+
+
+if __name__ == "__main__":
+    dotenv.load_dotenv()
+    flask_app = Flask(__name__)
+    flask_app.config["SQLALCHEMY_DATABASE_URI"] = os.environ["DATABASE_URI"]
+    initialize_database(flask_app)
+
+    with flask_app.app_context():
+        remove_transactions()
+        seed_transactions(int(sys.argv[1]) if len(sys.argv) > 1 else 200000)
+        try:
+            run_benchmark(Transaction.query.filter(Transaction.userEmail == BENCHMARK_USER_EMAIL).count())
+        finally:
+            remove_transactions()
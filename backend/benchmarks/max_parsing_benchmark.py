@@ -0,0 +1,125 @@
+"""
+Compares parsing a MAX transactions response into ORM objects (the previous approach) with streaming it into
+ScannedTransaction records through MaxAdapter's parsing path, on a synthetic payload.
+Each mode runs in its own process to measure its peak RSS.
+
+Usage (from the backend directory):
+    python -m benchmarks.max_parsing_benchmark [transactions_count]
+"""
+import json
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from benchmarks.fake_max_server import generate_max_transactions
+
+MODES = ["orm", "streaming"]
+CHUNK_SIZE = 64 * 1024
+USER_EMAIL = "user@example.com"
+
+
+def parse_into_orm_objects(payload):
+    from app.credit_card_adapters.max_fetcher import parse_date_string, parse_transaction_amount
+    from app.database.models import Transaction
+
+    transactions_data = json.loads(payload.decode("utf-8"))
+    return [
+        Transaction(
+            id=f"{USER_EMAIL}_{transaction['arn']}",
+            arn=transaction["arn"],
+            userEmail=USER_EMAIL,
+            categoryId=-1,
+            transactionAmount=parse_transaction_amount(transaction["actualPaymentAmount"]),
+            paymentDate=parse_date_string(transaction["paymentDate"]),
+            purchaseDate=parse_date_string(transaction["purchaseDate"]),
+            shortCardNumber=transaction["shortCardNumber"],
+            merchantData={**transaction["merchantData"], "name": transaction["merchantName"]},
+            originalCurrency=transaction["originalCurrency"],
+            originalAmount=transaction["originalAmount"],
+            isRecurring=False,
+            isPending=False,
+            authorizationNumber=transaction["dealData"]["authorizationNumber"],
+        )
+        for transaction in transactions_data["result"]["transactions"]
+    ]
+
+
+def parse_into_records(payload):
+    """Parse the payload the way MaxAdapter.fetch_range streams a response, normalizing records one at a time."""
+
+    import asyncio
+    from app.credit_card_adapters.max_adapter import MaxAdapter
+    from app.credit_card_adapters.max_fetcher import TRANSACTIONS_JSON_PATH
+    from lib.json_stream.json_stream import aiter_json_array
+
+    adapter = MaxAdapter()
+
+    async def read_response():
+        for i in range(0, len(payload), CHUNK_SIZE):
+            yield payload[i : i + CHUNK_SIZE]
+
+    async def parse():
+        raw_transactions = aiter_json_array(read_response(), TRANSACTIONS_JSON_PATH)
+        return [adapter.normalize(t, USER_EMAIL) async for t in raw_transactions]
+
+    return asyncio.run(parse())
+
+
+def run_mode(mode, transactions_count):
+    """Parse the payload with a single mode and print its measurements as JSON."""
+
+    payload = json.dumps({"result": {"transactions": generate_max_transactions(transactions_count)}}).encode("utf-8")
+    parse = parse_into_orm_objects if mode == "orm" else parse_into_records
+
+    # Warm up imports and mappers so they aren't measured
+    parse(payload[:0] + json.dumps({"result": {"transactions": generate_max_transactions(1)}}).encode("utf-8"))
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    start_cpu, start_time = time.process_time(), time.perf_counter()
+    transactions = parse(payload)
+    cpu, elapsed = time.process_time() - start_cpu, time.perf_counter() - start_time
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # Trace a second run separately, tracemalloc slows down the measured run
+    del transactions
+    tracemalloc.start()
+    transactions = parse(payload)
+    _, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(
+        json.dumps(
+            {
+                "count": len(transactions),
+                "cpu": cpu,
+                "elapsed": elapsed,
+                "traced_peak_mb": traced_peak / 1024 / 1024,
+                "rss_growth_mb": (rss_after - rss_before) / 1024,
+            }
+        )
+    )
+
+
+def run_benchmark(transactions_count):
+    print(f"Parsing a synthetic payload of {transactions_count} transactions")
+
+    for mode in MODES:
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.max_parsing_benchmark", "--mode", mode, str(transactions_count)],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(
+            f"{mode:>9} | parsed: {result['count']} | cpu: {result['cpu']:6.3f}s | wall time: {result['elapsed']:6.3f}s | "
+            f"traced peak: {result['traced_peak_mb']:6.1f}MB | peak RSS growth: {result['rss_growth_mb']:6.1f}MB"
+        )
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2 and sys.argv[1] == "--mode":
+        run_mode(sys.argv[2], int(sys.argv[3]))
+    else:
+        run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 10_000)
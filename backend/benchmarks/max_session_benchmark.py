@@ -0,0 +1,59 @@
+"""
+Compares scan cycles that log in on every fetch against cycles reusing cached MAX session cookies,
+using a local fake MAX server.
+
+Usage (from the backend directory):
+    python -m benchmarks.max_session_benchmark [users_count] [cycles_count]
+"""
+import os
+import sys
+import time
+
+os.environ.setdefault("ENCRYPTION_KEY", "benchmark-key-16")
+
+from app.credit_card_adapters import max_fetcher
+from app.job_scheduler.jobs.transactions_scanner import _fetch_users_transactions_concurrently
+from benchmarks.fake_max_server import LOGIN_PATH, TRANSACTIONS_PATH, FakeMaxServer
+from benchmarks.transactions_scanner_benchmark import build_fetch_args_list
+from config import max_urls
+from lib.rate_limiter.rate_limiter import RateLimiter
+
+WORKERS_COUNT = 8
+
+
+def run_cycles(server, fetch_args_list, cycles_count, reuse_sessions):
+    max_fetcher.session_cookies_cache.clear()
+    server.requests_count = {LOGIN_PATH: 0, TRANSACTIONS_PATH: 0}
+
+    start_time = time.perf_counter()
+    for _ in range(cycles_count):
+        if not reuse_sessions:
+            max_fetcher.session_cookies_cache.clear()
+        _fetch_users_transactions_concurrently(fetch_args_list, workers_count=WORKERS_COUNT)
+    elapsed = time.perf_counter() - start_time
+
+    mode = "cached sessions" if reuse_sessions else "login every scan"
+    print(
+        f"{mode:>16} | wall time: {elapsed:7.3f}s | per cycle: {elapsed / cycles_count:6.3f}s | "
+        f"logins: {server.requests_count[LOGIN_PATH]:>5} | transactions requests: {server.requests_count[TRANSACTIONS_PATH]:>5}"
+    )
+
+
+def run_benchmark(users_count, cycles_count):
+    with FakeMaxServer(latency=0.05) as server:
+        max_fetcher.LOGIN_URL = server.base_url + LOGIN_PATH
+        max_urls.TRANSACTIONS_API = server.base_url + TRANSACTIONS_PATH
+        max_fetcher.rate_limiter = RateLimiter(10_000)
+
+        fetch_args_list = build_fetch_args_list(users_count)
+        print(f"Running {cycles_count} scan cycles for {users_count} users with {WORKERS_COUNT} workers")
+
+        run_cycles(server, fetch_args_list, cycles_count, reuse_sessions=False)
+        run_cycles(server, fetch_args_list, cycles_count, reuse_sessions=True)
+
+
+if __name__ == "__main__":
+    run_benchmark(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 64,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 5,
+    )
@@ -0,0 +1,85 @@
+"""
+Compares categorizing uncached transactions by spawning a process per chunk (the previous approach, busy-waiting
+on the processes) with the merchant aggregator's persistent thread pool. ChatGPT is replaced by a stub with a fixed latency.
+
+Usage (from the backend directory):
+    python -m benchmarks.merchant_aggregator_benchmark [transactions_count]
+"""
+import resource
+import sys
+import time
+from datetime import datetime
+from multiprocessing import Process, Queue
+from app.merchant_aggregator import merchant_aggregator
+
+LLM_LATENCY = 0.2
+PROCESSING_DATA = {"timeout": 30, "chunk_size": 8, "parallel_count": 20, "user_email": "user@example.com"}
+USER_CATEGORIES = {"General": {"id": 1, "is_custom": False}, "Dining": {"id": 2, "is_custom": False}}
+
+
+def stub_query_chatgpt(prompt):
+    time.sleep(LLM_LATENCY)
+    transactions_count = prompt.split("Transactions:\n")[1].split("\nExpected Output")[0].count("\n") + 1
+    return "\n".join(f"Category for #{index}: Dining" for index in range(transactions_count)) + "\nEND OF OUTPUT"
+
+
+def _legacy_categorize_chunk(chunk, user_categories, user_email, queue):
+    queue.put(merchant_aggregator._categorize_chunk(chunk, user_categories, user_email))
+
+
+def legacy_process_chunk(chunks, user_categories, processing_data):
+    """The previous implementation: a process and queue per chunk, and a spin loop waiting for them."""
+
+    processes = []
+    for chunk in chunks:
+        queue = Queue()
+        process = Process(target=_legacy_categorize_chunk, args=(chunk, user_categories, processing_data["user_email"], queue))
+        process.start()
+        processes.append((process, queue))
+
+    start_time = datetime.now()
+    while (datetime.now() - start_time).seconds < processing_data["timeout"]:
+        if not [p for p, _ in processes if p.is_alive()]:
+            break
+
+    return [queue.get() if not process.is_alive() else None for process, queue in processes]
+
+
+def generate_transactions(count):
+    return [
+        {"id": f"t{index}", "categoryId": -1, "merchantData": {"name": f"Merchant {index} *1234"}} for index in range(count)
+    ]
+
+
+def measure(process_chunk, transactions_count):
+    merchant_aggregator._process_chunk = process_chunk
+    transactions = generate_transactions(transactions_count)
+
+    start_cpu = time.process_time()
+    start_children_cpu = resource.getrusage(resource.RUSAGE_CHILDREN)
+    start_time = time.perf_counter()
+
+    categorized_count = 0
+    for results in merchant_aggregator._process_data_in_chunks(transactions, USER_CATEGORIES, PROCESSING_DATA):
+        categorized_count = len(results["transactions"])
+
+    elapsed = time.perf_counter() - start_time
+    end_children_cpu = resource.getrusage(resource.RUSAGE_CHILDREN)
+    children_cpu = (end_children_cpu.ru_utime + end_children_cpu.ru_stime) - (
+        start_children_cpu.ru_utime + start_children_cpu.ru_stime
+    )
+    return elapsed, time.process_time() - start_cpu + children_cpu
+
+
+def run_benchmark(transactions_count):
+    merchant_aggregator.query_chatgpt = stub_query_chatgpt
+    pool_process_chunk = merchant_aggregator._process_chunk
+
+    print(f"Categorizing {transactions_count} uncached transactions, stub LLM latency: {LLM_LATENCY * 1000:.0f}ms")
+    for name, process_chunk in [("process per chunk", legacy_process_chunk), ("thread pool", pool_process_chunk)]:
+        elapsed, cpu = measure(process_chunk, transactions_count)
+        print(f"{name:>17} | wall time: {elapsed:6.2f}s | cpu (including child processes): {cpu:6.2f}s")
+
+
+if __name__ == "__main__":
+    run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
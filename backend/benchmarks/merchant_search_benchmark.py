@@ -0,0 +1,65 @@
+"""
+Measures merchant search latency for a single user's transactions, comparing the unindexed merchantData JSON scan
+with the trigram indexed merchantName column (substring and fuzzy searches).
+Needs a PostgreSQL database, seeds and removes the pagination benchmark's user.
+
+Usage (from the backend directory):
+    DATABASE_URI=postgresql://... python -m benchmarks.merchant_search_benchmark [transactions_count]
+"""
+import os
+import sys
+import dotenv
+from flask import Flask
+from sqlalchemy import func, select
+from app.api.helpers import build_merchant_search_query
+from app.database.app import initialize_database
+from app.database.models import Transaction, db
+from benchmarks.list_transactions_pagination_benchmark import (
+    BENCHMARK_USER_EMAIL,
+    measure,
+    remove_transactions,
+    seed_transactions,
+)
+
+SEARCHES = [("substring", "chant 4"), ("substring", "Merchant 299"), ("fuzzy", "Merchnt 42")]
+
+
+def json_scan_search(search_text):
+    """The search without the generated column, parsing merchantData for every row of the user"""
+
+    merchant_name = Transaction.merchantData["name"].astext
+    statement = (
+        select(merchant_name, func.count())
+        .where(Transaction.userEmail == BENCHMARK_USER_EMAIL, merchant_name.ilike(f"%{search_text}%"))
+        .group_by(merchant_name)
+        .limit(20)
+    )
+    return db.session.execute(statement).all()
+
+
+def run_benchmark(transactions_count):
+    print(f"Searching merchants of a user with {transactions_count} transactions")
+    for mode, search_text in SEARCHES:
+        statement = build_merchant_search_query(BENCHMARK_USER_EMAIL, search_text, mode)
+        indexed_ms = measure(lambda: db.session.execute(statement).all())
+        line = f"{mode:>9} '{search_text}' | trigram index: {indexed_ms:8.2f}ms"
+
+        if mode == "substring":
+            json_scan_ms = measure(lambda: json_scan_search(search_text))
+            line += f" | merchantData scan: {json_scan_ms:8.2f}ms"
+        print(line)
+
+
+if __name__ == "__main__":
+    dotenv.load_dotenv()
+    flask_app = Flask(__name__)
+    flask_app.config["SQLALCHEMY_DATABASE_URI"] = os.environ["DATABASE_URI"]
+    initialize_database(flask_app)
+
+    with flask_app.app_context():
+        remove_transactions()
+        seed_transactions(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
+        try:
+            run_benchmark(Transaction.query.filter(Transaction.userEmail == BENCHMARK_USER_EMAIL).count())
+        finally:
+            remove_transactions()
@@ -0,0 +1,80 @@
+"""
+Checks that every supported transactions list filter and sort combination is planned without a sequential scan
+of the transaction table. Seeds the pagination benchmark's user, runs EXPLAIN for each combination and exits with
+an error if any plan scans the whole table.
+
+Usage (from the backend directory):
+    DATABASE_URI=postgresql://... python -m benchmarks.transactions_filters_plans [transactions_count]
+"""
+import itertools
+import os
+import sys
+import dotenv
+from flask import Flask
+from app.api.helpers import apply_sorting, apply_transactions_filters, explain_query
+from app.database.app import initialize_database
+from app.database.models import Transaction
+from benchmarks.list_transactions_pagination_benchmark import (
+    BENCHMARK_USER_EMAIL,
+    remove_transactions,
+    seed_transactions,
+)
+
+SAMPLE_FILTERS = {
+    "purchaseDate": {"start": "2021-01-01", "end": "2021-03-31"},
+    "transactionAmount": {"min": 100, "max": 120},
+    "category": [-1],
+    "card": ["1001"],
+    "store": "Merchant 42",
+    "status": True,
+}
+SORT_CONFIGS = [
+    {"field": field, "direction": direction}
+    for field in ("purchaseDate", "transactionAmount")
+    for direction in ("asc", "desc")
+]
+
+
+def find_sequential_scans(plan):
+    scans = []
+    if plan.get("Node Type") == "Seq Scan" and plan.get("Relation Name") == "transaction":
+        scans.append(plan)
+    for child_plan in plan.get("Plans", []):
+        scans.extend(find_sequential_scans(child_plan))
+    return scans
+
+
+def check_plans():
+    failed_combinations = []
+    base_query = Transaction.query.filter_by(userEmail=BENCHMARK_USER_EMAIL, isRecurring=False, isDeleted=False)
+
+    for filters_count in range(len(SAMPLE_FILTERS) + 1):
+        for filter_names in itertools.combinations(SAMPLE_FILTERS, filters_count):
+            filters = {name: SAMPLE_FILTERS[name] for name in filter_names}
+            for sort_config in SORT_CONFIGS:
+                query = apply_sorting(apply_transactions_filters(base_query, filters), sort_config).limit(50)
+                if find_sequential_scans(explain_query(query)):
+                    failed_combinations.append((filter_names, sort_config))
+
+    checked_count = 2 ** len(SAMPLE_FILTERS) * len(SORT_CONFIGS)
+    print(f"Checked {checked_count} filter and sort combinations, {len(failed_combinations)} use a sequential scan")
+    for filter_names, sort_config in failed_combinations:
+        print(f"  filters: {', '.join(filter_names) or 'none'} | sort: {sort_config['field']} {sort_config['direction']}")
+    return len(failed_combinations) == 0
+
+
+if __name__ == "__main__":
+    dotenv.load_dotenv()
+    flask_app = Flask(__name__)
+    flask_app.config["SQLALCHEMY_DATABASE_URI"] = os.environ["DATABASE_URI"]
+    initialize_database(flask_app)
+
+    with flask_app.app_context():
+        remove_transactions()
+        seed_transactions(int(sys.argv[1]) if len(sys.argv) > 1 else 200000)
+        try:
+            is_successful = check_plans()
+        finally:
+            remove_transactions()
+
+    sys.exit(0 if is_successful else 1)
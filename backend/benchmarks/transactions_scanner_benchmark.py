@@ -0,0 +1,64 @@
+"""
+Benchmarks the concurrent fetch stage of the transactions scanner against a local fake MAX server.
+
+Usage (from the backend directory):
+    python -m benchmarks.transactions_scanner_benchmark [users_count]
+"""
+import os
+import sys
+import time
+
+os.environ.setdefault("ENCRYPTION_KEY", "benchmark-key-16")
+
+from app.credit_card_adapters import max_fetcher
+from app.job_scheduler.jobs.transactions_scanner import _fetch_users_transactions_concurrently
+from benchmarks.fake_max_server import LOGIN_PATH, TRANSACTIONS_PATH, FakeMaxServer
+from config import max_urls
+from lib.encryption.aes_encryptor import encrypt
+from lib.rate_limiter.rate_limiter import RateLimiter
+
+WORKERS_COUNTS = [1, 2, 4, 8, 16, 32]
+
+
+def build_fetch_args_list(users_count):
+    encrypted_password = encrypt("password")
+    return [
+        {
+            "user_credentials": {"username": f"user{index}", "password": encrypted_password, "id": "123456789"},
+            "user_email": f"user{index}@example.com",
+            "dates": None,
+        }
+        for index in range(users_count)
+    ]
+
+
+def run_benchmark(users_count):
+    with FakeMaxServer(latency=0.05) as server:
+        max_fetcher.LOGIN_URL = server.base_url + LOGIN_PATH
+        max_urls.TRANSACTIONS_API = server.base_url + TRANSACTIONS_PATH
+
+        # The benchmark measures concurrency, not the production request rate limit
+        max_fetcher.rate_limiter = RateLimiter(10_000)
+
+        fetch_args_list = build_fetch_args_list(users_count)
+        print(f"Fetching transactions for {users_count} users, server latency: {server.latency * 1000:.0f}ms")
+
+        baseline = None
+        for workers_count in WORKERS_COUNTS:
+            # Every run logs in from scratch so only the workers count changes between runs
+            max_fetcher.session_cookies_cache.clear()
+
+            start_time = time.perf_counter()
+            results = _fetch_users_transactions_concurrently(fetch_args_list, workers_count=workers_count)
+            elapsed = time.perf_counter() - start_time
+
+            failed_count = len([r for r in results.values() if not isinstance(r, list)])
+            baseline = baseline or elapsed
+            print(
+                f"workers: {workers_count:>3} | wall time: {elapsed:7.3f}s | "
+                f"speedup: {baseline / elapsed:5.1f}x | failed: {failed_count}"
+            )
+
+
+if __name__ == "__main__":
+    run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 64)
@@ -8,6 +8,38 @@ JWT_SECRET_KEY = os.environ.get("JWT_SECRET_KEY")
 IS_DEBUG = os.environ.get("IS_DEBUG", 'TRUE') == 'TRUE'
 DEEP_TRANSACTIONS_SCAN_DEPTH_IN_DAYS = 365
 SHALLOW_TRANSACTION_SCAN_DEPTH_IN_DAYS = 30
+INCREMENTAL_SCAN_OVERLAP_IN_DAYS = 3
 STOP_AT_FAILED_LOGIN_THRESHOLD = 5
 MAX_TRANSACTIONS_PER_REQUEST = 1000
-TRANSACTIONS_CHUNK_SIZE = 50
\ No newline at end of file
+TRANSACTIONS_CHUNK_SIZE = 50
+CREDIT_CARD_ADAPTER = os.environ.get("CREDIT_CARD_ADAPTER", "max")
+TRANSACTIONS_SCANNER_WORKERS_COUNT = int(os.environ.get("TRANSACTIONS_SCANNER_WORKERS_COUNT", "32"))
+TRANSACTIONS_SCAN_TIMEOUT_IN_SECONDS = 240
+TRANSACTIONS_USER_FETCH_TIMEOUT_IN_SECONDS = 60
+CREDIT_CARD_REQUEST_TIMEOUT_IN_SECONDS = 30
+CREDIT_CARD_MAX_REQUESTS_PER_SECOND_PER_HOST = 10
+MAX_SESSION_COOKIES_TTL_IN_SECONDS = 15 * 60
+MAX_SESSION_COOKIES_CACHE_SIZE = 10000
+MAX_RESPONSE_CHUNK_SIZE = 64 * 1024
+BULK_WRITE_BATCH_SIZE = 1000
+MERCHANT_AGGREGATOR_WORKERS_COUNT = 20
+OPENAI_REQUEST_TIMEOUT_IN_SECONDS = 30
+MERCHANTS_CACHE_USERS_COUNT = 5000
+AGGREGATION_USERS_BATCH_SIZE = 500
+JSON_PROVIDER = os.environ.get("JSON_PROVIDER", "orjson")
+RESPONSE_CACHE_BACKEND = os.environ.get("RESPONSE_CACHE_BACKEND", "memory")
+RESPONSE_CACHE_REDIS_URL = os.environ.get("REDIS_URL") or "redis://localhost:6379/0"
+SPENDING_HISTORY_CACHE_TTL_IN_SECONDS = 60 * 60
+SPENDING_HISTORY_CACHE_USERS_COUNT = 10000
+DEFAULT_CATEGORIES_CACHE_TTL_IN_SECONDS = 60 * 60
+MERCHANTS_CACHE_TTL_IN_SECONDS = 10 * 60
+EMBEDDED_JOB_WORKER = os.environ.get("EMBEDDED_JOB_WORKER", "FALSE") == "TRUE"
+JOB_WORKER_POLL_INTERVAL_IN_SECONDS = 5
+JOB_LEASE_TIMEOUT_IN_SECONDS = 60 * 60
+LEADER_ELECTION_INTERVAL_IN_SECONDS = 15
+SCHEDULER_LEADER_LOCK_ID = 7310024
+SPENDING_CHANGES_LOCK_ID = 7310025
+JOB_SHARDS_COUNT = int(os.environ.get("JOB_SHARDS_COUNT", "16"))
+JOB_MAX_ATTEMPTS = 5
+JOB_RETRY_BASE_DELAY_IN_SECONDS = 30
+JOB_RETRY_MAX_DELAY_IN_SECONDS = 30 * 60
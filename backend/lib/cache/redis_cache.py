@@ -0,0 +1,60 @@
+import json
+
+try:
+    import redis
+except ImportError:  # redis is optional, it's only needed for a cache shared between processes
+    redis = None
+
+
+class RedisCache:
+    """
+    A cache kept in Redis, shared by all of the processes using the same server and prefix.
+
+    Exposes the same get/set/delete interface as LRUCache so either can back a cache. Values are stored as JSON,
+    so they must be JSON serializable and come back with string dictionary keys.
+    """
+
+    def __init__(self, url=None, prefix="", ttl=None, client=None):
+        if client is None:
+            if redis is None:
+                raise RuntimeError("The redis package is required to use a Redis cache")
+            client = redis.Redis.from_url(url)
+
+        self.prefix = prefix
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._client = client
+
+    def _key(self, key):
+        return f"{self.prefix}{key}"
+
+    def get(self, key, default=None):
+        """Return the cached value for the key, or the default if it's missing or expired."""
+
+        value = self._client.get(self._key(key))
+
+        if value is None:
+            self.misses += 1
+            return default
+
+        self.hits += 1
+        return json.loads(value)
+
+    def set(self, key, value, ttl=None):
+        """Cache a value, Redis expires it after ttl seconds."""
+
+        ttl = ttl if ttl is not None else self.ttl
+        self._client.set(self._key(key), json.dumps(value), ex=int(ttl) if ttl is not None else None)
+
+    def delete(self, key):
+        self._client.delete(self._key(key))
+
+    def clear(self):
+        for key in self._client.scan_iter(match=f"{self.prefix}*"):
+            self._client.delete(key)
+
+    def stats(self):
+        """Return the hit/miss counters of this process."""
+
+        return {"hits": self.hits, "misses": self.misses}
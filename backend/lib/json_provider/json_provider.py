@@ -0,0 +1,69 @@
+import decimal
+from datetime import date, datetime
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # orjson is optional, the standard library provider is used without it
+    orjson = None
+
+
+class ISODefaultJSONProvider(DefaultJSONProvider):
+    """
+    Flask's default (standard library) JSON provider, encoding dates as ISO 8601 strings instead of HTTP dates.
+    Produces the same output as OrjsonProvider so they can be swapped.
+    """
+
+    ensure_ascii = False
+    sort_keys = False
+
+    @staticmethod
+    def default(o):
+        if isinstance(o, (datetime, date)):
+            return o.isoformat()
+        return DefaultJSONProvider.default(o)
+
+
+class OrjsonProvider(ISODefaultJSONProvider):
+    """
+    A JSON provider encoding responses with orjson, which serializes dicts, lists, datetimes, dataclasses and UUIDs
+    natively. Decoding, and dumps calls passing json.dumps arguments, fall back to the standard library provider.
+    """
+
+    option = orjson.OPT_NON_STR_KEYS if orjson else 0
+
+    @staticmethod
+    def _orjson_default(o):
+        if isinstance(o, decimal.Decimal):
+            return str(o)
+        if hasattr(o, "__html__"):
+            return str(o.__html__())
+        raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self._orjson_default, option=self.option).decode()
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(
+            orjson.dumps(obj, default=self._orjson_default, option=self.option), mimetype=self.mimetype
+        )
+
+
+JSON_PROVIDERS = {
+    "orjson": OrjsonProvider,
+    "default": ISODefaultJSONProvider,
+}
+
+
+def create_json_provider(app, name="orjson"):
+    """Create the named JSON provider for the app, falling back to the standard library provider without orjson."""
+
+    if name not in JSON_PROVIDERS:
+        raise ValueError(f"Unknown JSON provider: {name}, available providers: {', '.join(JSON_PROVIDERS)}")
+
+    if name == "orjson" and orjson is None:
+        name = "default"
+    return JSON_PROVIDERS[name](app)
@@ -0,0 +1,180 @@
+import codecs
+import json
+import re
+
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+DECODER = json.JSONDecoder()
+
+
+class JSONStreamError(ValueError):
+    """Raised when a JSON stream is malformed or ends unexpectedly."""
+
+
+class _Incomplete(Exception):
+    """Raised by a parsing step that needs more of the stream, the step is retried once more text is fed."""
+
+
+class JSONArrayParser:
+    """
+    Incrementally extracts the items of a JSON array nested in a document fed as chunks of UTF-8 bytes.
+
+    The array is located by a path of object keys, e.g. ("result", "transactions") for {"result": {"transactions": [...]}}.
+    Every call to feed returns the items completed by the chunk, so only the current item is ever buffered.
+    Parsing is split into atomic steps (an object member, an array item) that are retried from their start when
+    a chunk ends in the middle of one.
+    """
+
+    def __init__(self, path):
+        self._path = tuple(path)
+        self._depth = 0
+        self._state = "value"
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._text = ""
+        self._pos = 0
+        self._eof = False
+        self.done = False
+
+    def feed(self, chunk):
+        """Parse the next chunk, returns the array items it completed."""
+
+        if self.done:
+            return []
+
+        self._text = self._text[self._pos :] + self._decoder.decode(chunk)
+        self._pos = 0
+        return self._parse()
+
+    def close(self):
+        """Parse the end of the stream, returns the last items. Raises JSONStreamError if the array isn't complete."""
+
+        if self.done:
+            return []
+
+        self._text = self._text[self._pos :] + self._decoder.decode(b"", final=True)
+        self._pos = 0
+        self._eof = True
+        return self._parse()
+
+    def _parse(self):
+        items = []
+        while not self.done:
+            start = self._pos
+            try:
+                self._step(items)
+            except _Incomplete:
+                self._pos = start
+                break
+        return items
+
+    def _step(self, items):
+        if self._state == "value":
+            # The value at the current depth of the path, an object along the path and the array at its end
+            if self._peek() == "n" and self._decode_value() is None:
+                self.done = True
+            elif self._depth < len(self._path):
+                self._expect("{")
+                self._state = "first_member"
+            else:
+                self._expect("[")
+                self._state = "first_item"
+
+        elif self._state == "first_member":
+            if self._peek() == "}":
+                self.done = True
+            else:
+                self._state = "member"
+
+        elif self._state == "member":
+            key = self._decode_value()
+            self._expect(":")
+            if key == self._path[self._depth]:
+                self._depth += 1
+                self._state = "value"
+                return
+
+            # Skip the values of unrelated keys
+            self._decode_value()
+            if self._expect(",}") == "}":
+                self.done = True
+
+        elif self._state == "first_item":
+            if self._peek() == "]":
+                self.done = True
+            else:
+                self._state = "item"
+
+        elif self._state == "item":
+            item = self._decode_value()
+            is_last = self._expect(",]") == "]"
+            items.append(item)
+            self.done = is_last
+
+    def _need_more(self):
+        if self._eof:
+            raise JSONStreamError("Unexpected end of JSON stream")
+        raise _Incomplete()
+
+    def _peek(self):
+        """Skip whitespace and return the next character without consuming it."""
+
+        self._pos = WHITESPACE.match(self._text, self._pos).end()
+        if self._pos >= len(self._text):
+            self._need_more()
+        return self._text[self._pos]
+
+    def _expect(self, characters):
+        """Consume the next character, which must be one of the given characters."""
+
+        character = self._peek()
+        if character not in characters:
+            raise JSONStreamError(f"Expected one of '{characters}' at position {self._pos}, found '{character}'")
+        self._pos += 1
+        return character
+
+    def _decode_value(self):
+        """Decode the next complete JSON value."""
+
+        self._peek()
+        try:
+            value, end = DECODER.raw_decode(self._text, self._pos)
+        except json.JSONDecodeError as e:
+            if self._eof:
+                raise JSONStreamError(str(e))
+            raise _Incomplete()
+
+        # A number at the end of the buffer might continue in the next chunk
+        if end == len(self._text) and not self._eof:
+            raise _Incomplete()
+
+        self._pos = end
+        return value
+
+
+def iter_json_array(chunks, path):
+    """
+    Lazily yield the items of a JSON array nested in a stream of JSON bytes chunks (see JSONArrayParser).
+
+    Items are decoded one at a time so the whole document is never held in memory, and the stream isn't read
+    past the end of the array.
+    Nothing is yielded if a key along the path is missing or null. Raises JSONStreamError on malformed JSON.
+    """
+
+    parser = JSONArrayParser(path)
+    for chunk in chunks:
+        yield from parser.feed(chunk)
+        if parser.done:
+            return
+    yield from parser.close()
+
+
+async def aiter_json_array(chunks, path):
+    """The async counterpart of iter_json_array, for an async iterator of chunks (e.g. httpx's aiter_bytes)."""
+
+    parser = JSONArrayParser(path)
+    async for chunk in chunks:
+        for item in parser.feed(chunk):
+            yield item
+        if parser.done:
+            return
+    for item in parser.close():
+        yield item
@@ -0,0 +1,50 @@
+import asyncio
+import threading
+import time
+
+
+class RateLimiter:
+    """
+    A thread-safe token bucket limiter, keeping a separate bucket for every key (e.g. a host name).
+
+    Calling `acquire` (or awaiting `acquire_async`) waits until a token is available for the given key, which
+    caps the number of calls made per key to `rate` per second with bursts of up to `burst` calls.
+    """
+
+    def __init__(self, rate, burst=None):
+        if rate <= 0:
+            raise ValueError("Rate must be a positive number")
+
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1, int(rate))
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def _try_acquire(self, key):
+        """Consume a token for the key if one is available, otherwise return the time to wait for one."""
+
+        with self._lock:
+            now = time.monotonic()
+            tokens, last_refill = self._buckets.get(key, (self.burst, now))
+
+            # Refill the bucket based on the time passed since the last refill
+            tokens = min(self.burst, tokens + (now - last_refill) * self.rate)
+
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                return 0
+
+            self._buckets[key] = (tokens, now)
+            return (1 - tokens) / self.rate
+
+    def acquire(self, key):
+        """Block until a token is available for the given key and consume it."""
+
+        while (wait_time := self._try_acquire(key)) > 0:
+            time.sleep(wait_time)
+
+    async def acquire_async(self, key):
+        """Wait without blocking the event loop until a token is available for the given key and consume it."""
+
+        while (wait_time := self._try_acquire(key)) > 0:
+            await asyncio.sleep(wait_time)
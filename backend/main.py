@@ -11,7 +11,9 @@ from app.api.api import register_api_routes
 from app.database.app import initialize_database
 from app.helper import setup_werkzeug_logger
 from app.job_scheduler.app import start_scheduler
+from lib.json_provider.json_provider import create_json_provider
 from lib.jwt.jwt import jwt
+from config.app import JSON_PROVIDER
 
 
 def create_app(initialize_db=True, initialize_scheduler=True):
@@ -31,6 +33,7 @@ def create_app(initialize_db=True, initialize_scheduler=True):
     # Initialize api
     app = Flask(__name__)
     app = register_api_routes(app)
+    app.json = create_json_provider(app, JSON_PROVIDER)
     app.config["JSON_AS_ASCII"] = False
     app.config["SQLALCHEMY_DATABASE_URI"] = db_uri
     app.config["WTF_CSRF_ENABLED"] = False
@@ -0,0 +1,33 @@
+"""Added transactionsHighWaterMark column to user table
+
+Revision ID: 8c1d2e7f4a3b
+Revises: 3f2b3238865b
+Create Date: 2023-12-04 10:12:27.431902
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8c1d2e7f4a3b'
+down_revision: Union[str, None] = '3f2b3238865b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('user', sa.Column('transactionsHighWaterMark', sa.DateTime(), nullable=True))
+
+    # Backfill the high-water mark from the already scanned confirmed transactions
+    op.execute(
+        'UPDATE "user" SET "transactionsHighWaterMark" = ('
+        'SELECT MAX(t."purchaseDate") FROM "transaction" t '
+        'WHERE t."userEmail" = "user".email AND t."isPending" IS NOT TRUE AND t."isRecurring" IS NOT TRUE)'
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('user', 'transactionsHighWaterMark')
@@ -0,0 +1,40 @@
+"""Added keyset pagination indexes to transactions table
+
+Revision ID: a3d8f61e0c47
+Revises: e4a7c9d2b816
+Create Date: 2023-12-09 14:21:37.804512
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3d8f61e0c47'
+down_revision: Union[str, None] = 'e4a7c9d2b816'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        'ix_transaction_list_purchaseDate_id',
+        'transaction',
+        ['userEmail', 'purchaseDate', 'id'],
+        unique=False,
+        postgresql_where=sa.text('"isRecurring" = false AND "isDeleted" = false'),
+    )
+    op.create_index(
+        'ix_transaction_list_transactionAmount_id',
+        'transaction',
+        ['userEmail', 'transactionAmount', 'id'],
+        unique=False,
+        postgresql_where=sa.text('"isRecurring" = false AND "isDeleted" = false'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_transaction_list_transactionAmount_id', table_name='transaction')
+    op.drop_index('ix_transaction_list_purchaseDate_id', table_name='transaction')
@@ -0,0 +1,57 @@
+"""Added jobQueue table
+
+Revision ID: a6e2d9c4f153
+Revises: f81c4b6e2d97
+Create Date: 2023-12-13 09:42:18.503611
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a6e2d9c4f153'
+down_revision: Union[str, None] = 'f81c4b6e2d97'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'jobQueue',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('jobs', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+        sa.Column('singletonKey', sa.String(length=255), nullable=True),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('runAt', sa.DateTime(), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('lockedBy', sa.String(length=255), nullable=True),
+        sa.Column('lockedAt', sa.DateTime(), nullable=True),
+        sa.Column('createdAt', sa.DateTime(), nullable=False),
+        sa.Column('finishedAt', sa.DateTime(), nullable=True),
+        sa.Column('lastError', sa.Text(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(
+        'ix_jobQueue_queued_runAt',
+        'jobQueue',
+        ['runAt'],
+        unique=False,
+        postgresql_where=sa.text("status = 'queued'"),
+    )
+    op.create_index(
+        'ix_jobQueue_singletonKey_active',
+        'jobQueue',
+        ['singletonKey'],
+        unique=True,
+        postgresql_where=sa.text("status IN ('queued', 'running')"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_jobQueue_singletonKey_active', table_name='jobQueue')
+    op.drop_index('ix_jobQueue_queued_runAt', table_name='jobQueue')
+    op.drop_table('jobQueue')
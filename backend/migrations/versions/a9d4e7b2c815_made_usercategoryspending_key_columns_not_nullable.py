@@ -0,0 +1,36 @@
+"""Made userCategorySpending key columns not nullable
+
+Revision ID: a9d4e7b2c815
+Revises: f3c8a1d5e927
+Create Date: 2023-12-15 17:04:51.283306
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a9d4e7b2c815'
+down_revision: Union[str, None] = 'f3c8a1d5e927'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # NULLs never conflict on the unique key, so cells without a user or a category escaped the deduplication and
+    # can't be reached by the aggregator's upserts. The aggregation never produces them, drop them.
+    op.execute(
+        """
+        DELETE FROM "userCategorySpending"
+        WHERE "userEmail" IS NULL OR "userCategoryId" IS NULL
+        """
+    )
+    op.alter_column('userCategorySpending', 'userEmail', existing_type=sa.String(length=255), nullable=False)
+    op.alter_column('userCategorySpending', 'userCategoryId', existing_type=sa.Integer(), nullable=False)
+
+
+def downgrade() -> None:
+    op.alter_column('userCategorySpending', 'userCategoryId', existing_type=sa.Integer(), nullable=True)
+    op.alter_column('userCategorySpending', 'userEmail', existing_type=sa.String(length=255), nullable=True)
@@ -0,0 +1,44 @@
+"""Scoped the merchantName trigram index by user
+
+Revision ID: b3f7c2a9d461
+Revises: a9d4e7b2c815
+Create Date: 2023-12-16 09:41:12.570284
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b3f7c2a9d461'
+down_revision: Union[str, None] = 'a9d4e7b2c815'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # btree_gin adds GIN operator classes for scalar columns, so the userEmail equality is served by the same index
+    op.execute('CREATE EXTENSION IF NOT EXISTS btree_gin')
+    op.create_index(
+        'ix_transaction_userEmail_merchantName_trgm',
+        'transaction',
+        ['userEmail', 'merchantName'],
+        unique=False,
+        postgresql_using='gin',
+        postgresql_ops={'merchantName': 'gin_trgm_ops'},
+    )
+    op.drop_index('ix_transaction_merchantName_trgm', table_name='transaction')
+
+
+def downgrade() -> None:
+    op.create_index(
+        'ix_transaction_merchantName_trgm',
+        'transaction',
+        ['merchantName'],
+        unique=False,
+        postgresql_using='gin',
+        postgresql_ops={'merchantName': 'gin_trgm_ops'},
+    )
+    op.drop_index('ix_transaction_userEmail_merchantName_trgm', table_name='transaction')
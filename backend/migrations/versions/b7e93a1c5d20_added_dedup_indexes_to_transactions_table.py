@@ -0,0 +1,33 @@
+"""Added dedup indexes to transactions table
+
+Revision ID: b7e93a1c5d20
+Revises: 8c1d2e7f4a3b
+Create Date: 2023-12-05 18:40:02.118734
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7e93a1c5d20'
+down_revision: Union[str, None] = '8c1d2e7f4a3b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_transaction_userEmail_id', 'transaction', ['userEmail', 'id'], unique=False)
+    op.create_index(
+        'ix_transaction_userEmail_authorizationNumber_isPending',
+        'transaction',
+        ['userEmail', 'authorizationNumber', 'isPending'],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_transaction_userEmail_authorizationNumber_isPending', table_name='transaction')
+    op.drop_index('ix_transaction_userEmail_id', table_name='transaction')
@@ -0,0 +1,35 @@
+"""Added spendingChanges table
+
+Revision ID: b91f4c7d2e60
+Revises: a6e2d9c4f153
+Create Date: 2023-12-14 11:05:37.214906
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b91f4c7d2e60'
+down_revision: Union[str, None] = 'a6e2d9c4f153'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'spendingChanges',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('userEmail', sa.String(length=255), nullable=False),
+        sa.Column('date', sa.Integer(), nullable=False),
+        sa.Column('categoryId', sa.Integer(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(op.f('ix_spendingChanges_userEmail'), 'spendingChanges', ['userEmail'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_spendingChanges_userEmail'), table_name='spendingChanges')
+    op.drop_table('spendingChanges')
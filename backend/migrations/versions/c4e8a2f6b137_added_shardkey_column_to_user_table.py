@@ -0,0 +1,39 @@
+"""Added shardKey column to user table
+
+Revision ID: c4e8a2f6b137
+Revises: b91f4c7d2e60
+Create Date: 2023-12-14 16:48:02.731590
+
+"""
+from typing import Sequence, Union
+import zlib
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4e8a2f6b137'
+down_revision: Union[str, None] = 'b91f4c7d2e60'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('user', sa.Column('shardKey', sa.BigInteger(), nullable=True))
+
+    # The key is the CRC32 of the email (see app/job_scheduler/sharding), computed here for the existing users
+    connection = op.get_bind()
+    user_table = sa.table('user', sa.column('email', sa.String), sa.column('shardKey', sa.BigInteger))
+    for (email,) in connection.execute(sa.select(user_table.c.email)).all():
+        connection.execute(
+            user_table.update()
+            .where(user_table.c.email == email)
+            .values(shardKey=zlib.crc32(email.encode('utf-8')))
+        )
+
+    op.alter_column('user', 'shardKey', nullable=False)
+
+
+def downgrade() -> None:
+    op.drop_column('user', 'shardKey')
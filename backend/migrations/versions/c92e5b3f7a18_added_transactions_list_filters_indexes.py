@@ -0,0 +1,50 @@
+"""Added transactions list filters indexes
+
+Revision ID: c92e5b3f7a18
+Revises: a3d8f61e0c47
+Create Date: 2023-12-10 10:12:09.327485
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c92e5b3f7a18'
+down_revision: Union[str, None] = 'a3d8f61e0c47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+LIST_PREDICATE = '"isRecurring" = false AND "isDeleted" = false'
+
+
+def upgrade() -> None:
+    op.create_index(
+        'ix_transaction_list_categoryId_purchaseDate_id',
+        'transaction',
+        ['userEmail', 'categoryId', 'purchaseDate', 'id'],
+        unique=False,
+        postgresql_where=sa.text(LIST_PREDICATE),
+    )
+    op.create_index(
+        'ix_transaction_list_shortCardNumber_purchaseDate_id',
+        'transaction',
+        ['userEmail', 'shortCardNumber', 'purchaseDate', 'id'],
+        unique=False,
+        postgresql_where=sa.text(LIST_PREDICATE),
+    )
+    op.create_index(
+        'ix_transaction_list_pending_purchaseDate_id',
+        'transaction',
+        ['userEmail', 'purchaseDate', 'id'],
+        unique=False,
+        postgresql_where=sa.text(f'{LIST_PREDICATE} AND "isPending" = true'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_transaction_list_pending_purchaseDate_id', table_name='transaction')
+    op.drop_index('ix_transaction_list_shortCardNumber_purchaseDate_id', table_name='transaction')
+    op.drop_index('ix_transaction_list_categoryId_purchaseDate_id', table_name='transaction')
@@ -0,0 +1,39 @@
+"""Added trigram indexed merchantName column to transactions table
+
+Revision ID: d5f1a8e3b294
+Revises: c92e5b3f7a18
+Create Date: 2023-12-11 16:47:52.610294
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd5f1a8e3b294'
+down_revision: Union[str, None] = 'c92e5b3f7a18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.add_column(
+        'transaction',
+        sa.Column('merchantName', sa.Text(), sa.Computed('"merchantData" ->> \'name\'', persisted=True), nullable=True),
+    )
+    op.create_index(
+        'ix_transaction_merchantName_trgm',
+        'transaction',
+        ['merchantName'],
+        unique=False,
+        postgresql_using='gin',
+        postgresql_ops={'merchantName': 'gin_trgm_ops'},
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_transaction_merchantName_trgm', table_name='transaction')
+    op.drop_column('transaction', 'merchantName')
@@ -0,0 +1,26 @@
+"""Added amount column to spendingChanges table
+
+Revision ID: e2b6d9f3a481
+Revises: c4e8a2f6b137
+Create Date: 2023-12-15 10:12:44.905318
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2b6d9f3a481'
+down_revision: Union[str, None] = 'c4e8a2f6b137'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('spendingChanges', sa.Column('amount', sa.Float(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('spendingChanges', 'amount')
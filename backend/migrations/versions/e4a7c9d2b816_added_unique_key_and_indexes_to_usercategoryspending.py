@@ -0,0 +1,53 @@
+"""Added unique key and indexes to userCategorySpending table
+
+Revision ID: e4a7c9d2b816
+Revises: b7e93a1c5d20
+Create Date: 2023-12-07 11:02:45.530117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e4a7c9d2b816'
+down_revision: Union[str, None] = 'b7e93a1c5d20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # The previous read-then-write aggregation could create duplicate cells, keep the latest one
+    op.execute(
+        """
+        DELETE FROM "userCategorySpending" AS duplicate
+        USING "userCategorySpending" AS kept
+        WHERE duplicate."userEmail" = kept."userEmail"
+          AND duplicate."userCategoryId" = kept."userCategoryId"
+          AND duplicate.date = kept.date
+          AND duplicate.id < kept.id
+        """
+    )
+    op.create_unique_constraint(
+        'uq_userCategorySpending_userEmail_userCategoryId_date',
+        'userCategorySpending',
+        ['userEmail', 'userCategoryId', 'date'],
+    )
+    op.create_index(
+        'ix_userCategorySpending_userEmail_date',
+        'userCategorySpending',
+        ['userEmail', 'date'],
+        unique=False,
+        postgresql_include=['userCategoryId', 'spendingAmount'],
+    )
+    op.drop_index('ix_userCategorySpending_date', table_name='userCategorySpending')
+
+
+def downgrade() -> None:
+    op.create_index('ix_userCategorySpending_date', 'userCategorySpending', ['date'], unique=False)
+    op.drop_index('ix_userCategorySpending_userEmail_date', table_name='userCategorySpending')
+    op.drop_constraint(
+        'uq_userCategorySpending_userEmail_userCategoryId_date', 'userCategorySpending', type_='unique'
+    )
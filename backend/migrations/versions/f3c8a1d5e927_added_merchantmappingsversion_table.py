@@ -0,0 +1,31 @@
+"""Added merchantMappingsVersion table
+
+Revision ID: f3c8a1d5e927
+Revises: e2b6d9f3a481
+Create Date: 2023-12-15 15:37:20.614093
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3c8a1d5e927'
+down_revision: Union[str, None] = 'e2b6d9f3a481'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'merchantMappingsVersion',
+        sa.Column('userEmail', sa.String(length=255), nullable=False),
+        sa.Column('version', sa.Integer(), server_default='0', nullable=False),
+        sa.PrimaryKeyConstraint('userEmail'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('merchantMappingsVersion')
@@ -0,0 +1,28 @@
+"""Added data version columns to user table
+
+Revision ID: f81c4b6e2d97
+Revises: d5f1a8e3b294
+Create Date: 2023-12-12 10:21:36.184522
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f81c4b6e2d97'
+down_revision: Union[str, None] = 'd5f1a8e3b294'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('user', sa.Column('dataVersion', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('user', sa.Column('dataUpdatedAt', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('user', 'dataUpdatedAt')
+    op.drop_column('user', 'dataVersion')
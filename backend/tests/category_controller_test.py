@@ -0,0 +1,133 @@
+from datetime import datetime
+import pytest
+from flask_jwt_extended import create_access_token
+from app.api.helpers import get_last_months_numbers
+from app.database.data_version import bump_data_version, bump_merchant_mappings_version
+from app.database.models import UserCategory, UserCategorySpending, UserParsedCategory, db
+from app.merchant_aggregator import merchants_cache
+from lib.cache.lru_cache import LRUCache
+from app.helper import date_to_number
+from tests.transactions_controller_test import USER_EMAIL, _count_queries, app_and_client
+
+
+def _add_spending(categories_ids, months):
+    db.session.add_all(
+        [
+            UserCategorySpending(userEmail=USER_EMAIL, userCategoryId=category_id, date=month, spendingAmount=category_id * 10)
+            for category_id in categories_ids
+            for month in months
+        ]
+    )
+    db.session.commit()
+
+
+@pytest.mark.parametrize("route", ["/api/categories/get-user-categories", "/api/categories/get_categories_spending?months=3"])
+def test_categories_spending_query_count_is_constant(app_and_client, route):
+    """
+    Test that the categories and their spending are fetched with the same number of queries for any number of categories.
+    """
+    app, test_client = app_and_client
+    headers = {"Authorization": f"Bearer {create_access_token(identity=USER_EMAIL)}"}
+    months = get_last_months_numbers(datetime.now(), 3)
+
+    queries_counts = []
+    for categories_count in (5, 60):
+        UserCategorySpending.query.delete()
+        _add_spending(range(1, categories_count + 1), months)
+
+        response, queries_count = _count_queries(app, lambda: test_client.get(route, headers=headers))
+        assert response.status_code == 200
+        queries_counts.append(queries_count)
+
+    assert queries_counts[0] == queries_counts[1]
+
+    categories = {category["id"]: category for category in response.get_json()["data"]}
+    assert len(categories) == 60
+    assert categories[7]["monthlySpending"] == 70
+    assert categories[60]["monthlySpending"] == 600
+
+
+def test_categories_spending_history_window(app_and_client):
+    app, test_client = app_and_client
+    headers = {"Authorization": f"Bearer {create_access_token(identity=USER_EMAIL)}"}
+    months = get_last_months_numbers(datetime.now(), 4)
+
+    # The oldest month is outside of the requested 3 months window
+    _add_spending([2], months)
+    db.session.get(UserCategory, 2).monthlyBudget = 500
+    db.session.commit()
+
+    response = test_client.get("/api/categories/get_categories_spending?months=3", headers=headers)
+    assert response.status_code == 200
+    categories = {category["id"]: category for category in response.get_json()["data"]}
+
+    assert categories[2]["monthlyBudget"] == 500
+    assert categories[2]["monthlySpending"] == 20
+    assert categories[2]["spendingHistory"] == {str(month): 20 for month in months[1:]}
+    assert categories[3]["spendingHistory"] == {str(month): 0 for month in months[1:]}
+    assert months[-1] == date_to_number(datetime.now())
+
+    response = test_client.get("/api/categories/get_categories_spending?months=0", headers=headers)
+    assert response.status_code == 400
+
+
+def test_last_months_numbers_cross_years():
+    assert get_last_months_numbers(datetime(2024, 2, 3), 4) == [202311, 202312, 202401, 202402]
+
+
+def test_set_merchant_invalidates_cached_mappings(app_and_client, monkeypatch):
+    """
+    Test that a merchant set through the categories API is seen by the next categorizer run.
+    """
+    app, test_client = app_and_client
+    headers = {"Authorization": f"Bearer {create_access_token(identity=USER_EMAIL)}"}
+    # Keep the cache's counters untouched for the merchants cache tests
+    monkeypatch.setattr(merchants_cache, "_global_mappings_loads", merchants_cache._global_mappings_loads)
+    monkeypatch.setattr(merchants_cache, "_user_mappings_cache", LRUCache(max_size=10))
+    merchants_cache.invalidate()
+
+    assert "Pizza Place" not in merchants_cache.get_cached_categories(USER_EMAIL)
+
+    response = test_client.post(
+        "/api/categories/set_merchant/id",
+        data={"merchant_name": "Pizza Place", "target_category_id": 7},
+        headers=headers,
+    )
+    assert response.status_code == 200
+    assert merchants_cache.get_cached_categories(USER_EMAIL)["Pizza Place"] == 7
+    merchants_cache.invalidate()
+
+
+def test_cached_mappings_follow_the_mappings_versions(app_and_client, monkeypatch):
+    """
+    Test that mappings written by another process are reloaded once their version is bumped, including in-place
+    category changes, while other data changes keep the cached mappings.
+    """
+    monkeypatch.setattr(merchants_cache, "_global_mappings_loads", merchants_cache._global_mappings_loads)
+    monkeypatch.setattr(merchants_cache, "_user_mappings_reloads", merchants_cache._user_mappings_reloads)
+    monkeypatch.setattr(merchants_cache, "_user_mappings_cache", LRUCache(max_size=10))
+    merchants_cache.invalidate()
+
+    merchants_cache.get_cached_categories(USER_EMAIL)
+    bump_data_version([USER_EMAIL])
+    db.session.commit()
+    merchants_cache.get_cached_categories(USER_EMAIL)
+    assert merchants_cache.stats()["user_mappings_reloads"] == 0
+
+    mapping = UserParsedCategory(chargingBusiness="Pizza Place", userEmail=USER_EMAIL, targetCategoryId=7)
+    db.session.add(mapping)
+    bump_merchant_mappings_version([USER_EMAIL])
+    db.session.commit()
+    assert merchants_cache.get_cached_categories(USER_EMAIL)["Pizza Place"] == 7
+
+    mapping.targetCategoryId = 8
+    bump_merchant_mappings_version([USER_EMAIL])
+    db.session.commit()
+    assert merchants_cache.get_cached_categories(USER_EMAIL)["Pizza Place"] == 8
+
+    db.session.add(UserParsedCategory(chargingBusiness="Burger Bar", userEmail=None, targetCategoryId=9))
+    bump_merchant_mappings_version([None])
+    db.session.commit()
+    assert merchants_cache.get_cached_categories(USER_EMAIL)["Burger Bar"] == 9
+    assert merchants_cache.stats()["user_mappings_reloads"] == 2
+    merchants_cache.invalidate()
@@ -0,0 +1,151 @@
+from datetime import datetime, timedelta, timezone
+from flask_jwt_extended import create_access_token
+import app.api.conditional_requests as conditional_requests
+import app.api.controllers.transactions_controller as transactions_controller
+from app.database.data_version import bump_data_version
+from app.database.models import User, db
+from app.job_scheduler import spending_changes
+from tests.transactions_controller_test import USER_EMAIL, _add_transactions, _count_queries, app_and_client
+
+
+def _headers(etag=None):
+    headers = {"Authorization": f"Bearer {create_access_token(identity=USER_EMAIL)}"}
+    if etag is not None:
+        headers["If-None-Match"] = etag
+    return headers
+
+
+def test_unchanged_resource_is_not_modified_without_running_the_route(app_and_client):
+    """
+    Test that a request with the current ETag gets a 304 after a single data version lookup.
+    """
+    app, test_client = app_and_client
+    headers = _headers()
+
+    response = test_client.get("/api/categories/get-user-categories", headers=headers)
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+    assert "private" in response.headers["Cache-Control"]
+
+    response, queries_count = _count_queries(
+        app, lambda: test_client.get("/api/categories/get-user-categories", headers={**headers, "If-None-Match": etag})
+    )
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+    assert queries_count == 1
+
+    # Other routes of the same user don't share the ETag
+    response = test_client.get("/api/categories/get_categories_spending", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 200
+
+
+def test_data_changes_bump_the_version(app_and_client, monkeypatch):
+    app, test_client = app_and_client
+    queued_users = []
+    monkeypatch.setattr(transactions_controller, "trigger_spending_aggregation", queued_users.extend)
+    headers = _headers()
+    _add_transactions(1)
+
+    etag = test_client.get("/api/transactions/list-recurring-transactions", headers=headers).headers["ETag"]
+    response = test_client.delete("/api/transactions/delete-transaction", json={"transactionId": "t0"}, headers=headers)
+    assert response.status_code == 200
+    assert queued_users == [USER_EMAIL]
+    # The touched cell is recorded in the deletion's transaction
+    assert spending_changes.drain_changes() == ({(USER_EMAIL, 202312, 1)}, {})
+
+    response = test_client.get("/api/transactions/list-recurring-transactions", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    # The change's second isn't over yet, a later change in it would get the same date
+    assert response.last_modified is None
+
+    # Jobs bump the version inside their own transactions
+    etag = response.headers["ETag"]
+    bump_data_version([USER_EMAIL])
+    db.session.commit()
+    response = test_client.get("/api/transactions/list-recurring-transactions", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 200
+
+
+def test_user_data_etag_depends_on_the_token(app_and_client):
+    """
+    Test that the user data, which embeds a new access token, isn't revalidated for another token.
+    """
+    app, test_client = app_and_client
+    headers = _headers()
+
+    etag = test_client.get("/api/users/get-user-data", headers=headers).headers["ETag"]
+    assert test_client.get("/api/users/get-user-data", headers={**headers, "If-None-Match": etag}).status_code == 304
+    assert test_client.get("/api/users/get-user-data", headers=_headers(etag)).status_code == 200
+
+
+def test_default_categories_are_revalidated_from_memory(app_and_client):
+    app, test_client = app_and_client
+
+    etag = test_client.get("/api/categories/get-defaults").headers["ETag"]
+    response, queries_count = _count_queries(
+        app, lambda: test_client.get("/api/categories/get-defaults", headers={"If-None-Match": etag})
+    )
+    assert response.status_code == 304
+    assert queries_count == 0
+
+
+def test_scan_date_only_invalidates_the_user_data(app_and_client):
+    """
+    Test that a scan without new transactions changes the user data validators only.
+    """
+    app, test_client = app_and_client
+    headers = _headers()
+
+    user_data_etag = test_client.get("/api/users/get-user-data", headers=headers).headers["ETag"]
+    categories_etag = test_client.get("/api/categories/get-user-categories", headers=headers).headers["ETag"]
+
+    db.session.get(User, USER_EMAIL).lastTransactionsScanDate = datetime.now()
+    db.session.commit()
+
+    response = test_client.get("/api/users/get-user-data", headers={**headers, "If-None-Match": user_data_etag})
+    assert response.status_code == 200
+    response = test_client.get("/api/categories/get-user-categories", headers=_headers(categories_etag))
+    assert response.status_code == 304
+
+
+def test_last_modified_is_not_older_than_the_month_start(app_and_client):
+    """
+    Test that a response validated by date before the current month started isn't revalidated.
+    """
+    app, test_client = app_and_client
+    headers = _headers()
+    db.session.get(User, USER_EMAIL).dataUpdatedAt = datetime(2020, 1, 1)
+    db.session.commit()
+
+    response = test_client.get("/api/categories/get-user-categories", headers=headers)
+    month_start = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    assert response.last_modified.replace(tzinfo=None) >= month_start - timedelta(days=1)
+
+    last_month = {"If-Modified-Since": "Wed, 01 Jan 2020 00:00:00 GMT"}
+    response = test_client.get("/api/categories/get-user-categories", headers={**headers, **last_month})
+    assert response.status_code == 200
+    current_month = {"If-Modified-Since": response.headers["Last-Modified"]}
+    response = test_client.get("/api/categories/get-user-categories", headers={**headers, **current_month})
+    assert response.status_code == 304
+
+
+def test_last_modified_is_rounded_up(app_and_client, monkeypatch):
+    """
+    Test that Last-Modified is rounded up, so a change later in the same second isn't answered with a 304.
+    """
+    app, test_client = app_and_client
+    headers = _headers()
+    monkeypatch.setattr(conditional_requests, "_get_month_start", lambda: datetime(2020, 1, 1, tzinfo=timezone.utc))
+
+    db.session.get(User, USER_EMAIL).dataUpdatedAt = datetime(2023, 12, 1, 10, 0, 0, 300000)
+    db.session.commit()
+    response = test_client.get("/api/categories/get-user-categories", headers=headers)
+    assert response.headers["Last-Modified"] == "Fri, 01 Dec 2023 10:00:01 GMT"
+
+    # Changed within the same second as the client's copy
+    db.session.get(User, USER_EMAIL).dataUpdatedAt = datetime(2023, 12, 1, 10, 0, 0, 800000)
+    db.session.commit()
+    if_modified_since = {"If-Modified-Since": "Fri, 01 Dec 2023 10:00:00 GMT"}
+    response = test_client.get("/api/categories/get-user-categories", headers={**headers, **if_modified_since})
+    assert response.status_code == 200
@@ -0,0 +1,265 @@
+from datetime import datetime, timedelta
+import pytest
+from flask import Flask
+from sqlalchemy.dialects import postgresql
+import app.job_scheduler.app as scheduler_app
+import app.job_scheduler.worker as worker
+from app.database.models import JobQueueEntry, User, UserWarnings, db
+from app.helper import fetch_users_for_scraping
+from app.job_scheduler import job_queue, sharding
+from app.job_scheduler.jobs_config import scheduled_jobs_dict
+from app.job_scheduler.leader_election import LeaderElection
+from config.app import JOB_MAX_ATTEMPTS, JOB_RETRY_MAX_DELAY_IN_SECONDS, JOB_SHARDS_COUNT, STOP_AT_FAILED_LOGIN_THRESHOLD
+from tests.transactions_controller_test import USER_EMAIL, _count_queries, app_and_client
+
+
+def _compile(statement):
+    return str(statement.compile(dialect=postgresql.dialect()))
+
+
+def test_singleton_entries_are_skipped_while_active():
+    """
+    Test that queueing a singleton entry does nothing when an active entry holds the key.
+    """
+    sql = _compile(job_queue.build_enqueue_statement([{"id": "transactions_scanner", "args": {}}], "transactions_scanner"))
+
+    assert 'ON CONFLICT ("singletonKey") WHERE status IN (\'queued\', \'running\') DO NOTHING' in sql
+    assert 'RETURNING "jobQueue".id' in sql
+    assert "ON CONFLICT" not in _compile(job_queue.build_enqueue_statement([{"id": "transactions_scanner"}]))
+
+
+def test_claiming_skips_entries_locked_by_other_workers():
+    sql = _compile(job_queue.build_claim_statement(datetime(2023, 12, 13)))
+
+    assert sql.endswith("FOR UPDATE SKIP LOCKED")
+    assert 'WHERE "jobQueue".status = ' in sql and 'ORDER BY "jobQueue"."runAt", "jobQueue".id' in sql
+
+
+class _FakeScheduler:
+    def __init__(self):
+        self.flask_app = Flask(__name__)
+
+
+@pytest.fixture
+def queue(monkeypatch):
+    queue = {"entries": [], "finished": {}}
+    monkeypatch.setattr(job_queue, "claim_next", lambda worker_id: queue["entries"].pop(0) if queue["entries"] else None)
+    monkeypatch.setattr(
+        job_queue, "finish", lambda entry_id, worker_id, error=None: queue["finished"].__setitem__(entry_id, error)
+    )
+    monkeypatch.setattr(
+        job_queue, "fail", lambda entry_id, worker_id, attempts, error: queue["finished"].__setitem__(entry_id, error)
+    )
+    return queue
+
+
+def test_worker_runs_queued_chains_with_their_arguments(queue, monkeypatch):
+    """
+    Test that a worker resolves queued jobs to their functions, runs them in order and records the outcome.
+    """
+    calls = []
+
+    def _job(name, fail=False):
+        def run(scheduler, **kwargs):
+            calls.append((name, kwargs))
+            if fail:
+                raise RuntimeError(f"{name} failed")
+
+        return run
+
+    monkeypatch.setitem(scheduled_jobs_dict, "first", {"id": "first", "func": _job("first")})
+    monkeypatch.setitem(scheduled_jobs_dict, "failing", {"id": "failing", "func": _job("failing", fail=True)})
+
+    queue["entries"] = [
+        {"id": 1, "attempts": 1, "jobs": [{"id": "first", "args": {"deep_scan": True, "users_list": ["a@gmail.com"]}}]},
+        {"id": 2, "attempts": 1, "jobs": [{"id": "failing", "args": {}}, {"id": "first", "args": None}]},
+        {"id": 3, "attempts": 1, "jobs": [{"id": "removed_job", "args": {}}]},
+    ]
+    job_worker = worker.JobWorker(_FakeScheduler(), worker_id="test-worker")
+
+    assert [job_worker.run_once() for _ in range(4)] == [True, True, True, False]
+    assert calls == [("first", {"deep_scan": True, "users_list": ["a@gmail.com"]}), ("failing", {})]
+    assert queue["finished"][1] is None
+    assert str(queue["finished"][2]) == "failing failed"
+    assert "removed_job" in str(queue["finished"][3])
+
+
+def test_triggered_chains_are_queued_as_json(monkeypatch):
+    queued = []
+    monkeypatch.setattr(job_queue, "enqueue", lambda jobs, singleton_key=None, run_at=None: queued.append(jobs))
+    scheduler = scheduler_app.SchedulerInstance._decorated(Flask(__name__))
+
+    scheduler.trigger_jobs(
+        [scheduled_jobs_dict["transactions_categorizer"], scheduled_jobs_dict["monthly_spending_calculator"]],
+        {"monthly_spending_calculator": {"args": {"users_list": ["a@gmail.com"], "deep_scan": True}}},
+    )
+
+    assert queued == [
+        [
+            {"id": "transactions_categorizer", "args": {}},
+            {"id": "monthly_spending_calculator", "args": {"users_list": ["a@gmail.com"], "deep_scan": True}},
+        ]
+    ]
+    assert scheduled_jobs_dict["monthly_spending_calculator"]["args"]["deep_scan"] is False
+
+
+def test_failed_entries_are_retried_with_backoff(app_and_client):
+    """
+    Test that a failed entry is queued again after a growing delay, until it runs out of attempts.
+    """
+    app, _ = app_and_client
+    entry = JobQueueEntry(
+        jobs=[{"id": "transactions_scanner", "args": {}}],
+        status=JobQueueEntry.RUNNING,
+        runAt=datetime.now(),
+        attempts=1,
+        lockedBy="test-worker",
+        createdAt=datetime.now(),
+    )
+    db.session.add(entry)
+    db.session.commit()
+
+    job_queue.fail(entry.id, "test-worker", 1, RuntimeError("provider unavailable"))
+    db.session.refresh(entry)
+    assert entry.status == JobQueueEntry.QUEUED and entry.lockedBy is None
+    assert entry.runAt > datetime.now() and entry.lastError == "provider unavailable"
+
+    entry.status, entry.lockedBy = JobQueueEntry.RUNNING, "test-worker"
+    db.session.commit()
+    job_queue.fail(entry.id, "test-worker", JOB_MAX_ATTEMPTS, RuntimeError("provider unavailable"))
+    db.session.refresh(entry)
+    assert entry.status == JobQueueEntry.FAILED and entry.finishedAt is not None
+
+
+def test_entries_are_only_finished_by_the_worker_holding_them(app_and_client):
+    """
+    Test that a worker whose lease expired can't finish or requeue an entry claimed by another worker since.
+    """
+    app, _ = app_and_client
+    entry = JobQueueEntry(
+        jobs=[{"id": "transactions_scanner", "args": {}}],
+        status=JobQueueEntry.RUNNING,
+        runAt=datetime.now(),
+        attempts=2,
+        lockedBy="second-worker",
+        createdAt=datetime.now(),
+    )
+    db.session.add(entry)
+    db.session.commit()
+
+    job_queue.finish(entry.id, "first-worker")
+    job_queue.fail(entry.id, "first-worker", 1, RuntimeError("provider unavailable"))
+    db.session.refresh(entry)
+    assert entry.status == JobQueueEntry.RUNNING and entry.lockedBy == "second-worker" and entry.lastError is None
+
+    job_queue.finish(entry.id, "second-worker")
+    db.session.refresh(entry)
+    assert entry.status == JobQueueEntry.DONE
+
+
+def test_retry_delays_grow_up_to_a_cap():
+    delays = [job_queue.get_retry_delay(attempts) for attempts in range(1, 20)]
+
+    assert delays[1] > timedelta(0) and max(delays[:3]) < delays[-1]
+    assert max(delays) <= timedelta(seconds=JOB_RETRY_MAX_DELAY_IN_SECONDS)
+
+
+def test_users_are_split_into_stable_shards():
+    emails = [f"user{index}@gmail.com" for index in range(200)]
+    shards = sharding.group_users_by_shard(emails, JOB_SHARDS_COUNT)
+
+    assert sorted(email for shard_emails in shards.values() for email in shard_emails) == sorted(emails)
+    assert len(shards) > 1
+    for shard_index, shard_emails in shards.items():
+        assert all(sharding.is_in_shard(email, [shard_index, JOB_SHARDS_COUNT]) for email in shard_emails)
+
+
+def test_shard_users_are_selected_in_a_single_query(app_and_client):
+    """
+    Test that the users to scan are filtered by shard and failed logins in SQL, with their credentials preloaded.
+    """
+    app, _ = app_and_client
+    emails = [f"user{index}@gmail.com" for index in range(20)]
+    db.session.add_all([User(email=email, shouldGetScrapped=True, initialSetupDone=True) for email in emails])
+    db.session.add(UserWarnings(userEmail=emails[0], failedLoginCount=STOP_AT_FAILED_LOGIN_THRESHOLD))
+    db.session.commit()
+
+    scanned_emails, skipped_emails = [], []
+    for shard_index in range(JOB_SHARDS_COUNT):
+        shard = [shard_index, JOB_SHARDS_COUNT]
+        (users, skipped_users), queries_count = _count_queries(app, lambda: fetch_users_for_scraping(shard))
+        assert queries_count == 1
+        assert all(sharding.is_in_shard(user.email, shard) for user in users)
+        assert sorted(sharding.get_shard_users(shard)) == sorted(
+            email for email in emails + [USER_EMAIL] if sharding.is_in_shard(email, shard)
+        )
+        scanned_emails.extend(user.email for user in users)
+        skipped_emails.extend(skipped_users)
+
+    assert sorted(scanned_emails) == sorted(emails[1:])
+    assert skipped_emails == [emails[0]]
+
+
+def test_sharded_jobs_are_queued_per_shard_across_their_interval():
+    now = datetime(2023, 12, 13)
+    entries = scheduler_app.build_scheduled_job_entries(scheduled_jobs_dict["transactions_scanner"], now)
+
+    assert len(entries) == JOB_SHARDS_COUNT
+    assert len({singleton_key for _, singleton_key, _ in entries}) == JOB_SHARDS_COUNT
+    assert [jobs[0]["args"]["shard"] for jobs, _, _ in entries] == [[index, JOB_SHARDS_COUNT] for index in range(JOB_SHARDS_COUNT)]
+    run_dates = [run_at for _, _, run_at in entries]
+    assert run_dates[0] == now and run_dates == sorted(set(run_dates)) and run_dates[-1] < now + timedelta(minutes=5)
+
+    assert scheduler_app.build_scheduled_job_entries(scheduled_jobs_dict["monthly_spending_calculator"], now) == [
+        ([{"id": "monthly_spending_calculator", "args": {"users_list": None, "deep_scan": False}}], "monthly_spending_calculator", now)
+    ]
+
+
+class _FakeResult:
+    def __init__(self, value):
+        self.value = value
+
+    def scalar(self):
+        return self.value
+
+
+class _FakeConnection:
+    def __init__(self, locks):
+        self.locks = locks
+        self.closed = False
+
+    def execute(self, statement, parameters=None):
+        sql = str(statement)
+        if "pg_try_advisory_lock" in sql:
+            is_acquired = parameters["lock_id"] not in self.locks
+            self.locks.add(parameters["lock_id"])
+            return _FakeResult(is_acquired)
+        if "pg_advisory_unlock" in sql:
+            self.locks.discard(parameters["lock_id"])
+        return _FakeResult(1)
+
+    def commit(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+class _FakeEngine:
+    def __init__(self):
+        self.locks = set()
+
+    def connect(self):
+        return _FakeConnection(self.locks)
+
+
+def test_a_single_process_is_elected():
+    engine = _FakeEngine()
+    first, second = LeaderElection(engine, 1), LeaderElection(engine, 1)
+
+    assert first.try_acquire() and first.try_acquire()
+    assert not second.try_acquire() and not second.is_leader
+
+    first.release()
+    assert not first.is_leader
+    assert second.try_acquire()
@@ -0,0 +1,50 @@
+import json
+from datetime import date, datetime
+from decimal import Decimal
+import pytest
+from flask import Flask
+from lib.json_provider.json_provider import ISODefaultJSONProvider, OrjsonProvider, create_json_provider
+
+pytest.importorskip("orjson")
+
+DOCUMENT = {
+    "message": "Successfully fetched transactions",
+    "data": {
+        "transactions": [
+            {"id": "1", "merchantName": "מקס", "purchaseDate": datetime(2023, 12, 1, 10, 30, 15, 123456)},
+            {"id": "2", "transactionAmount": 12.5, "paymentDate": date(2023, 12, 10), "isPending": None},
+        ],
+        "categoriesSpending": {1: 100, -1: 50},
+        "amount": Decimal("10.10"),
+    },
+}
+
+
+def test_providers_produce_the_same_json():
+    """
+    Test that the orjson provider can replace the standard library provider without changing responses.
+    """
+    app = Flask(__name__)
+    default_output = json.loads(ISODefaultJSONProvider(app).dumps(DOCUMENT))
+    orjson_output = json.loads(OrjsonProvider(app).dumps(DOCUMENT))
+
+    assert orjson_output == default_output
+    assert orjson_output["data"]["transactions"][0]["purchaseDate"] == "2023-12-01T10:30:15.123456"
+    assert orjson_output["data"]["transactions"][1]["paymentDate"] == "2023-12-10"
+    assert orjson_output["data"]["categoriesSpending"] == {"1": 100, "-1": 50}
+
+
+def test_orjson_response():
+    app = Flask(__name__)
+    app.json = create_json_provider(app, "orjson")
+
+    with app.app_context():
+        response = app.json.response(DOCUMENT)
+
+    assert response.mimetype == "application/json"
+    assert json.loads(response.get_data())["data"]["transactions"][0]["merchantName"] == "מקס"
+
+
+def test_unknown_provider_raises():
+    with pytest.raises(ValueError):
+        create_json_provider(Flask(__name__), "ujson")
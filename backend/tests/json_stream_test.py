@@ -0,0 +1,63 @@
+import asyncio
+import json
+import pytest
+from lib.json_stream.json_stream import JSONArrayParser, JSONStreamError, aiter_json_array, iter_json_array
+
+PATH = ("result", "transactions")
+
+
+def _chunks(document, chunk_size):
+    data = json.dumps(document, ensure_ascii=False).encode("utf-8")
+    return [data[i : i + chunk_size] for i in range(0, len(data), chunk_size)]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 7, 1024])
+def test_streams_nested_array_items(chunk_size):
+    """
+    Test that array items are decoded correctly regardless of where the chunks split the document.
+    """
+    transactions = [{"arn": "1", "merchantName": "מקס", "amount": 123456}, {"arn": None, "amount": 1.5}]
+    document = {"graphs": {"data": [1, 2, "]"]}, "result": {"cards": [], "transactions": transactions, "total": 2}}
+
+    assert list(iter_json_array(_chunks(document, chunk_size), PATH)) == transactions
+
+
+def test_missing_or_null_path_yields_nothing():
+    assert list(iter_json_array(_chunks({"result": None}, 4), PATH)) == []
+    assert list(iter_json_array(_chunks({"result": {"cards": []}}, 4), PATH)) == []
+
+
+def test_non_json_response_raises():
+    with pytest.raises(JSONStreamError):
+        list(iter_json_array([b"<html>Login</html>"], PATH))
+
+
+def test_parser_returns_items_as_their_chunks_arrive():
+    """
+    Test that an item is returned by the chunk completing it, without waiting for the rest of the document.
+    """
+    parser = JSONArrayParser(PATH)
+
+    assert parser.feed(b'{"result": {"transactions": [{"arn": "1"}, {"ar') == [{"arn": "1"}]
+    assert parser.feed(b'n": "2"}') == []
+    assert parser.feed(b', 3]') == [{"arn": "2"}, 3]
+    assert parser.done and parser.feed(b', "total": 3}}') == [] and parser.close() == []
+
+
+def test_truncated_document_raises_on_close():
+    parser = JSONArrayParser(PATH)
+    parser.feed(b'{"result": {"transactions": [{"arn": "1"}, {"ar')
+
+    with pytest.raises(JSONStreamError):
+        parser.close()
+
+
+def test_async_chunks_are_streamed():
+    async def chunks():
+        for chunk in _chunks({"result": {"transactions": [1, {"arn": "2"}]}}, 5):
+            yield chunk
+
+    async def collect():
+        return [item async for item in aiter_json_array(chunks(), PATH)]
+
+    assert asyncio.run(collect()) == [1, {"arn": "2"}]
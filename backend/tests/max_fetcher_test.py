@@ -0,0 +1,82 @@
+import pytest
+from app.credit_card_adapters import max_fetcher
+from app.credit_card_adapters import max_adapter
+from app.credit_card_adapters.max_adapter import MaxAdapter
+from app.job_scheduler.jobs.transactions_scanner import _fetch_users_transactions_concurrently
+from benchmarks.fake_max_server import LOGIN_PATH, TRANSACTIONS_PATH, FakeMaxServer
+from config import max_urls
+from lib.encryption.aes_encryptor import encrypt
+
+
+@pytest.fixture
+def fake_max_server(monkeypatch):
+    monkeypatch.setenv("ENCRYPTION_KEY", "test-key-16bytes")
+
+    with FakeMaxServer(latency=0, transactions_count=3) as server:
+        monkeypatch.setattr(max_fetcher, "LOGIN_URL", server.base_url + LOGIN_PATH)
+        monkeypatch.setattr(max_urls, "TRANSACTIONS_API", server.base_url + TRANSACTIONS_PATH)
+        max_fetcher.session_cookies_cache.clear()
+        yield server
+        max_fetcher.session_cookies_cache.clear()
+
+
+def _fetch(user_email="user@gmail.com"):
+    fetch_args = {
+        "user_credentials": {"username": "user", "password": encrypt("password"), "id": "123456789"},
+        "user_email": user_email,
+        "dates": None,
+    }
+    return _fetch_users_transactions_concurrently([fetch_args], MaxAdapter())[user_email]
+
+
+def test_session_cookies_are_reused(fake_max_server):
+    """
+    Test that consecutive fetches for the same user log in only once.
+    """
+    assert len(_fetch()) == 3
+    assert len(_fetch()) == 3
+
+    assert fake_max_server.requests_count[LOGIN_PATH] == 1
+    assert fake_max_server.requests_count[TRANSACTIONS_PATH] == 2
+
+
+def test_sessions_are_not_shared_between_users(fake_max_server):
+    """
+    Test that every user logs in with their own session.
+    """
+    _fetch("first@gmail.com")
+    _fetch("second@gmail.com")
+
+    assert fake_max_server.requests_count[LOGIN_PATH] == 2
+
+
+def test_rejected_session_triggers_a_single_login(fake_max_server):
+    """
+    Test that an expired session is replaced by logging in exactly once.
+    """
+    _fetch()
+    fake_max_server.expire_sessions()
+
+    assert len(_fetch()) == 3
+    assert fake_max_server.requests_count[LOGIN_PATH] == 2
+    assert fake_max_server.requests_count[TRANSACTIONS_PATH] == 3
+
+
+def test_adapter_streams_the_transactions_response(fake_max_server, monkeypatch):
+    """
+    Test that the response is parsed as it's read, normalizing the raw items one at a time.
+    """
+    monkeypatch.setattr(max_adapter, "MAX_RESPONSE_CHUNK_SIZE", 16)
+    parsed_items = []
+    parse_max_transaction = max_fetcher.parse_max_transaction
+
+    def _recording_parse(transaction, user_email):
+        parsed_items.append(transaction["arn"])
+        return parse_max_transaction(transaction, user_email)
+
+    monkeypatch.setattr(max_fetcher, "parse_max_transaction", _recording_parse)
+
+    transactions = _fetch()
+
+    assert [t.arn for t in transactions] == parsed_items == ["arn_0", "arn_1", "arn_2"]
+    assert transactions[0].id == "user@gmail.com_arn_0"
@@ -0,0 +1,121 @@
+import time
+from datetime import datetime
+import app.merchant_aggregator.merchant_aggregator as merchant_aggregator
+import app.merchant_aggregator.merchants_cache as merchants_cache
+from app.database.models import Transaction, db
+from app.job_scheduler import spending_changes
+from tests.transactions_controller_test import USER_EMAIL, _add_transactions, app_and_client
+
+USER_CATEGORIES = {"General": {"id": 1, "is_custom": False}, "Dining": {"id": 2, "is_custom": True}}
+
+
+def _stub_chatgpt(prompt):
+    if "Slow Merchant" in prompt:
+        time.sleep(0.5)
+    transactions_count = prompt.split("Transactions:\n")[1].split("\nExpected Output")[0].count("\n") + 1
+    return "\n".join(f"Category for #{index}: Dining" for index in range(transactions_count)) + "\nEND OF OUTPUT"
+
+
+def _transaction(index, merchant_name, user_email="user@gmail.com"):
+    return {"id": f"t{index}", "userEmail": user_email, "categoryId": -1, "merchantData": {"name": merchant_name}}
+
+
+def test_process_chunk_categorizes_on_the_shared_pool(monkeypatch):
+    """
+    Test that chunks are categorized and a chunk exceeding the timeout is dropped without blocking the others.
+    """
+    monkeypatch.setattr(merchant_aggregator, "query_chatgpt", _stub_chatgpt)
+    chunks = [[_transaction(0, "Pizza Place")], [_transaction(1, "Slow Merchant")], [_transaction(2, "Burger Bar")]]
+    processing_data = {"timeout": 0.2, "user_email": "user@gmail.com"}
+
+    results = merchant_aggregator._process_chunk(chunks, USER_CATEGORIES, processing_data)
+
+    assert results[1] is None
+    for chunk_result in (results[0], results[2]):
+        categorized_chunk, parsed_categories = chunk_result
+        assert categorized_chunk[0]["categoryId"] == 2
+        assert parsed_categories[0].userEmail == "user@gmail.com"
+
+
+class _FakeSession:
+    def __init__(self):
+        self.updated_transactions = []
+        self.added = []
+
+    def bulk_update_mappings(self, model, mappings):
+        self.updated_transactions.extend(mappings)
+
+    def add_all(self, objects):
+        self.added.extend(objects)
+
+    def commit(self):
+        pass
+
+
+def test_categorize_for_all_users_deduplicates_merchants_across_users(monkeypatch):
+    """
+    Test that a merchant shared by several users is sent to ChatGPT once and its category is applied to all transactions.
+    """
+    prompts = []
+
+    def _recording_chatgpt(prompt):
+        prompts.append(prompt)
+        return _stub_chatgpt(prompt)
+
+    global_categories = {"General": {"id": 1, "is_custom": False}, "Dining": {"id": 2, "is_custom": False}}
+    session = _FakeSession()
+    monkeypatch.setattr(merchant_aggregator, "query_chatgpt", _recording_chatgpt)
+    monkeypatch.setattr(merchant_aggregator, "db", type("FakeDB", (), {"session": session}))
+    monkeypatch.setattr(merchant_aggregator, "_serialize_transactions", lambda transactions: transactions)
+    monkeypatch.setattr(merchant_aggregator, "_get_user_categories_dict", lambda email: global_categories)
+    monkeypatch.setattr(merchants_cache, "get_cached_categories", lambda email: {"Cached Cafe": 1})
+    bumped_users = set()
+    monkeypatch.setattr(merchant_aggregator, "bump_data_version", bumped_users.update)
+    bumped_mappings = set()
+    monkeypatch.setattr(merchant_aggregator, "bump_merchant_mappings_version", bumped_mappings.update)
+    locked_users = set()
+    monkeypatch.setattr(spending_changes, "lock_users", locked_users.update)
+
+    user_transactions_dict = {
+        "first@gmail.com": [
+            _transaction(0, "Pizza Place *123", "first@gmail.com"),
+            _transaction(1, "Pizza Place #77", "first@gmail.com"),
+            _transaction(2, "Cached Cafe", "first@gmail.com"),
+        ],
+        "second@gmail.com": [_transaction(3, "Pizza Place", "second@gmail.com"), _transaction(4, "Burger Bar", "second@gmail.com")],
+    }
+
+    parsed_transactions, parsed_categories = merchant_aggregator.categorize_for_all_users(user_transactions_dict)
+
+    transactions_string = prompts[0].split("Transactions:\n")[1].split("\nExpected Output")[0]
+    assert len(prompts) == 1
+    assert transactions_string.count("Pizza Place") == 1
+    assert {t["id"]: t["categoryId"] for t in parsed_transactions} == {"t0": 2, "t1": 2, "t2": 1, "t3": 2, "t4": 2}
+    assert sorted(c.chargingBusiness for c in parsed_categories) == ["Burger Bar", "Pizza Place"]
+    assert all(c.userEmail is None for c in parsed_categories)
+    assert bumped_users == {"first@gmail.com", "second@gmail.com"}
+    assert bumped_mappings == {None}
+    # The spending changes locks are taken before the User rows, like the aggregator does
+    assert locked_users == bumped_users
+
+
+def test_category_changes_are_recorded_with_their_batch(app_and_client):
+    """
+    Test that a committed batch records the spending deltas of its category changes in the same transaction.
+    """
+    _add_transactions(3)
+    db.session.add(
+        Transaction(id="recurring", userEmail=USER_EMAIL, categoryId=1, transactionAmount=100.0, purchaseDate=datetime(2023, 11, 3), isRecurring=True, isDeleted=False)
+    )
+    db.session.commit()
+    transactions_by_id = {t.id: t.serialize(include_category_name=False) for t in Transaction.query}
+    categorized_transactions = [{"id": transaction_id, "categoryId": 5} for transaction_id in ("t1", "t2", "recurring")]
+    categorized_transactions.append({"id": "t0", "categoryId": 1})
+
+    merchant_aggregator._commit_categorized_transactions(categorized_transactions, [], transactions_by_id)
+
+    assert db.session.get(Transaction, "t2").categoryId == 5
+    assert spending_changes.drain_changes() == (
+        set(),
+        {(USER_EMAIL, 202311, 2): -1.0, (USER_EMAIL, 202311, 3): -2.0, (USER_EMAIL, 202311, 5): 3.0},
+    )
@@ -0,0 +1,98 @@
+import pytest
+import app.merchant_aggregator.merchants_cache as merchants_cache
+from lib.cache.lru_cache import LRUCache
+
+MAPPINGS = {
+    None: {"Pizza Place": 1, "Burger Bar": 1},
+    "first@gmail.com": {"Pizza Place": 7},
+    "second@gmail.com": {},
+}
+
+
+@pytest.fixture
+def versions():
+    """The versions read with every lookup, tests bump them like other processes' writers would."""
+
+    return {None: (2, 2), "first@gmail.com": 0, "second@gmail.com": 0}
+
+
+@pytest.fixture
+def queried_users(monkeypatch, versions):
+    queried_users = []
+
+    def _query_mappings(user_email):
+        queried_users.append(user_email)
+        return dict(MAPPINGS[user_email])
+
+    monkeypatch.setattr(merchants_cache, "_query_mappings", _query_mappings)
+    monkeypatch.setattr(merchants_cache, "_query_versions", lambda user_email: (versions[user_email], versions[None]))
+    monkeypatch.setattr(
+        merchants_cache, "_user_mappings_cache", LRUCache(max_size=10, ttl=merchants_cache.MERCHANTS_CACHE_TTL_IN_SECONDS)
+    )
+    merchants_cache.invalidate()
+    yield queried_users
+    merchants_cache.invalidate()
+
+
+def test_global_mappings_are_loaded_once_and_overlaid_per_user(queried_users):
+    """
+    Test that the global mappings are read once across users and runs, and user mappings override them.
+    """
+    for _ in range(3):
+        assert merchants_cache.get_cached_categories("first@gmail.com") == {"Pizza Place": 7, "Burger Bar": 1}
+        assert merchants_cache.get_cached_categories("second@gmail.com") == {"Pizza Place": 1, "Burger Bar": 1}
+
+    assert queried_users == [None, "first@gmail.com", "second@gmail.com"]
+    stats = merchants_cache.stats()
+    assert stats["global_mappings_loads"] == 1
+    assert stats["user_mappings_misses"] == 2
+
+
+def test_mappings_are_reloaded_when_their_version_changes(queried_users, versions):
+    """
+    Test that mappings changed by another process are reloaded once the versions read with the lookup change.
+    """
+    merchants_cache.get_cached_categories("first@gmail.com")
+    merchants_cache.get_cached_categories("second@gmail.com")
+
+    MAPPINGS["first@gmail.com"]["Gym"] = 9
+    versions["first@gmail.com"] += 1
+    assert merchants_cache.get_cached_categories("first@gmail.com")["Gym"] == 9
+    assert merchants_cache.get_cached_categories("second@gmail.com") == {"Pizza Place": 1, "Burger Bar": 1}
+    assert queried_users == [None, "first@gmail.com", "second@gmail.com", "first@gmail.com"]
+    assert merchants_cache.stats()["user_mappings_reloads"] >= 1
+
+    MAPPINGS[None]["Taco Stand"] = 2
+    versions[None] = (3, 3)
+    assert merchants_cache.get_cached_categories("second@gmail.com")["Taco Stand"] == 2
+    assert queried_users[-1] is None
+
+    del MAPPINGS["first@gmail.com"]["Gym"], MAPPINGS[None]["Taco Stand"]
+
+
+def test_mappings_are_invalidated(queried_users):
+    merchants_cache.get_cached_categories("first@gmail.com")
+
+    merchants_cache.invalidate("first@gmail.com")
+    merchants_cache.get_cached_categories("first@gmail.com")
+    assert queried_users == [None, "first@gmail.com", "first@gmail.com"]
+
+    merchants_cache.invalidate()
+    merchants_cache.get_cached_categories("first@gmail.com")
+    assert queried_users[-2:] == [None, "first@gmail.com"]
+
+
+def test_mappings_expire(queried_users, monkeypatch):
+    """
+    Test that mappings are reloaded once the TTL expires, even when their versions didn't change.
+    """
+    now = [1000.0]
+    monkeypatch.setattr(merchants_cache.time, "monotonic", lambda: now[0])
+
+    merchants_cache.get_cached_categories("first@gmail.com")
+    merchants_cache.get_cached_categories("first@gmail.com")
+    assert queried_users == [None, "first@gmail.com"]
+
+    now[0] += merchants_cache.MERCHANTS_CACHE_TTL_IN_SECONDS + 1
+    merchants_cache.get_cached_categories("first@gmail.com")
+    assert queried_users == [None, "first@gmail.com", None, "first@gmail.com"]
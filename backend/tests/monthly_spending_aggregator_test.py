@@ -0,0 +1,104 @@
+from datetime import datetime
+from sqlalchemy.dialects import postgresql
+from app.credit_card_adapters.scanned_transaction import ScannedTransaction
+from app.database.models import db
+from app.job_scheduler import spending_changes
+from app.job_scheduler.jobs.monthly_spending_aggregator import (
+    build_spending_aggregation_statement,
+    build_spending_delta_statement,
+    split_spending_changes,
+)
+from tests.transactions_controller_test import app_and_client
+
+
+def _compile(statement):
+    return str(statement.compile(dialect=postgresql.dialect(), compile_kwargs={"render_postcompile": True}))
+
+
+def test_aggregation_is_a_single_set_based_statement():
+    """
+    Test that a batch of users is aggregated by one statement grouping transactions by user, month and category.
+    """
+    sql = _compile(build_spending_aggregation_statement(["first@gmail.com", "second@gmail.com"]))
+
+    assert sql.count("WITH aggregated AS") == 1
+    assert "stale AS" in sql
+    assert 'ON CONFLICT ON CONSTRAINT "uq_userCategorySpending_userEmail_userCategoryId_date" DO UPDATE' in sql
+    assert 'GROUP BY transaction."userEmail", transaction."categoryId"' in sql
+    assert '\n INSERT INTO "userCategorySpending"' in sql
+    assert '"userCategorySpending".date >=' not in sql
+
+
+def test_shallow_aggregation_only_recomputes_recent_months():
+    """
+    Test that passing since_date limits both the summed transactions and the replaced spending rows.
+    """
+    statement = build_spending_aggregation_statement(["first@gmail.com"], datetime(2023, 12, 1))
+    sql = _compile(statement)
+    params = statement.compile(dialect=postgresql.dialect()).params
+
+    assert 'transaction."purchaseDate" >=' in sql
+    assert '"userCategorySpending".date >=' in sql
+    assert datetime(2023, 12, 1) in params.values() and 202312 in params.values()
+
+
+def test_incremental_aggregation_only_recomputes_touched_cells(app_and_client):
+    """
+    Test that changes are recorded durably, drained per user and limit both the summed transactions and the
+    replaced rows.
+    """
+    spending_changes.mark_transaction_touched(
+        ScannedTransaction("t1", None, "first@gmail.com", 10.0, datetime(2023, 11, 5), None, "1234", {}, "ILS", 10.0, "a1")
+    )
+    spending_changes.mark_touched([spending_changes.get_spending_key("second@gmail.com", "2023-12-02T10:00:00", 4)])
+    spending_changes.record_deltas({("first@gmail.com", 202311, 5): 7.5, ("first@gmail.com", 202310, 5): 0})
+    spending_changes.record_deltas({("first@gmail.com", 202311, 5): -2.5})
+    db.session.commit()
+
+    # A rolled back drain keeps the changes for the next run
+    assert spending_changes.drain_changes(["first@gmail.com"])[0] == {("first@gmail.com", 202311, -1)}
+    db.session.rollback()
+    assert spending_changes.get_touched_users() == ["first@gmail.com", "second@gmail.com"]
+
+    first_user_keys, first_user_deltas = spending_changes.drain_changes(["first@gmail.com"])
+    assert first_user_keys == {("first@gmail.com", 202311, -1)}
+    assert first_user_deltas == {("first@gmail.com", 202311, 5): 5.0}
+    assert spending_changes.drain_changes() == ({("second@gmail.com", 202312, 4)}, {})
+    db.session.commit()
+    assert spending_changes.drain_changes() == (set(), {})
+
+    statement = build_spending_aggregation_statement(["first@gmail.com"], spending_keys=list(first_user_keys))
+    sql = _compile(statement)
+
+    assert 'transaction."categoryId") IN ((' in sql
+    assert '("userCategorySpending"."userEmail", "userCategorySpending".date, "userCategorySpending"."userCategoryId") IN' in sql
+    assert 'transaction."isDeleted" = false' in sql
+
+
+def test_only_whole_deltas_are_added_to_the_stored_spending():
+    """
+    Test that cells with a fractional delta are recomputed, like the rounded sums of touched cells.
+    """
+    touched_keys = {("first@gmail.com", 202312, 1)}
+    deltas = {
+        ("first@gmail.com", 202312, 1): 4.0,
+        ("first@gmail.com", 202312, 2): 12.6,
+        ("first@gmail.com", 202312, 3): 0.1 + 0.2 - 0.3,
+        ("first@gmail.com", 202312, 4): -13.0,
+        ("first@gmail.com", 202312, 5): 0.0,
+    }
+
+    recomputed_keys, added_deltas = split_spending_changes(touched_keys, deltas)
+
+    assert recomputed_keys == {("first@gmail.com", 202312, 1), ("first@gmail.com", 202312, 2), ("first@gmail.com", 202312, 3)}
+    assert added_deltas == {("first@gmail.com", 202312, 4): -13.0}
+
+
+def test_deltas_are_added_to_the_stored_spending():
+    statement = build_spending_delta_statement({("first@gmail.com", 202312, 5): 13.0, ("first@gmail.com", 202312, -1): -13.0})
+    sql = _compile(statement)
+    params = statement.compile(dialect=postgresql.dialect()).params
+
+    assert 'ON CONFLICT ON CONSTRAINT "uq_userCategorySpending_userEmail_userCategoryId_date" DO UPDATE' in sql
+    assert '"spendingAmount" = ("userCategorySpending"."spendingAmount" + excluded."spendingAmount")' in sql
+    assert sorted(value for name, value in params.items() if name.startswith("spendingAmount")) == [-13, 13]
@@ -0,0 +1,102 @@
+import pytest
+from flask_jwt_extended import create_access_token
+from app.api import spending_history_cache
+from app.database.data_version import bump_data_version
+from app.database.models import UserCategorySpending, db
+from lib.cache.redis_cache import RedisCache
+from tests.transactions_controller_test import USER_EMAIL, _count_queries, app_and_client
+
+ROUTE = "/api/transactions/get-monthly-spending-history"
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    spending_history_cache.clear()
+    yield
+    spending_history_cache.clear()
+
+
+def test_history_is_loaded_once_per_data_version(app_and_client):
+    loads = []
+
+    def load(user_email):
+        loads.append(user_email)
+        return {202312: len(loads)}
+
+    first = spending_history_cache.get_or_load(USER_EMAIL, load)
+    assert spending_history_cache.get_or_load(USER_EMAIL, load) == first
+    assert loads == [USER_EMAIL]
+
+    # Writers in any process bump the version with their change
+    bump_data_version([USER_EMAIL])
+    db.session.commit()
+    etag, data = spending_history_cache.get_or_load(USER_EMAIL, load)
+    assert data == {202312: 2} and etag != first[0]
+
+
+def test_history_loaded_during_a_version_bump_is_not_served_after_it(app_and_client):
+    """
+    Test that a result read before the aggregator's commit is cached under the version it was read for.
+    """
+
+    def load(user_email):
+        bump_data_version([user_email])
+        db.session.commit()
+        return {202312: 1}
+
+    spending_history_cache.get_or_load(USER_EMAIL, load)
+    assert spending_history_cache.get_or_load(USER_EMAIL, lambda user_email: {202312: 2})[1] == {202312: 2}
+
+
+def test_spending_history_route_revalidates_with_a_version_lookup(app_and_client):
+    app, test_client = app_and_client
+    headers = {"Authorization": f"Bearer {create_access_token(identity=USER_EMAIL)}"}
+    db.session.add(UserCategorySpending(userEmail=USER_EMAIL, userCategoryId=1, date=202312, spendingAmount=100))
+    db.session.commit()
+
+    response = test_client.get(ROUTE, headers=headers)
+    assert response.status_code == 200
+    assert response.get_json()["data"] == {"202312": 100}
+    etag = response.headers["ETag"]
+
+    response, queries_count = _count_queries(app, lambda: test_client.get(ROUTE, headers={**headers, "If-None-Match": etag}))
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+    assert queries_count == 1
+
+    # The aggregator bumps the user's data version along with the new spending
+    db.session.add(UserCategorySpending(userEmail=USER_EMAIL, userCategoryId=2, date=202312, spendingAmount=50))
+    bump_data_version([USER_EMAIL])
+    db.session.commit()
+
+    response = test_client.get(ROUTE, headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.get_json()["data"] == {"202312": 150}
+
+
+class _FakeRedis:
+    def __init__(self):
+        self.values = {}
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def set(self, key, value, ex=None):
+        self.values[key] = value
+
+    def delete(self, key):
+        self.values.pop(key, None)
+
+    def scan_iter(self, match):
+        return [key for key in list(self.values) if key.startswith(match.rstrip("*"))]
+
+
+def test_redis_cache_round_trips_json_values():
+    cache = RedisCache(prefix="spending-history:", ttl=60, client=_FakeRedis())
+
+    cache.set("user@gmail.com", {"etag": "abc", "data": {202312: 100}})
+    assert cache.get("user@gmail.com") == {"etag": "abc", "data": {"202312": 100}}
+
+    cache.clear()
+    assert cache.get("user@gmail.com") is None
+    assert cache.stats() == {"hits": 1, "misses": 1}
@@ -0,0 +1,37 @@
+from datetime import datetime
+from app.database.models import Transaction, db
+from app.job_scheduler.jobs import transactions_categorizer
+from tests.transactions_controller_test import USER_EMAIL, app_and_client
+
+
+class _FakeScheduler:
+    def __init__(self, app):
+        self.flask_app = app
+
+
+def test_only_scanned_transactions_are_categorized(app_and_client, monkeypatch):
+    """
+    Test that only the given uncategorized transactions are categorized.
+    """
+    app, _ = app_and_client
+    db.session.add_all(
+        [
+            Transaction(id=transaction_id, userEmail=USER_EMAIL, categoryId=-1, purchaseDate=datetime(2023, 12, 1), merchantData={"name": transaction_id})
+            for transaction_id in ("scanned", "unchanged", "older")
+        ]
+    )
+    db.session.commit()
+    calls = []
+
+    def _categorize(user_transactions_dict):
+        calls.append({email: sorted(t.id for t in transactions) for email, transactions in user_transactions_dict.items()})
+        return [], []
+
+    monkeypatch.setattr(transactions_categorizer, "categorize_for_all_users", _categorize)
+
+    transactions_categorizer.categorize_all_transactions(
+        _FakeScheduler(app), users_list=[USER_EMAIL], transactions_ids=["scanned", "unchanged"]
+    )
+    transactions_categorizer.categorize_all_transactions(_FakeScheduler(app), transactions_ids=[])
+
+    assert calls == [{USER_EMAIL: ["scanned", "unchanged"]}]
@@ -0,0 +1,252 @@
+from datetime import datetime, timedelta
+import pytest
+from flask import Flask
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.compiler import compiles
+from app.api.api import register_api_routes
+import app.api.controllers.transactions_controller as transactions_controller
+from app.database.models import RecurringTransactions, Transaction, User, UserCategory, db
+from lib.json_provider.json_provider import create_json_provider
+from lib.jwt.jwt import jwt
+
+USER_EMAIL = "user@gmail.com"
+
+
+@compiles(JSONB, "sqlite")
+def _compile_jsonb_for_sqlite(type_, compiler, **kw):
+    return "JSON"
+
+
+@pytest.fixture
+def app_and_client():
+    """An app backed by an in-memory SQLite database, PostgreSQL specific indexes are skipped by SQLite."""
+
+    app = Flask(__name__)
+    app = register_api_routes(app)
+    app.json = create_json_provider(app)
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+    app.config["JWT_SECRET_KEY"] = "transactions-controller-test-secret"
+    jwt.init_app(app)
+    db.init_app(app)
+
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(email=USER_EMAIL, fullName="Test User"))
+        # A category per transaction, so a lazy loaded category would cost a query per row
+        db.session.add(UserCategory(id=-1, categoryName="Unparsed"))
+        db.session.add_all(
+            [UserCategory(id=index, categoryName=f"Category {index}", owner=USER_EMAIL) for index in range(1, 61)]
+        )
+        db.session.commit()
+        yield app, app.test_client()
+        db.session.remove()
+        db.drop_all()
+
+
+def _add_transactions(count):
+    start_date = datetime(2023, 12, 1)
+    transactions = [
+        Transaction(
+            id=f"t{index}",
+            userEmail=USER_EMAIL,
+            categoryId=index + 1,
+            transactionAmount=float(index),
+            purchaseDate=start_date - timedelta(hours=index),
+            merchantData={"name": f"Merchant {index}"},
+            isRecurring=False,
+            isDeleted=False,
+            isPending=False,
+        )
+        for index in range(count)
+    ]
+    db.session.add_all(transactions)
+    db.session.commit()
+
+
+def _count_queries(app, request):
+    statements = []
+
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    engine = db.engine
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    try:
+        response = request()
+    finally:
+        event.remove(engine, "before_cursor_execute", _before_cursor_execute)
+    return response, len(statements)
+
+
+@pytest.mark.parametrize("body", [{"index": 0}, {"cursor": None, "count": "exact"}])
+def test_list_transactions_query_count_is_constant(app_and_client, body):
+    """
+    Test that listing transactions issues the same number of queries regardless of the page size.
+    """
+    app, test_client = app_and_client
+    _add_transactions(60)
+    headers = {"Authorization": f"Bearer {create_access_token(identity=USER_EMAIL)}"}
+
+    queries_counts = []
+    for length in (5, 60):
+        response, queries_count = _count_queries(
+            app,
+            lambda: test_client.post("/api/transactions/list-transactions", json={**body, "length": length}, headers=headers),
+        )
+        assert response.status_code == 200
+        queries_counts.append(queries_count)
+
+    assert queries_counts[0] == queries_counts[1]
+
+    data = response.get_json()["data"]
+    if "cursor" in body:
+        transactions = data["transactions"]
+    else:
+        transactions = [t for chunk in data["transactions"] if chunk for t in chunk if t is not None]
+    assert len(transactions) == 60
+    assert all(t["categoryName"] == f"Category {t['categoryId']}" for t in transactions)
+    assert transactions[0]["id"] == "t0" and "merchantName" not in transactions[0]
+
+
+def test_list_recurring_transactions_query_count_is_constant(app_and_client):
+    """
+    Test that the recurring transactions and their categories are loaded with a constant number of queries.
+    """
+    app, test_client = app_and_client
+    headers = {"Authorization": f"Bearer {create_access_token(identity=USER_EMAIL)}"}
+
+    queries_counts = []
+    for count in (2, 10):
+        _add_transactions(count)
+        RecurringTransactions.query.delete()
+        db.session.add_all(
+            [RecurringTransactions(userEmail=USER_EMAIL, transactionId=f"t{index}", transactionName="Rent") for index in range(count)]
+        )
+        db.session.commit()
+        db.session.expunge_all()
+
+        response, queries_count = _count_queries(
+            app, lambda: test_client.get("/api/transactions/list-recurring-transactions", headers=headers)
+        )
+        assert response.status_code == 200
+        assert len(response.get_json()["data"]) == count
+        queries_counts.append(queries_count)
+
+        RecurringTransactions.query.delete()
+        Transaction.query.delete()
+        db.session.commit()
+
+    assert queries_counts[0] == queries_counts[1]
+
+
+@pytest.mark.parametrize("body", [{"index": 0}, {"cursor": None}])
+def test_list_transactions_columnar_format(app_and_client, body):
+    """
+    Test that the columnar format sends the same transactions as the objects format, as values lists.
+    """
+    app, test_client = app_and_client
+    _add_transactions(10)
+    headers = {"Authorization": f"Bearer {create_access_token(identity=USER_EMAIL)}"}
+
+    def _list(response_format):
+        response = test_client.post(
+            "/api/transactions/list-transactions",
+            json={**body, "length": 10, "format": response_format},
+            headers=headers,
+        )
+        assert response.status_code == 200
+        data = response.get_json()["data"]
+        if "cursor" in body:
+            return data, data["transactions"]
+        return data, [t for chunk in data["transactions"] if chunk for t in chunk if t is not None]
+
+    _, objects = _list("objects")
+    columnar_data, columnar = _list("columnar")
+
+    assert [dict(zip(columnar_data["fields"], values)) for values in columnar] == objects
+    assert objects[0]["purchaseDate"] == "2023-12-01T00:00:00"
+
+
+def test_list_transactions_rejects_unknown_format(app_and_client):
+    app, test_client = app_and_client
+    headers = {"Authorization": f"Bearer {create_access_token(identity=USER_EMAIL)}"}
+
+    response = test_client.post("/api/transactions/list-transactions", json={"format": "csv"}, headers=headers)
+    assert response.status_code == 400
+
+
+def test_list_transactions_window_mode_sends_only_the_requested_rows(app_and_client):
+    """
+    Test that the window response mode sends the requested transactions without the chunks array.
+    """
+    app, test_client = app_and_client
+    _add_transactions(60)
+    headers = {"Authorization": f"Bearer {create_access_token(identity=USER_EMAIL)}"}
+
+    response = test_client.post(
+        "/api/transactions/list-transactions",
+        json={"index": 40, "length": 5, "responseMode": "window"},
+        headers=headers,
+    )
+    assert response.status_code == 200
+    data = response.get_json()["data"]
+
+    assert data["index"] == 40
+    assert data["totalTransactionsCount"] == 60
+    assert [t["id"] for t in data["transactions"]] == [f"t{index}" for index in range(40, 45)]
+    assert "chunkSize" not in data
+
+    response = test_client.post(
+        "/api/transactions/list-transactions",
+        json={"index": 0, "length": 5, "responseMode": "window", "count": "none"},
+        headers=headers,
+    )
+    assert "totalTransactionsCount" not in response.get_json()["data"]
+
+
+def test_update_transaction_rejects_a_malformed_purchase_date(app_and_client):
+    app, test_client = app_and_client
+    _add_transactions(1)
+    headers = {"Authorization": f"Bearer {create_access_token(identity=USER_EMAIL)}"}
+    body = {
+        "transactionId": "t0",
+        "categoryId": 1,
+        "transactionAmount": 10,
+        "paymentDate": None,
+        "purchaseDate": "01/12/2023",
+        "merchantData": {},
+    }
+
+    response = test_client.put("/api/transactions/update-transaction", json=body, headers=headers)
+    assert response.status_code == 400
+    assert db.session.get(Transaction, "t0").purchaseDate == datetime(2023, 12, 1)
+
+
+def test_list_transactions_chunks_cover_an_undercounting_estimate(app_and_client, monkeypatch):
+    """
+    Test that a planner estimate lower than the sent transactions still sizes the chunks array to hold them, and
+    that the chunks mode requires a count.
+    """
+    app, test_client = app_and_client
+    _add_transactions(60)
+    headers = {"Authorization": f"Bearer {create_access_token(identity=USER_EMAIL)}"}
+    monkeypatch.setattr(transactions_controller, "estimate_query_count", lambda query: 3)
+
+    response = test_client.post(
+        "/api/transactions/list-transactions",
+        json={"index": 40, "length": 5, "count": "estimated"},
+        headers=headers,
+    )
+    assert response.status_code == 200
+    data = response.get_json()["data"]
+
+    sent_ids = [t["id"] for chunk in data["transactions"] if chunk for t in chunk if t]
+    assert data["totalTransactionsCount"] == 45
+    assert sent_ids == [f"t{index}" for index in range(40, 45)]
+
+    response = test_client.post(
+        "/api/transactions/list-transactions", json={"index": 0, "length": 5, "count": "none"}, headers=headers
+    )
+    assert response.status_code == 400
@@ -0,0 +1,89 @@
+from datetime import datetime
+import pytest
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql
+from app.api.helpers import apply_transactions_filters, build_merchant_search_query
+from app.database.models import Transaction
+
+FRONTEND_INITIAL_FILTERS = {
+    "purchaseDate": {"start": None, "end": None},
+    "transactionAmount": {"min": None, "max": None},
+    "category": [],
+    "store": "",
+    "status": None,
+}
+
+
+def _compile(statement):
+    compiled = statement.compile(dialect=postgresql.dialect(), compile_kwargs={"render_postcompile": True})
+    return str(compiled), compiled.params
+
+
+def test_empty_filters_leave_the_query_untouched():
+    """
+    Test that the frontend's initial (empty) filters don't add any condition.
+    """
+    sql, _ = _compile(apply_transactions_filters(select(Transaction), FRONTEND_INITIAL_FILTERS))
+    assert "WHERE" not in sql
+
+
+def test_filters_are_compiled_to_bound_conditions():
+    """
+    Test that every supported filter becomes a bound condition, with inclusive date and amount ranges.
+    """
+    filters = {
+        "purchaseDate": {"start": "2023-11-01", "end": "2023-11-30"},
+        "transactionAmount": {"min": "10", "max": 99.5},
+        "category": [3, 4],
+        "card": "1234",
+        "store": "50%_Off",
+        "status": True,
+    }
+    sql, params = _compile(apply_transactions_filters(select(Transaction), filters))
+
+    assert 'transaction."purchaseDate" >= ' in sql and 'transaction."purchaseDate" < ' in sql
+    assert datetime(2023, 12, 1) in params.values()
+    assert 10.0 in params.values() and 99.5 in params.values()
+    assert 'transaction."categoryId" IN (' in sql
+    assert 'transaction."shortCardNumber" IN (' in sql
+    assert 'transaction."merchantName" ILIKE' in sql
+    assert "%50\\%\\_Off%" in params.values()
+    assert 'transaction."isPending" = true' in sql
+
+
+@pytest.mark.parametrize(
+    "filters",
+    [
+        {"password": "secret"},
+        {"category": ["1; DROP TABLE transaction"]},
+        {"purchaseDate": {"start": "yesterday"}},
+        {"transactionAmount": "cheap"},
+        {"status": "maybe"},
+    ],
+)
+def test_unsupported_filters_are_rejected(filters):
+    """
+    Test that unknown filters and malformed values raise ValueError.
+    """
+    with pytest.raises(ValueError):
+        apply_transactions_filters(select(Transaction), filters)
+
+
+def test_merchant_search_uses_the_trigram_indexed_column():
+    """
+    Test that substring and fuzzy merchant searches match on the generated merchantName column.
+    """
+    substring_sql, substring_params = _compile(
+        build_merchant_search_query("user@gmail.com", " pizza_ ", "substring")
+    )
+    assert 'transaction."merchantName" ILIKE' in substring_sql
+    assert "%pizza\\_%" in substring_params.values()
+
+    fuzzy_sql, fuzzy_params = _compile(build_merchant_search_query("user@gmail.com", "piza", "fuzzy"))
+    assert 'transaction."merchantName" %% %(merchantName_1)s' in fuzzy_sql
+    assert "similarity(transaction.\"merchantName\"" in fuzzy_sql
+
+    with pytest.raises(ValueError):
+        build_merchant_search_query("user@gmail.com", "  ", "fuzzy")
+    with pytest.raises(ValueError):
+        build_merchant_search_query("user@gmail.com", "pizza", "regex")
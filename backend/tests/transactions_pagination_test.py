@@ -0,0 +1,57 @@
+from datetime import datetime
+import pytest
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql
+from app.api.helpers import apply_cursor, apply_sorting, decode_cursor, encode_cursor
+from app.database.models import Transaction
+
+SORT_BY_AMOUNT = {"field": "transactionAmount", "direction": "asc"}
+
+
+def _compile(statement):
+    return str(statement.compile(dialect=postgresql.dialect()))
+
+
+def test_cursor_round_trip():
+    """
+    Test that a cursor is opaque and decodes back to the sort config and the last transaction's keys.
+    """
+    transaction = Transaction(id="t1", purchaseDate=datetime(2023, 12, 1, 10, 30), transactionAmount=42.5)
+
+    cursor = encode_cursor(None, transaction)
+    assert "purchaseDate" not in cursor
+    assert decode_cursor(cursor) == ("purchaseDate", "desc", datetime(2023, 12, 1, 10, 30), "t1")
+
+    cursor = encode_cursor(SORT_BY_AMOUNT, transaction)
+    assert decode_cursor(cursor) == ("transactionAmount", "asc", 42.5, "t1")
+
+
+def test_cursor_continues_with_a_row_comparison():
+    """
+    Test that a cursor page is a (sort column, id) range condition in the sort's direction instead of an offset.
+    """
+    transaction = Transaction(id="t1", purchaseDate=datetime(2023, 12, 1), transactionAmount=42.5)
+
+    newest_first = apply_cursor(apply_sorting(select(Transaction), None), None, encode_cursor(None, transaction))
+    sql = _compile(newest_first)
+    assert '(transaction."purchaseDate", transaction.id) < (' in sql
+    assert 'ORDER BY transaction."purchaseDate" DESC, transaction.id DESC' in sql
+    assert "OFFSET" not in sql
+
+    cursor = encode_cursor(SORT_BY_AMOUNT, transaction)
+    cheapest_first = apply_cursor(apply_sorting(select(Transaction), SORT_BY_AMOUNT), SORT_BY_AMOUNT, cursor)
+    assert '(transaction."transactionAmount", transaction.id) > (' in _compile(cheapest_first)
+
+
+def test_invalid_sort_and_cursor_are_rejected():
+    """
+    Test that unsupported sort fields, malformed cursors and cursors of another sort raise ValueError.
+    """
+    transaction = Transaction(id="t1", purchaseDate=datetime(2023, 12, 1), transactionAmount=42.5)
+
+    with pytest.raises(ValueError):
+        apply_sorting(select(Transaction), {"field": "password", "direction": "asc"})
+    with pytest.raises(ValueError):
+        apply_cursor(select(Transaction), None, "not-a-cursor")
+    with pytest.raises(ValueError):
+        apply_cursor(select(Transaction), SORT_BY_AMOUNT, encode_cursor(None, transaction))
@@ -0,0 +1,162 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
+import app.job_scheduler.jobs.transactions_scanner as transactions_scanner
+from app.credit_card_adapters.base_adapter import CreditCardAdapter, LoginFailedError
+from app.credit_card_adapters.registry import get_adapter
+from lib.rate_limiter.rate_limiter import RateLimiter
+
+
+class _TestAdapter(CreditCardAdapter):
+    """Adapter returning each user's email as its only transaction, after the user's delay."""
+
+    name = "test"
+
+    def __init__(self, delays=None, failing_users=(), rejected_users=()):
+        self.delays = delays or {}
+        self.failing_users = failing_users
+        self.rejected_users = rejected_users
+        self.running = 0
+        self.max_running = 0
+
+    async def login(self, user_credentials, user_email):
+        if user_email in self.failing_users:
+            raise Exception("Connection reset")
+        if user_email in self.rejected_users:
+            raise LoginFailedError("Wrong password")
+        return {}
+
+    async def fetch_range(self, session, dates, user_email):
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        await asyncio.sleep(self.delays.get(user_email, 0.01))
+        self.running -= 1
+        yield user_email
+
+    def normalize(self, raw_transaction, user_email):
+        return raw_transaction
+
+
+def _fetch_args(email):
+    return {"user_credentials": {"username": email, "password": b"", "id": "1"}, "user_email": email, "dates": None}
+
+
+def test_concurrent_fetch_maps_results_by_user():
+    """
+    Test that failed fetches are reported by their result while the other users' results are kept,
+    rejected credentials being told apart from other failures.
+    """
+    adapter = _TestAdapter(failing_users=["failing@gmail.com"], rejected_users=["rejected@gmail.com"])
+    emails = ["a@gmail.com", "failing@gmail.com", "rejected@gmail.com", "b@gmail.com"]
+
+    results = transactions_scanner._fetch_users_transactions_concurrently([_fetch_args(e) for e in emails], adapter)
+
+    assert results == {
+        "a@gmail.com": ["a@gmail.com"],
+        "failing@gmail.com": transactions_scanner.FETCH_FAILED,
+        "rejected@gmail.com": transactions_scanner.FETCH_LOGIN_FAILED,
+        "b@gmail.com": ["b@gmail.com"],
+    }
+
+
+def test_concurrent_fetch_is_bounded_by_workers_count():
+    """
+    Test that no more than `workers_count` fetches run at the same time.
+    """
+    adapter = _TestAdapter()
+    fetch_args_list = [_fetch_args(f"user{i}@gmail.com") for i in range(12)]
+
+    transactions_scanner._fetch_users_transactions_concurrently(fetch_args_list, adapter, workers_count=3)
+
+    assert adapter.max_running == 3
+
+
+def test_concurrent_fetch_timeouts():
+    """
+    Test that users whose fetch didn't finish in time are reported as timed out, or as not attempted when they were
+    still waiting for a worker.
+    """
+    slow_users = ["slow@gmail.com", "stuck@gmail.com", "cut@gmail.com", "also-cut@gmail.com", "queued@gmail.com"]
+    adapter = _TestAdapter(delays={email: 1 for email in slow_users})
+    fetch_args_list = [_fetch_args(email) for email in ["slow@gmail.com", "fast@gmail.com", *slow_users[1:]]]
+
+    # The per user timeout fails the first slow users, the scan timeout cuts the next two while they run
+    # and the last one never got a worker
+    results = transactions_scanner._fetch_users_transactions_concurrently(
+        fetch_args_list, adapter, workers_count=2, timeout=0.3, user_timeout=0.2
+    )
+
+    assert results == {
+        "slow@gmail.com": transactions_scanner.FETCH_TIMED_OUT,
+        "fast@gmail.com": ["fast@gmail.com"],
+        "stuck@gmail.com": transactions_scanner.FETCH_TIMED_OUT,
+        "cut@gmail.com": transactions_scanner.FETCH_TIMED_OUT,
+        "also-cut@gmail.com": transactions_scanner.FETCH_TIMED_OUT,
+        "queued@gmail.com": transactions_scanner.FETCH_NOT_ATTEMPTED,
+    }
+
+
+def test_fake_issuer_adapter_is_registered():
+    """
+    Test that the fake issuer adapter returns stable records for the requested range.
+    """
+    adapter = get_adapter("fake")
+    adapter.latency = 0
+    dates = (datetime(2023, 11, 1), datetime(2023, 11, 3))
+    fetch_args_list = [{**_fetch_args("user@gmail.com"), "dates": dates}] * 2
+
+    first_scan = transactions_scanner._fetch_users_transactions_concurrently(fetch_args_list[:1], adapter)
+    second_scan = transactions_scanner._fetch_users_transactions_concurrently(fetch_args_list[1:], adapter)
+
+    assert len(first_scan["user@gmail.com"]) == 3 * adapter.transactions_per_day
+    assert [t.id for t in first_scan["user@gmail.com"]] == [t.id for t in second_scan["user@gmail.com"]]
+
+
+def test_rate_limiter_limits_each_host_separately():
+    """
+    Test that the rate limiter delays calls beyond the burst size, per host.
+    """
+    rate_limiter = RateLimiter(rate=20, burst=1)
+
+    start_time = time.monotonic()
+    for _ in range(3):
+        rate_limiter.acquire("www.max.co.il")
+    rate_limiter.acquire("other-host")
+    elapsed = time.monotonic() - start_time
+
+    # Two calls waited for a token (1/20s each), the other host wasn't delayed
+    assert 0.09 <= elapsed < 0.3
+
+
+def test_scan_depth_deep_scan_for_new_users():
+    """
+    Test that users who were never scanned get a deep scan.
+    """
+    start_date, end_date = transactions_scanner._calculate_scan_depth(None)
+
+    assert (end_date - start_date).days == transactions_scanner.DEEP_TRANSACTIONS_SCAN_DEPTH_IN_DAYS
+
+
+def test_scan_depth_starts_at_high_water_mark():
+    """
+    Test that an incremental scan starts shortly before the latest confirmed transaction.
+    """
+    now = datetime.now()
+    high_water_mark = now - timedelta(days=2)
+
+    start_date, _ = transactions_scanner._calculate_scan_depth(now - timedelta(minutes=5), high_water_mark)
+
+    expected_start_date = high_water_mark - timedelta(days=transactions_scanner.INCREMENTAL_SCAN_OVERLAP_IN_DAYS)
+    assert start_date == expected_start_date.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def test_scan_depth_covers_oldest_pending_transaction():
+    """
+    Test that still pending transactions older than the high-water mark are rescanned.
+    """
+    now = datetime.now()
+    oldest_pending_date = now - timedelta(days=10)
+
+    start_date, _ = transactions_scanner._calculate_scan_depth(now, now - timedelta(days=1), oldest_pending_date)
+
+    assert start_date == oldest_pending_date.replace(hour=0, minute=0, second=0, microsecond=0)
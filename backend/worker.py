@@ -0,0 +1,19 @@
+"""
+Job worker entry point, runs the queued jobs outside of the web process.
+
+Any number of workers can be started, each queue entry is run by a single worker and one worker at a time is
+elected to queue the periodic jobs.
+
+Usage (from the backend directory):
+    python worker.py
+"""
+import dotenv
+
+from app.job_scheduler.app import start_worker
+from main import create_app
+
+
+if __name__ == "__main__":
+    dotenv.load_dotenv()
+    app = create_app(initialize_scheduler=False)
+    start_worker(app)
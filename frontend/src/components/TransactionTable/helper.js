@@ -116,7 +116,7 @@ export const getVisibleTransactions = (transactions, currentPage, pageSize) => {
   const chunkSize = transactions.chunkSize;
 
   for (let i = startIndex; i < endIndex; i++) {
-    let chunkIndex = getChunkIndex(startIndex, chunkSize);
+    let chunkIndex = getChunkIndex(i, chunkSize);
     if (!transactions.transactions[chunkIndex]) {
       break;
     }
@@ -1,8 +1,14 @@
+// Fetched transaction windows are kept in fixed size chunks, indexed by the transactions' position in the listing
+const TRANSACTIONS_CHUNK_SIZE = 50;
+
+// Cached transactions older than this are dropped instead of being merged with newly fetched ones
+const TRANSACTIONS_CACHE_TTL_MS = 1000 * 60 * 60 * 24;
+
 export default async function fetchTransactions(userToken, prevState, index = 0, length = 75, filters, sortConfig) {
   let transactions = {
     transactions: null,
     totalTransactionsCount: 0,
-    chunkSize: 0,
+    chunkSize: TRANSACTIONS_CHUNK_SIZE,
   };
 
   try {
@@ -12,7 +18,8 @@ export default async function fetchTransactions(userToken, prevState, index = 0,
         "Content-Type": "application/json",
         Authorization: `Bearer ${userToken}`,
       },
-      body: JSON.stringify({ index, length, filters, sortConfig }),
+      // The window response mode returns only the requested transactions, they're placed in chunks here
+      body: JSON.stringify({ index, length, filters, sortConfig, responseMode: "window" }),
     });
 
     if (!response.ok) {
@@ -21,7 +28,7 @@ export default async function fetchTransactions(userToken, prevState, index = 0,
       console.log("Fetching new transactions...");
 
       const data = await response.json();
-      transactions = mergeTransactions(prevState, data.data);
+      transactions = mergeTransactions(prevState, data.data, JSON.stringify({ filters, sortConfig }));
     }
   } catch (error) {
     console.error("Error fetching transactions:", error);
@@ -29,49 +36,42 @@ export default async function fetchTransactions(userToken, prevState, index = 0,
   return transactions;
 }
 
-function mergeTransactions(prevState, fetchedData) {
-  const { chunkSize, totalTransactionsCount, transactions: fetchedTransactions } = fetchedData;
-  try {
-    const currentTimestamp = new Date().getTime();
+function mergeTransactions(prevState, fetchedData, queryKey) {
+  const { index, totalTransactionsCount, transactions: fetchedTransactions } = fetchedData;
+  const currentTimestamp = new Date().getTime();
 
-    // Check if newly recived transactions should override previous state transactions
-    // This logic will clear all data that is older than 1 day
-    const lastFetchTimestamp = prevState?.transactions?.fetchTimestamp || 0;
-    const shouldOverride = currentTimestamp - lastFetchTimestamp > 60 * 60 * 24;
+  // Start over when the cached transactions are too old, belong to another filters/sort combination or the
+  // listing size changed, since their positions may not match the new listing anymore
+  const lastFetchTimestamp = prevState?.fetchTimestamp || 0;
+  const shouldOverride =
+    !prevState?.transactions ||
+    currentTimestamp - lastFetchTimestamp > TRANSACTIONS_CACHE_TTL_MS ||
+    prevState.queryKey !== queryKey ||
+    prevState.chunkSize !== TRANSACTIONS_CHUNK_SIZE ||
+    prevState.totalTransactionsCount !== totalTransactionsCount;
 
-    if (shouldOverride) {
-      return {
-        chunkSize,
-        totalTransactionsCount,
-        transactions: fetchedTransactions,
-        fetchTimestamp: currentTimestamp,
-      };
-    }
+  const chunks = shouldOverride ? [] : [...prevState.transactions];
+  const copiedChunks = new Set();
 
-    // Merge new transactions with existing ones, filling gaps with previous data if necessary
-    const updatedTransactions = fetchedTransactions.map(
-      (transactionGroup, i) =>
-        transactionGroup?.map((transaction, j) =>
-          transaction === null && prevState.transactions.transactions[i]?.[j] !== null
-            ? prevState.transactions.transactions[i][j]
-            : transaction
-        ) ?? prevState.transactions.transactions[i]
-    );
+  fetchedTransactions.forEach((transaction, offset) => {
+    const position = index + offset;
+    const chunkIndex = Math.floor(position / TRANSACTIONS_CHUNK_SIZE);
 
-    return {
-      chunkSize,
-      totalTransactionsCount,
-      transactions: updatedTransactions,
-      fetchTimestamp: lastFetchTimestamp,
-    };
-  } catch (error) {
-    console.error("Error merging transactions:", error);
-    // On error, reset transactions with fetched data
-    return {
-      chunkSize,
-      totalTransactionsCount,
-      transactions: transactions,
-      fetchTimestamp: currentTimestamp,
-    };
-  }
+    // Chunks are copied before being updated, the previous state is left untouched
+    if (!copiedChunks.has(chunkIndex)) {
+      chunks[chunkIndex] = chunks[chunkIndex]
+        ? [...chunks[chunkIndex]]
+        : Array(TRANSACTIONS_CHUNK_SIZE).fill(null);
+      copiedChunks.add(chunkIndex);
+    }
+    chunks[chunkIndex][position % TRANSACTIONS_CHUNK_SIZE] = transaction;
+  });
+
+  return {
+    chunkSize: TRANSACTIONS_CHUNK_SIZE,
+    totalTransactionsCount,
+    transactions: chunks,
+    queryKey,
+    fetchTimestamp: shouldOverride ? currentTimestamp : lastFetchTimestamp,
+  };
 }